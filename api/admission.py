@@ -0,0 +1,278 @@
+"""Admission control: which requests a worker starts serving, and in what order.
+
+At most ADMISSION_MAX_CONCURRENCY requests are served at once, at most
+ADMISSION_USER_CONCURRENCY of them for one user, and at most a route's own limit for
+a route that has one. A request over a limit waits for a slot, oldest first, except
+that cheap reads go ahead of writes that arrived up to ADMISSION_CODEL_TARGET_SECONDS
+before them, and writes likewise ahead of expensive routes. It is answered 503 with a
+Retry-After header instead when
+
+- ADMISSION_MAX_WAITING requests are waiting already,
+- it has waited ADMISSION_QUEUE_TIMEOUT_SECONDS, or
+- the worker is overloaded and it has waited more than ADMISSION_CODEL_TARGET_SECONDS
+  by the time a slot frees up. Overloaded means every request admitted for
+  ADMISSION_CODEL_INTERVAL_SECONDS had waited longer than the target, until one
+  waited less: requests arrive faster than they are served, and waiting longer only
+  gets them answered after their clients have given up (CoDel, applied to a request
+  queue). A burst that drains, or a queue that stays short, waits the full timeout,
+  as does a request that queued behind its own user's or route's limit: that wait
+  says nothing about the worker.
+
+Routes declare their class with ``dependencies=[Depends(admission(...))]``, which the
+middleware reads before the request is routed; routes that declare none are cheap reads
+if GET and writes otherwise. A rejected request never reaches authentication, the
+database or its own body. The limits are per worker process.
+"""
+import asyncio
+import itertools
+import json
+import math
+import time
+from typing import Optional
+from fastapi.routing import APIRoute
+from api import metrics
+from api.auth.controller import verified_tokens
+from api.settings import ADMISSION_ENABLED, ADMISSION_MAX_CONCURRENCY, ADMISSION_USER_CONCURRENCY, \
+    ADMISSION_EXPENSIVE_CONCURRENCY, ADMISSION_MAX_WAITING, ADMISSION_QUEUE_TIMEOUT_SECONDS, ADMISSION_CODEL_TARGET_SECONDS, \
+    ADMISSION_CODEL_INTERVAL_SECONDS
+
+CHEAP, WRITE, EXPENSIVE = 0, 1, 2
+PRIORITY_NAMES = ("cheap", "write", "expensive")
+
+
+class AdmissionPolicy:
+    __slots__ = ("priority", "max_concurrency", "exempt")
+
+    def __init__(self, priority: Optional[int], max_concurrency: Optional[int], exempt: bool):
+        self.priority = priority
+        self.max_concurrency = max_concurrency
+        self.exempt = exempt
+
+
+def admission(priority: Optional[int] = None, max_concurrency: Optional[int] = None, exempt: bool = False):
+    """Dependency declaring a route's admission class. EXPENSIVE routes are limited to
+    ADMISSION_EXPENSIVE_CONCURRENCY requests at once unless given max_concurrency.
+    Exempt routes (health checks, metrics) are always served."""
+    if priority == EXPENSIVE and max_concurrency is None:
+        max_concurrency = ADMISSION_EXPENSIVE_CONCURRENCY
+    policy = AdmissionPolicy(priority, max_concurrency, exempt)
+
+    async def declare_admission():
+        pass
+
+    declare_admission.admission = policy
+    return declare_admission
+
+
+def route_policy(route: APIRoute) -> Optional[AdmissionPolicy]:
+    for dependency in route.dependant.dependencies:
+        policy = getattr(dependency.call, "admission", None)
+        if policy is not None:
+            return policy
+    return None
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "route", "limit", "user", "limited", "enqueued_at", "future")
+
+    def __init__(self, priority, seq, route, limit, user, limited, future):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.limit = limit
+        self.user = user
+        self.limited = limited  # queued behind its user's or route's limit
+        self.enqueued_at = time.monotonic()
+        # Resolved with None once admitted, or with the reason it was rejected.
+        self.future = future
+
+
+class AdmissionController:
+    """The limits and the wait queue. Used from the event loop only, so needs no lock."""
+
+    def __init__(self, max_concurrency: int, user_concurrency: int, max_waiting: int, queue_timeout: float, target: float,
+                 interval: float):
+        self.max_concurrency = max_concurrency
+        self.user_concurrency = user_concurrency
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.target = target
+        self.interval = interval
+        self.in_flight = 0
+        self._routes: dict[str, int] = {}
+        self._users: dict = {}
+        self._waiting: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._above_since = None  # when admitted requests started waiting over target
+        self._overloaded = False
+        self._service_seconds = 0.05  # moving average, for Retry-After
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def _admitted_after(self, waited: float, now: float):
+        if waited < self.target:
+            self._above_since = None
+            self._overloaded = False
+        elif self._above_since is None:
+            self._above_since = now
+        elif now - self._above_since > self.interval:
+            self._overloaded = True
+
+    def retry_after(self) -> int:
+        # Seconds until the requests waiting now would have been served.
+        return max(1, math.ceil((len(self._waiting) / self.max_concurrency + 1) * self._service_seconds))
+
+    def _within_limits(self, route: str, limit: Optional[int], user) -> bool:
+        return ((limit is None or self._routes.get(route, 0) < limit)
+                and (user is None or self._users.get(user, 0) < self.user_concurrency))
+
+    def _fits(self, route: str, limit: Optional[int], user) -> bool:
+        return self.in_flight < self.max_concurrency and self._within_limits(route, limit, user)
+
+    def _take(self, route: str, user):
+        self.in_flight += 1
+        self._routes[route] = self._routes.get(route, 0) + 1
+        if user is not None:
+            self._users[user] = self._users.get(user, 0) + 1
+
+    def release(self, route: str, user, elapsed: float):
+        self.in_flight -= 1
+        self._routes[route] -= 1
+        if user is not None:
+            self._users[user] -= 1
+            if not self._users[user]:
+                del self._users[user]
+        self._service_seconds += 0.05 * (elapsed - self._service_seconds)
+        self._grant()
+
+    def _grant(self):
+        if not self._waiting:
+            return
+        now = time.monotonic()
+        for waiter in sorted(self._waiting, key=lambda waiter: (waiter.enqueued_at + waiter.priority * self.target, waiter.seq)):
+            if waiter.future.done():
+                continue
+            waited = now - waiter.enqueued_at
+            if self._overloaded and waited > self.target and not waiter.limited:
+                waiter.future.set_result("overloaded")
+            elif self._fits(waiter.route, waiter.limit, waiter.user):
+                self._take(waiter.route, waiter.user)
+                waiter.future.set_result(None)
+                if not waiter.limited:
+                    self._admitted_after(waited, now)
+            elif self.in_flight >= self.max_concurrency and not self._overloaded:
+                break
+        self._remove_done()
+
+    def _remove_done(self):
+        self._waiting = [waiter for waiter in self._waiting if not waiter.future.done()]
+
+    async def acquire(self, route: str, limit: Optional[int], user, priority: int) -> Optional[str]:
+        """None once admitted, after which release must be called; otherwise why the
+        request was turned away."""
+        # Slots freed by a release go to waiters at once, so a request that fits takes
+        # nothing a waiter could have had.
+        if self._fits(route, limit, user):
+            self._take(route, user)
+            self._admitted_after(0.0, time.monotonic())
+            return None
+        if len(self._waiting) >= self.max_waiting:
+            return "queue_full"
+        waiter = _Waiter(priority, next(self._seq), route, limit, user, not self._within_limits(route, limit, user),
+                         asyncio.get_running_loop().create_future())
+        self._waiting.append(waiter)
+        try:
+            reason = await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            reason = "timeout"
+        except asyncio.CancelledError:
+            # The client went away while waiting; give back a slot granted meanwhile.
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.result() is None:
+                self.release(route, user, 0.0)
+            raise
+        finally:
+            self._remove_done()
+        if reason is None:
+            metrics.admission_wait_seconds.observe(time.monotonic() - waiter.enqueued_at, PRIORITY_NAMES[priority])
+        return reason
+
+
+def _user(scope):
+    # The user behind a bearer token already verified by this worker, else the token
+    # itself; anonymous requests (logging in, registering) have no per-user limit.
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            context = verified_tokens.get(token)
+            return context.id if context is not None else hash(token)
+    return None
+
+
+class AdmissionMiddleware:
+    """Goes inside CORSMiddleware, which answers preflights and adds its headers to the
+    503s, and so inside MetricsMiddleware, which counts and times them."""
+
+    def __init__(self, app, controller: "AdmissionController" = None):
+        self.app = app
+        self.controller = controller
+        self._routes = None
+
+    def _route_table(self, app) -> list:
+        if self._routes is None:
+            self._routes = [(route.path_regex, route.methods, f"{method} {route.path}", route_policy(route))
+                            for route in app.routes if isinstance(route, APIRoute) for method in route.methods]
+        return self._routes
+
+    def _match(self, scope):
+        for path_regex, methods, name, policy in self._route_table(scope["app"]):
+            if scope["method"] in methods and path_regex.match(scope["path"]):
+                return name, policy
+        return f"{scope['method']} unmatched", None
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller or admission_controller
+        if scope["type"] != "http" or controller is None or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        route, policy = self._match(scope)
+        if policy is not None and policy.exempt:
+            return await self.app(scope, receive, send)
+        priority = policy.priority if policy is not None and policy.priority is not None else \
+            CHEAP if scope["method"] in ("GET", "HEAD") else WRITE
+        limit = policy.max_concurrency if policy is not None else None
+        user = _user(scope)
+        reason = await controller.acquire(route, limit, user, priority)
+        if reason is not None:
+            metrics.admission_rejected_total.inc(route, reason)
+            body = json.dumps({"detail": "Server busy, retry later"}).encode()
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                    (b"retry-after", str(controller.retry_after()).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(route, user, time.perf_counter() - start)
+
+
+def _collect_admission_metrics():
+    metrics.admission_in_flight.set(admission_controller.in_flight)
+    metrics.admission_waiting.set(admission_controller.waiting)
+
+
+admission_controller = AdmissionController(
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    user_concurrency=ADMISSION_USER_CONCURRENCY,
+    max_waiting=ADMISSION_MAX_WAITING,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    target=ADMISSION_CODEL_TARGET_SECONDS,
+    interval=ADMISSION_CODEL_INTERVAL_SECONDS,
+) if ADMISSION_ENABLED else None
+
+if ADMISSION_ENABLED:
+    metrics.collectors.append(_collect_admission_metrics)
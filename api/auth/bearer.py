@@ -1,42 +0,0 @@
-from jose import jwt
-from jwt.exceptions import InvalidTokenError
-from fastapi import Request, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from api.settings import ALGORITHM, JWT_SECRET_KEY
-
-def decode_jwt(token: str):
-    try:
-        # Decode and verify the token
-        payload = jwt.decode(token, JWT_SECRET_KEY, ALGORITHM)
-        return payload
-    except InvalidTokenError:
-        return None
-
-class JWTBearer(HTTPBearer):
-    def __init__(self, auto_error: bool = True):
-        super(JWTBearer, self).__init__(auto_error=auto_error)
-
-        async def __call__(self, request: Request):
-            credentials: HTTPAuthorizationCredentials = await super(JWTBearer, self).__call__(request)
-            if credentials:
-                if not credentials.scheme == "Bearer":
-                    raise HTTPException(status_code=403, detail="Invalid authentication scheme.")
-                if not self.verify_jwt(credentials.credentials):
-                    raise HTTPException(status_code=403, detail="Invalid token or expired token.")
-                return credentials.credentials
-            else:
-                raise HTTPException(status_code=403, detail="Invalid authorization code.")
-
-        def verify_jwt(self, jwtoken: str) -> bool:
-            is_token_valid: bool = False
-
-            try:
-                payload = decode_jwt(jwtoken)
-            except:
-                payload = None
-            if payload:
-                is_token_valid = True
-            return is_token_valid
-
-
-jwt_bearer = JWTBearer()
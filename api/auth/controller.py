@@ -4,13 +4,24 @@ from typing import Union, Any, Annotated
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from api.settings import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_MINUTES, ALGORITHM, JWT_REFRESH_SECRET_KEY, JWT_SECRET_KEY
+from api.settings import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_MINUTES, ALGORITHM, JWT_REFRESH_SECRET_KEY, JWT_SECRET_KEY, AUTH_TOKEN_CACHE_SIZE, \
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS, PASSWORD_HASH_MAX_WAITING
 from api import schemas
+from api.auth.password_pool import PasswordWorkerPool
+from api.auth.token_cache import VerifiedTokenCache
 
 password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login/")
 
+verified_tokens = VerifiedTokenCache(max_size=AUTH_TOKEN_CACHE_SIZE)
+
+password_pool = PasswordWorkerPool(
+    workers=PASSWORD_HASH_WORKERS,
+    queue_timeout=PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+    max_waiting=PASSWORD_HASH_MAX_WAITING
+)
+
 
 def get_hashed_password(password: str) -> str:
     return password_context.hash(password)
@@ -20,6 +31,15 @@ def verify_password(password: str, hashed_pass: str) -> bool:
     return password_context.verify(password, hashed_pass)
 
 
+# Request handlers must use these two; the sync versions above take ~250ms of CPU.
+async def get_hashed_password_async(password: str) -> str:
+    return await password_pool.run(get_hashed_password, password)
+
+
+async def verify_password_async(password: str, hashed_pass: str) -> bool:
+    return await password_pool.run(verify_password, password, hashed_pass)
+
+
 def create_access_token(subject: Union[object, Any], expires_delta: int = None) -> str:
     if expires_delta is not None:
         expires_delta = datetime.utcnow() + timedelta(expires_delta)
@@ -68,22 +88,36 @@ def get_new_access_token(token: str):
     token_data = verify_refresh_token(token)
     return create_access_token(token_data)
 
-async def jwt_required(token: str = Depends(oauth2_scheme)):
+def verify_access_token(token: str) -> schemas.AuthContext:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    context = verified_tokens.get(token)
+    if context is not None:
+        return context
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=ALGORITHM)
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        else:
-            return username
     except JWTError:
         raise credentials_exception
+    username: str = payload.get("sub")
+    user_id = payload.get("id")
+    expires = payload.get("exp")
+    if username is None or user_id is None or expires is None:
+        raise credentials_exception
+    context = schemas.AuthContext(id=user_id, username=username, expires_at=datetime.utcfromtimestamp(expires))
+    verified_tokens.put(token, context, expires)
+    return context
+
+# The single auth dependency. FastAPI caches a dependency's result for the duration of a
+# request, so jwt_required, get_current_user and handlers asking for the context all
+# share one verification.
+async def get_auth_context(token: Annotated[str, Depends(oauth2_scheme)]) -> schemas.AuthContext:
+    return verify_access_token(token)
+
+async def jwt_required(auth: Annotated[schemas.AuthContext, Depends(get_auth_context)]):
+    return auth.username
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
-    user = jwt.decode(token, JWT_SECRET_KEY, algorithms=ALGORITHM)
-    return user["id"]
+async def get_current_user(auth: Annotated[schemas.AuthContext, Depends(get_auth_context)]):
+    return auth.id
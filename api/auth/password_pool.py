@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+
+
+class PasswordWorkerPool:
+    """Runs bcrypt hashing and verification off the event loop.
+
+    At most ``workers`` calls run at once, on a dedicated thread pool (bcrypt releases
+    the GIL while it works). Callers beyond that wait up to ``queue_timeout`` seconds
+    for a slot, and no more than ``max_waiting`` of them wait at all; anything past
+    either limit is rejected with a 503 instead of piling up behind a login storm.
+    """
+
+    def __init__(self, workers: int, queue_timeout: float, max_waiting: int):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.max_waiting = max_waiting
+        self._executor = None
+        self._slots = asyncio.Semaphore(workers)
+        self._waiting = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+        return self._executor
+
+    def _overloaded(self):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests",
+            headers={"Retry-After": str(max(1, round(self.queue_timeout)))},
+        )
+
+    async def _acquire(self, slots: asyncio.Semaphore):
+        # Not wait_for(slots.acquire()): before Python 3.12 the acquire can complete just
+        # as the timeout fires, and the slot it took is then never given back.
+        acquire = asyncio.ensure_future(slots.acquire())
+        acquired = False
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=self.queue_timeout)
+            acquired = bool(done)
+        finally:
+            if not acquired:
+                # Timed out, or this caller was cancelled. If the acquire got the slot
+                # anyway, hand it back.
+                acquire.cancel()
+                acquire.add_done_callback(lambda task: task.cancelled() or slots.release())
+        if not acquired:
+            raise self._overloaded()
+
+    async def run(self, fn, *args):
+        # The semaphore is held on to: shutdown() swaps in a new one, and the slot has to
+        # go back to the one it was taken from.
+        slots = self._slots
+        if slots.locked():
+            if self._waiting >= self.max_waiting:
+                raise self._overloaded()
+            self._waiting += 1
+            try:
+                await self._acquire(slots)
+            finally:
+                if self._slots is slots:
+                    self._waiting -= 1
+        else:
+            await slots.acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            slots.release()
+
+    def shutdown(self):
+        # The next lifespan in this process (tests, reloads) starts a new pool, and a
+        # semaphore for its event loop.
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._waiting = 0
@@ -0,0 +1,44 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from api import schemas
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of access tokens whose signature has already been checked.
+
+    Keys are SHA-256 digests, so raw tokens are never held in memory. An entry is only
+    returned while the token's own ``exp`` is in the future.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, tuple[float, schemas.AuthContext]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[schemas.AuthContext]:
+        key = self._key(token)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, context = item
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return context
+
+    def put(self, token: str, context: schemas.AuthContext, expires_at: float):
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, context)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
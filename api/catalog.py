@@ -0,0 +1,144 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional
+from api import schemas
+from api.settings import PLANT_CACHE_MAX_SIZE, PLANT_CACHE_TTL_SECONDS
+
+
+class CachedPlant(NamedTuple):
+    plant: schemas.PlantResponse
+    payload: bytes  # plant serialized as JSON, ready to be written to a response
+
+
+def catalog_key(plant) -> tuple:
+    # Listing order of the catalog, also the keyset cursor: (name, id).
+    return (plant.name or "", plant.id)
+
+
+class PlantCatalogCache:
+    """Id-indexed copy of the plants table, kept per worker process.
+
+    Entries expire after ``ttl`` seconds and at most ``max_size`` of them are kept, least
+    recently used first out. When the whole catalog fits, it is loaded in one query and
+    listing pages are served from memory as well. The crud write functions keep it
+    current for this process; other workers catch up when their entries expire.
+
+    The cache also records the catalog_version its entries are at least as new as. Every
+    fill says which version its rows were read at: an older one is not installed, and a
+    newer one (or sync() from api.etag) drops everything cached before it, so an ETag
+    built from a version never labels entries loaded before that version.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple[float, CachedPlant]]" = OrderedDict()
+        self._catalog_expires_at: Optional[float] = None  # set while every plant is cached
+        self._catalog_keys: list[tuple] = []
+        self._generation = 0
+        self._version: Optional[int] = None
+
+    @staticmethod
+    def _build(db_plant) -> CachedPlant:
+        plant = schemas.PlantResponse.model_validate(db_plant)
+        return CachedPlant(plant, plant.model_dump_json().encode())
+
+    def generation(self) -> int:
+        # Taken before reading from the database, then handed back to load() so that a
+        # snapshot older than a concurrent write is never installed over it.
+        return self._generation
+
+    def _advance(self, version: Optional[int]) -> bool:
+        # Called with the lock held. False if ``version`` is unknown (None) or older than
+        # the cached entries.
+        if version is None:
+            return False
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self._generation += 1
+            self._entries.clear()
+            self._catalog_expires_at = None
+            self._catalog_keys = []
+            self._version = version
+        return True
+
+    def sync(self, version: int):
+        """Drop the entries if ``version`` is newer than the one they were loaded at."""
+        with self._lock:
+            self._advance(version)
+
+    def get(self, plant_id: int) -> Optional[CachedPlant]:
+        with self._lock:
+            item = self._entries.get(plant_id)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                del self._entries[plant_id]
+                self._catalog_expires_at = None
+                return None
+            self._entries.move_to_end(plant_id)
+            return entry
+
+    def put(self, db_plants: Iterable, version: Optional[int]) -> list[CachedPlant]:
+        """Cache plants read at catalog ``version``. The entries are returned either way."""
+        entries = [self._build(db_plant) for db_plant in db_plants]
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if not self._advance(version):
+                return entries
+            self._generation += 1
+            for entry in entries:
+                previous = self._entries.get(entry.plant.id)
+                if previous is None or catalog_key(previous[1].plant) != catalog_key(entry.plant):
+                    # A new plant, or one that moved: the cached listing is no longer valid.
+                    self._catalog_expires_at = None
+                self._entries[entry.plant.id] = (expires_at, entry)
+                self._entries.move_to_end(entry.plant.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._catalog_expires_at = None
+        return entries
+
+    def load(self, db_plants: list, generation: int, version: Optional[int]) -> bool:
+        """Replace the cache with the full catalog. Returns False if it was not installed."""
+        if len(db_plants) > self.max_size:
+            return False
+        entries = [self._build(db_plant) for db_plant in db_plants]
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if generation != self._generation or not self._advance(version):
+                return False
+            self._entries = OrderedDict((entry.plant.id, (expires_at, entry)) for entry in entries)
+            self._catalog_expires_at = expires_at
+            self._catalog_keys = sorted(catalog_key(entry.plant) for entry in entries)
+            return True
+
+    def page(self, after: Optional[tuple], limit: int) -> Optional[list[CachedPlant]]:
+        """Up to ``limit`` plants following the ``after`` key in listing order, or None if
+        the full catalog is not cached."""
+        with self._lock:
+            if self._catalog_expires_at is None or self._catalog_expires_at < time.monotonic():
+                return None
+            start = 0 if after is None else bisect.bisect_right(self._catalog_keys, after)
+            return [self._entries[key[1]][1] for key in self._catalog_keys[start:start + limit]]
+
+    def invalidate(self, plant_id: Optional[int] = None):
+        with self._lock:
+            self._generation += 1
+            self._catalog_expires_at = None
+            if plant_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(plant_id, None)
+
+
+# The catalog version api.etag read for the current request, if it read one.
+read_version: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("catalog_read_version", default=None)
+
+plant_cache = PlantCatalogCache(max_size=PLANT_CACHE_MAX_SIZE, ttl=PLANT_CACHE_TTL_SECONDS)
@@ -0,0 +1,106 @@
+"""CSV and NDJSON encoding of the plant catalog, for bulk import and export.
+
+Both formats carry the fields of schemas.PlantResponse, one plant per record. On
+import the id is ignored (plants are matched on scientific_name) and empty CSV cells
+are read as missing values.
+"""
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterable, AsyncIterator
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from api import schemas
+
+FIELDS = list(schemas.PlantResponse.model_fields)
+MEDIA_TYPES = {
+    schemas.CatalogFormat.csv: "text/csv",
+    schemas.CatalogFormat.ndjson: "application/x-ndjson",
+}
+
+
+def format_for(content_type: str) -> schemas.CatalogFormat:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return schemas.CatalogFormat.csv
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return schemas.CatalogFormat.ndjson
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Send text/csv or application/x-ndjson"
+    )
+
+
+async def _lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict]]:
+    header, record, line_number, start = None, "", 0, 1
+    async for line in lines:
+        line_number += 1
+        record += line
+        if record.count('"') % 2:
+            continue  # a quoted field runs on to the next line
+        if record.strip():
+            values = next(csv.reader(io.StringIO(record)))
+            if header is None:
+                header = [name.strip() for name in values]
+            else:
+                yield start, {name: value or None for name, value in zip(header, values)}
+        record, start = "", line_number + 1
+
+
+async def _ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict]]:
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"line {line_number}: {e}")
+        if not isinstance(record, dict):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"line {line_number}: expected an object")
+        yield line_number, record
+
+
+async def parse(format: schemas.CatalogFormat, chunks: AsyncIterable[bytes]) -> AsyncIterator[schemas.PlantBase]:
+    """Plants from an uploaded body, read as it arrives. Raises a 422 naming the line of
+    the first invalid record."""
+    records = _csv_records if format == schemas.CatalogFormat.csv else _ndjson_records
+    async for line_number, record in records(_lines(chunks)):
+        try:
+            yield schemas.PlantBase.model_validate(record)
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"line {line_number}: {errors}")
+
+
+def header(format: schemas.CatalogFormat) -> bytes:
+    if format == schemas.CatalogFormat.csv:
+        return (",".join(FIELDS) + "\r\n").encode()
+    return b""
+
+
+def encode(format: schemas.CatalogFormat, db_plants: list) -> bytes:
+    plants = [schemas.PlantResponse.model_validate(db_plant) for db_plant in db_plants]
+    if format == schemas.CatalogFormat.ndjson:
+        return b"".join(plant.model_dump_json().encode() + b"\n" for plant in plants)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for plant in plants:
+        row = plant.model_dump(mode="json")
+        writer.writerow("" if row[field] is None else row[field] for field in FIELDS)
+    return out.getvalue().encode()
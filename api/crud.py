@@ -1,10 +1,35 @@
 import datetime
 import string
 import random
-from sqlalchemy import update, desc, case
-from sqlalchemy.orm import Session
-from . import models, schemas
-from api.auth.controller import get_hashed_password
+import time
+from sqlalchemy import update, insert, select, desc, case, func, or_, true, tuple_, bindparam
+from sqlalchemy.orm import Session, selectinload, raiseload
+from sqlalchemy.orm.attributes import set_committed_value
+from . import models, schemas, schedule, pagination
+from api.catalog import plant_cache, catalog_key, read_version
+from api.search import plant_search
+from api.note_search import note_search, snippet
+from api.settings import REMINDERS_ENABLED
+
+
+def _insert_returning(db: Session, model, **values):
+    # One INSERT .. RETURNING gives back the whole row, SQL-computed values included. MySQL
+    # has no RETURNING, so there the ORM inserts and reads the new id from the cursor.
+    if db.get_bind().dialect.insert_returning:
+        return db.execute(insert(model).values(**values).returning(model)).scalar_one()
+    row = model(**values)
+    db.add(row)
+    db.flush()
+    return row
+
+def _update_returning(db: Session, model, values: dict, *where):
+    # UPDATE .. RETURNING the row, or None when nothing matched.
+    stmt = update(model).where(*where).values(values)
+    if db.get_bind().dialect.update_returning:
+        return db.execute(stmt.returning(model)).scalar_one_or_none()
+    if db.execute(stmt).rowcount == 0:
+        return None
+    return db.query(model).filter(*where).first()
 
 
 def get_user(db: Session, user_id: int):
@@ -15,53 +40,121 @@ def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(db: Session, cursor: str = None, limit: int = 100):
+    q = db.query(models.User)
+    if cursor is not None:
+        username, user_id = pagination.decode_cursor(cursor, str, int)
+        q = q.filter(tuple_(models.User.username, models.User.id) > tuple_(username, user_id))
+    rows = q.order_by(models.User.username, models.User.id).limit(limit + 1).all()
+    return pagination.page(rows, limit, lambda user: (user.username, user.id))
 
 def invite_user(db: Session, user: schemas.UserBase):
     code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    db_invite_code = models.UserInviteCodes(
+    db_invite_code = _insert_returning(
+        db, models.UserInviteCodes,
         username=user.username,
         invite_code=code,
         created_at=datetime.datetime.utcnow()
     )
-    db.add(db_invite_code)
     db.commit()
-    db.refresh(db_invite_code)
     return db_invite_code
 
 def get_existing_invite(db: Session, user: schemas.UserBase):
     return db.query(models.UserInviteCodes.invite_code).filter(models.UserInviteCodes.username == user.username).first()
 
-def get_invited_users(db: Session):
-    return db.query(models.UserInviteCodes).all()
+def get_invited_users(db: Session, cursor: str = None, limit: int = 100):
+    q = db.query(models.UserInviteCodes)
+    if cursor is not None:
+        created_at, invite_id = pagination.decode_cursor(cursor, datetime.datetime, int)
+        q = q.filter(tuple_(models.UserInviteCodes.created_at, models.UserInviteCodes.id) > tuple_(created_at, invite_id))
+    rows = q.order_by(models.UserInviteCodes.created_at, models.UserInviteCodes.id).limit(limit + 1).all()
+    return pagination.page(rows, limit, lambda invite: (invite.created_at, invite.id))
 
-def create_user(db: Session, user: schemas.UserIn):
-    hashed_password = get_hashed_password(user.password)
-    db_user = models.User(
+def create_user(db: Session, user: schemas.UserIn, hashed_password: str):
+    # The user and their default group, in one transaction.
+    now = datetime.datetime.utcnow()
+    db_user = _insert_returning(
+        db, models.User,
         username=user.username,
         hashed_password=hashed_password,
-        created_at=datetime.datetime.utcnow(),
+        created_at=now,
         admin=False
     )
-    db.add(db_user)
+    db.execute(insert(models.UserGroup).values(user_id=db_user.id, is_default=True, name="", created_at=now))
+    _note_user_write(db, db_user.id)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
-def change_my_password(db: Session, password: schemas.ChangePasswordInput, current_user: int):
-    hashed_password = get_hashed_password(password.newPassword)
-    u = update(models.User) \
-        .values({"hashed_password": hashed_password}) \
-        .where(models.User.id == current_user)
-    db.execute(u)
+def change_my_password(db: Session, hashed_password: str, current_user: int):
+    db_user = _update_returning(db, models.User, {"hashed_password": hashed_password}, models.User.id == current_user)
     db.commit()
-    return db.query(models.User).filter(models.User.id == current_user).first()
+    return db_user
+
+def _bump_user_version(db: Session, *user_ids):
+    # Every write to a user's groups, plants or notes bumps users.data_version in the same
+    # transaction, and every write to the plants table bumps catalog_version; api.etag
+    # builds ETags from them. The session also notes who wrote, so api.replicas keeps
+    # their reads on the primary once this commits.
+    db.execute(
+        update(models.User)
+        .values(data_version=models.User.data_version + 1)
+        .where(models.User.id.in_(user_ids))
+        .execution_options(synchronize_session=False)
+    )
+    _note_user_write(db, *user_ids)
+
+def _note_user_write(db: Session, *user_ids):
+    db.info.setdefault("written_user_ids", set()).update(user_ids)
+
+def _bump_catalog_version(db: Session):
+    # Returns the new version, which the plant cache is told about once this commits.
+    stmt = (
+        update(models.CatalogVersion)
+        .values(version=models.CatalogVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        version = db.execute(stmt.returning(models.CatalogVersion.version)).scalar_one()
+    else:
+        db.execute(stmt)
+        version = get_catalog_version(db)
+    db.info["wrote_catalog"] = True
+    return version
+
+def _note_reminder_change(db: Session, kind: str, items=()):
+    # Applied to the reminder schedule once the transaction commits, see api/reminders.py.
+    if REMINDERS_ENABLED:
+        db.info.setdefault("reminder_changes", []).append((kind, items))
+
+def get_catalog_version(db: Session):
+    return db.execute(select(models.CatalogVersion.version)).scalar_one()
+
+def _read_plants(q, limit: int = None):
+    # Plant rows and the catalog version they are at least as new as: the one api.etag
+    # read for this request on the same session, or else catalog_version read in the same
+    # statement as the rows (None when there are none). The limit is applied here, since
+    # the join has to come before it.
+    version = read_version.get()
+    if version is not None:
+        return q.limit(limit).all(), version
+    rows = q.add_columns(models.CatalogVersion.version).join(models.CatalogVersion, true()).limit(limit).all()
+    return [row[0] for row in rows], rows[0][1] if rows else None
+
+def get_data_versions(db: Session, user_id: int):
+    # (user version, catalog version) in one round trip, or None if the user is gone.
+    row = db.execute(
+        select(models.User.data_version, models.CatalogVersion.version)
+        .join(models.CatalogVersion, true())
+        .where(models.User.id == user_id)
+    ).one_or_none()
+    return tuple(row) if row is not None else None
 
 def create_plant(db: Session, plant: schemas.PlantBase):
-    db_plant = models.Plant(
+    db_plant = _insert_returning(
+        db, models.Plant,
         name=plant.name,
-        scientific_name=plant.scientific_name,
+        # Unique when set; "" would collide with every other "".
+        scientific_name=plant.scientific_name or None,
         type=plant.type,
         created_at=datetime.datetime.utcnow(),
         watering_freq=plant.watering_freq,
@@ -70,83 +163,403 @@ def create_plant(db: Session, plant: schemas.PlantBase):
         sun_requirement=plant.sun_requirement,
         external_link=plant.external_link
     )
-    db.add(db_plant)
+    version = _bump_catalog_version(db)
+    _note_reminder_change(db, "plants", [(db_plant.id, db_plant.watering_freq, db_plant.watering_period, db_plant.watering_time)])
     db.commit()
-    db.refresh(db_plant)
+    plant_cache.put([db_plant], version)
+    plant_search.put([db_plant])
     return db_plant
 
 def update_plant(db: Session, plant: schemas.PlantResponse):
-    u = update(models.Plant) \
-        .values(plant.dict()) \
-        .where(models.Plant.id == plant.id)
-    db.execute(u)
+    values = plant.dict()
+    values["scientific_name"] = values["scientific_name"] or None
+    # The plant, or None when there is no such plant (and nothing was written).
+    db_plant = _update_returning(db, models.Plant, values, models.Plant.id == plant.id)
+    if db_plant is None:
+        db.commit()
+        return None
+    version = _bump_catalog_version(db)
+    _note_reminder_change(db, "plants", [(db_plant.id, db_plant.watering_freq, db_plant.watering_period, db_plant.watering_time)])
+    db.commit()
+    plant_cache.put([db_plant], version)
+    plant_search.put([db_plant])
+    return db_plant
+
+def _upsert(db: Session, table, key: str, columns: list):
+    # Imported here: loading every dialect at startup costs more than the rest of this module.
+    from sqlalchemy.dialects import mysql, postgresql, sqlite
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in columns})
+    stmt = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(table)
+    return stmt.on_conflict_do_update(index_elements=[key], set_={column: stmt.excluded[column] for column in columns})
+
+def upsert_plants(db: Session, plants: list):
+    # One executemany INSERT .. ON CONFLICT (scientific_name) DO UPDATE per batch, without
+    # committing: the caller commits once with finish_plant_import. Within a batch the
+    # last row for a scientific_name wins; rows without one are always inserted.
+    now = datetime.datetime.utcnow()
+    keyed, unkeyed = {}, []
+    for plant in plants:
+        row = plant.model_dump()
+        row["scientific_name"] = row["scientific_name"] or None
+        row["created_at"] = now
+        if row["scientific_name"] is None:
+            unkeyed.append(row)
+        else:
+            keyed[row["scientific_name"]] = row
+    columns = [column for column in schemas.PlantBase.model_fields if column != "scientific_name"]
+    db.execute(_upsert(db, models.Plant.__table__, "scientific_name", columns), list(keyed.values()) + unkeyed)
+
+def finish_plant_import(db: Session):
+    version = _bump_catalog_version(db)
+    _note_reminder_change(db, "catalog")
     db.commit()
-    return db.query(models.Plant).filter(models.Plant.id==plant.id).first()
+    plant_cache.sync(version)
+    plant_cache.invalidate()
+    plant_search.invalidate()
+
+def stream(db: Session, stmt, batch_size: int, scalars: bool = False):
+    # yield_per fetches through a server-side cursor where the driver has one, so only
+    # one batch of rows is held at a time.
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    if scalars:
+        result = result.scalars()
+    for partition in result.partitions():
+        yield partition
+
+def export_plants_query():
+    return select(models.Plant).order_by(models.Plant.id)
 
-def get_plants(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Plant).offset(skip).limit(limit).all()
+def _plants_page_query(db: Session, after: tuple = None):
+    # Catalog listing order is (name, id), see api.catalog.catalog_key.
+    q = db.query(models.Plant)
+    if after is not None:
+        q = q.filter(tuple_(models.Plant.name, models.Plant.id) > tuple_(*after))
+    return q.order_by(models.Plant.name, models.Plant.id)
+
+def get_plants(db: Session, after: tuple = None, limit: int = 100):
+    return _plants_page_query(db, after).limit(limit).all()
 
 def get_plant_by_id(db: Session, plant_id: int):
     return db.query(models.Plant).filter(models.Plant.id == plant_id).first()
 
+def get_cached_plants(db: Session, cursor: str = None, limit: int = 100):
+    after = tuple(pagination.decode_cursor(cursor, str, int)) if cursor is not None else None
+    entries = plant_cache.page(after, limit + 1)
+    if entries is None:
+        generation = plant_cache.generation()
+        catalog, version = _read_plants(db.query(models.Plant), plant_cache.max_size + 1)
+        if plant_cache.load(catalog, generation, version):
+            entries = plant_cache.page(after, limit + 1)
+        if entries is None:
+            # Too big to hold in full (or changed while loading): cache what this page
+            # touched and page through the database.
+            entries = plant_cache.put(*_read_plants(_plants_page_query(db, after), limit + 1))
+    return pagination.page(entries, limit, lambda entry: catalog_key(entry.plant))
+
+def get_cached_plant(db: Session, plant_id: int):
+    entry = plant_cache.get(plant_id)
+    if entry is None:
+        db_plants, version = _read_plants(db.query(models.Plant).filter(models.Plant.id == plant_id))
+        if db_plants:
+            entry = plant_cache.put(db_plants, version)[0]
+    return entry
+
+def get_cached_plants_by_id(db: Session, plant_ids):
+    # Plants the cache does not hold are fetched with a single IN query.
+    entries = {plant_id: plant_cache.get(plant_id) for plant_id in plant_ids}
+    missing = [plant_id for plant_id, entry in entries.items() if entry is None]
+    if missing:
+        for entry in plant_cache.put(*_read_plants(db.query(models.Plant).filter(models.Plant.id.in_(missing)))):
+            entries[entry.plant.id] = entry
+    return entries
+
+def load_plant_search(db: Session):
+    # Rebuilds the search index if it has expired; a write while it loads means retrying.
+    for _ in range(3):
+        if not plant_search.stale():
+            break
+        generation = plant_search.generation()
+        rows = db.query(models.Plant.id, models.Plant.name, models.Plant.scientific_name).all()
+        if plant_search.load(rows, generation):
+            break
+
+def search_plants(db: Session, q: str, limit: int = 20):
+    load_plant_search(db)
+    plant_ids = plant_search.search(q, limit)
+    entries = get_cached_plants_by_id(db, plant_ids)
+    return [entries[plant_id] for plant_id in plant_ids if entries[plant_id] is not None]
+
+def attach_plant_data(db: Session, user_plants: list):
+    # UserPlant.plant_data is filled from the catalog cache instead of a join.
+    entries = get_cached_plants_by_id(db, {up.plant_id for up in user_plants})
+    for user_plant in user_plants:
+        entry = entries.get(user_plant.plant_id)
+        set_committed_value(user_plant, "plant_data", entry.plant if entry is not None else None)
+    return user_plants
+
+def _user_plants_query(db: Session):
+    return db.query(models.UserPlant).options(raiseload(models.UserPlant.plant_data))
+
 def create_user_plant(db: Session, user_plant: schemas.UserPlantBase, current_user):
-    max_order = db.query(models.UserPlant.order).filter(models.UserPlant.user_id == current_user).order_by(desc(models.UserPlant.order)).first()
-    new_order = 1 if not max_order else max_order.order + 1
-    default_group = db.query(models.UserGroup.id) \
-        .filter(models.UserGroup.user_id == current_user) \
-        .filter(models.UserGroup.is_default) \
-        .first()
-    db_user_plant = models.UserPlant(
+    # The next order and the default group are worked out inside the INSERT.
+    default_group = select(models.UserGroup.id) \
+        .where(models.UserGroup.user_id == current_user) \
+        .where(models.UserGroup.is_default) \
+        .limit(1) \
+        .scalar_subquery()
+    db_user_plant = _insert_returning(
+        db, models.UserPlant,
         user_id=current_user,
         plant_id=user_plant.plant_id,
         nickname=user_plant.nickname,
         count=user_plant.count,
-        order=new_order,
-        user_group_id=user_plant.user_group_id if user_plant.user_group_id is not None else default_group.id,
+        order=select(func.coalesce(func.max(models.UserPlant.order), 0) + 1).where(models.UserPlant.user_id == current_user).scalar_subquery(),
+        user_group_id=user_plant.user_group_id if user_plant.user_group_id is not None else default_group,
         image_path=user_plant.image_path,
         created_at=datetime.datetime.utcnow()
     )
-    db.add(db_user_plant)
+    _bump_user_version(db, current_user)
+    _note_reminder_change(db, "added", [(db_user_plant.id, current_user, db_user_plant.plant_id, None, db_user_plant.created_at)])
     db.commit()
-    db.refresh(db_user_plant)
     return db_user_plant
 
 def update_user_plant(db: Session, plant_id: int, user_plant: schemas.UserPlantUpdate, current_user):
-    u = update(models.UserPlant) \
-        .values(user_plant.dict(exclude_none=True)) \
-        .where(models.UserPlant.id == plant_id) \
-        .where(models.UserPlant.user_id == current_user)
-    db.execute(u)
+    values = user_plant.dict(exclude_none=True)
+    if not values:
+        return get_user_plant_by_id(db, plant_id, current_user)
+    # The plant, or None when the user has no such plant (and nothing was written).
+    res = _update_returning(db, models.UserPlant, values, models.UserPlant.id == plant_id, models.UserPlant.user_id == current_user)
+    if res is not None:
+        _bump_user_version(db, current_user)
     db.commit()
-    return db.query(models.UserPlant).filter(models.UserPlant.id == plant_id).first()
+    return attach_plant_data(db, [res])[0] if res is not None else None
 
-def get_user_plants(db: Session, current_user):
-    res = db.query(models.UserPlant) \
-        .filter(models.UserPlant.user_id == current_user) \
-        .order_by(models.UserPlant.plant_data.name).all()
-    return res
+class InvalidBatchOperation(ValueError):
+    def __init__(self, index: int, message: str):
+        super().__init__(f"operations.{index}: {message}")
+
+
+def apply_user_plant_batch(db: Session, batch: schemas.UserPlantBatchInput, current_user):
+    # Everything the operations refer to is checked up front, with one query for the
+    # user's groups and one for the plants they touch; orders are then worked out in
+    # memory and written with one INSERT and one executemany UPDATE, in one commit.
+    ops = batch.operations
+    referenced = {op.id for op in ops if op.op in ("update", "move")} | {i for op in ops if op.op == "reorder" for i in op.ids}
+    groups = db.execute(
+        select(models.UserGroup.id, models.UserGroup.is_default)
+        .where(models.UserGroup.user_id == current_user)
+        .where(models.UserGroup.deleted_at == None)
+    ).all()
+    group_ids = {row.id for row in groups}
+    default_group = next((row.id for row in groups if row.is_default), None)
+    orders = dict(db.execute(
+        select(models.UserPlant.id, models.UserPlant.order)
+        .where(models.UserPlant.user_id == current_user)
+        .where(models.UserPlant.deleted_at == None)
+        .where(models.UserPlant.id.in_(referenced))
+    ).all()) if referenced else {}
+    catalog = get_cached_plants_by_id(db, {op.plant_id for op in ops if op.op == "create"})
+
+    def check_group(i, group_id):
+        if group_id is not None and group_id not in group_ids:
+            raise InvalidBatchOperation(i, f"group {group_id} not found")
+
+    def check_owned(i, plant_ids):
+        missing = [plant_id for plant_id in plant_ids if plant_id not in orders]
+        if missing:
+            raise InvalidBatchOperation(i, f"user plant {missing[0]} not found")
+
+    creates, changes = [], {}
+    for i, op in enumerate(ops):
+        if op.op == "create":
+            if catalog.get(op.plant_id) is None:
+                raise InvalidBatchOperation(i, f"plant {op.plant_id} not found")
+            check_group(i, op.user_group_id)
+            if op.user_group_id is None and default_group is None:
+                raise InvalidBatchOperation(i, "no default group")
+            creates.append(op)
+        elif op.op == "update":
+            check_owned(i, [op.id])
+            values = op.model_dump(exclude_none=True, exclude={"op", "id"})
+            check_group(i, values.get("user_group_id"))
+            if "order" in values:
+                orders[op.id] = values["order"]
+            changes.setdefault(op.id, {}).update(values)
+        elif op.op == "move":
+            check_owned(i, [op.id])
+            check_group(i, op.user_group_id)
+            changes.setdefault(op.id, {})["user_group_id"] = op.user_group_id
+        else:
+            if len(set(op.ids)) != len(op.ids):
+                raise InvalidBatchOperation(i, "ids repeat")
+            check_owned(i, op.ids)
+            # The listed plants take over the order values they hold between them.
+            slots = sorted((orders[plant_id] for plant_id in op.ids), key=lambda order: (order is None, order))
+            for plant_id, order in zip(op.ids, slots):
+                if orders[plant_id] != order:
+                    orders[plant_id] = order
+                    changes.setdefault(plant_id, {})["order"] = order
+
+    created_ids = []
+    if creates:
+        max_order = db.execute(select(func.max(models.UserPlant.order)).where(models.UserPlant.user_id == current_user)).scalar() or 0
+        now = datetime.datetime.utcnow()
+        rows = [
+            {
+                "user_id": current_user,
+                "plant_id": op.plant_id,
+                "nickname": op.nickname,
+                "count": op.count,
+                "order": max_order + n,
+                "user_group_id": op.user_group_id if op.user_group_id is not None else default_group,
+                "image_path": op.image_path,
+                "created_at": now
+            }
+            for n, op in enumerate(creates, start=1)
+        ]
+        # The new orders are unique, so they give the ids back in operation order without
+        # sort_by_parameter_order (which falls back to one INSERT per row on SQLite).
+        inserted = db.execute(insert(models.UserPlant).returning(models.UserPlant.id, models.UserPlant.order), rows).all()
+        created_ids = [row.id for row in sorted(inserted, key=lambda row: row.order)]
+        _note_reminder_change(db, "added", [(plant_id, current_user, op.plant_id, None, now) for plant_id, op in zip(created_ids, creates)])
+    if changes:
+        db.execute(update(models.UserPlant), [{"id": plant_id, **values} for plant_id, values in changes.items()])
+    _bump_user_version(db, current_user)
+    db.commit()
+    return {"created_ids": created_ids, "updated_ids": list(changes)}
 
 def get_user_plant_by_id(db: Session, plant_id: int, current_user):
-    res = db.query(models.UserPlant) \
+    res = _user_plants_query(db) \
         .filter(models.UserPlant.user_id == current_user) \
         .filter(models.UserPlant.id == plant_id) \
         .first()
-    return res
+    return attach_plant_data(db, [res])[0] if res else res
 
 def get_deleted_user_plants(db: Session, current_user):
-    res = db.query(models.UserPlant) \
+    res = _user_plants_query(db) \
         .filter(models.UserPlant.user_id == current_user) \
+        .filter(models.UserPlant.deleted_at.is_not(None)) \
         .all()
+    return attach_plant_data(db, res)
+
+def set_user_plant_image(db: Session, plant_id: int, image_key: str, current_user):
+    res = _update_returning(
+        db, models.UserPlant,
+        {"image_key": image_key, "image_path": f"/api/userplants/{plant_id}/image/"},
+        models.UserPlant.id == plant_id, models.UserPlant.user_id == current_user
+    )
+    _bump_user_version(db, current_user)
+    db.commit()
     return res
 
-def water_plants(db: Session, plant_ids: schemas.WaterPlantsInput, current_user):
-    u = update(models.UserPlant) \
-        .values({"last_watered": datetime.datetime.utcnow()}) \
-        .where(models.UserPlant.id.in_(plant_ids.plant_ids)) \
+def get_user_plant_image_key(db: Session, plant_id: int, current_user):
+    return db.execute(
+        select(models.UserPlant.image_key)
+        .where(models.UserPlant.id == plant_id)
         .where(models.UserPlant.user_id == current_user)
-    db.execute(u)
+    ).scalar_one_or_none()
+
+def get_owned_user_plant_ids(db: Session, plant_ids: list, current_user):
+    res = db.query(models.UserPlant.id) \
+        .filter(models.UserPlant.id.in_(plant_ids)) \
+        .filter(models.UserPlant.user_id == current_user) \
+        .all()
+    return [row.id for row in res]
+
+def record_waterings(db: Session, events: list):
+    # events: (user_plant_id, user_id, watered_at) tuples, already checked for ownership.
+    # One multi-row INSERT for the log, one executemany UPDATE for last_watered.
+    db.execute(
+        insert(models.WateringEvent),
+        [{"user_plant_id": plant_id, "user_id": user_id, "watered_at": watered_at} for plant_id, user_id, watered_at in events]
+    )
+    latest = {}
+    for plant_id, _, watered_at in events:
+        if plant_id not in latest or watered_at > latest[plant_id]:
+            latest[plant_id] = watered_at
+    user_plants = models.UserPlant.__table__
+    u = update(user_plants) \
+        .values(last_watered=bindparam("b_watered_at")) \
+        .where(user_plants.c.id == bindparam("b_id")) \
+        .where(or_(user_plants.c.last_watered == None, user_plants.c.last_watered < bindparam("b_watered_at")))
+    db.execute(u, [{"b_id": plant_id, "b_watered_at": watered_at} for plant_id, watered_at in latest.items()])
+    _bump_user_version(db, *{user_id for _, user_id, _ in events})
+    _note_reminder_change(db, "watered", list(latest.items()))
     db.commit()
-    return plant_ids
+
+def water_plants(db: Session, plant_ids: schemas.WaterPlantsInput, current_user):
+    owned = get_owned_user_plant_ids(db, plant_ids.plant_ids, current_user)
+    if owned:
+        watered_at = datetime.datetime.utcnow()
+        record_waterings(db, [(plant_id, current_user, watered_at) for plant_id in owned])
+    return owned
+
+def get_watering_events(db: Session, plant_id: int, current_user, cursor: str = None, limit: int = 50):
+    q = db.query(models.WateringEvent) \
+        .filter(models.WateringEvent.user_plant_id == plant_id) \
+        .filter(models.WateringEvent.user_id == current_user)
+    if cursor is not None:
+        watered_at, event_id = pagination.decode_cursor(cursor, datetime.datetime, int)
+        q = q.filter(tuple_(models.WateringEvent.watered_at, models.WateringEvent.id) < tuple_(watered_at, event_id))
+    rows = q.order_by(desc(models.WateringEvent.watered_at), desc(models.WateringEvent.id)).limit(limit + 1).all()
+    return pagination.page(rows, limit, lambda event: (event.watered_at, event.id))
+
+def get_watering_columns(db: Session, current_user=None):
+    # current_user=None loads every user's plants, for schedulers working across users.
+    q = db.query(
+            models.UserPlant.id,
+            models.UserPlant.user_id,
+            models.UserPlant.last_watered,
+            models.UserPlant.created_at,
+            models.Plant.watering_freq,
+            models.Plant.watering_period,
+            models.Plant.watering_time
+        ) \
+        .join(models.Plant, models.Plant.id == models.UserPlant.plant_id) \
+        .filter(models.UserPlant.deleted_at == None) \
+        .filter(models.Plant.watering_freq != None) \
+        .filter(models.Plant.watering_period != None)
+    if current_user is not None:
+        q = q.filter(models.UserPlant.user_id == current_user)
+    return schedule.build_columns(q.yield_per(10000))
+
+def get_watering_plans(db: Session):
+    return db.execute(select(models.Plant.id, models.Plant.watering_freq, models.Plant.watering_period, models.Plant.watering_time)).all()
+
+def stream_reminder_rows(db: Session, after_id: int, batch_size: int):
+    # Every user plant above after_id, in id order; plants without a schedule included,
+    # since their catalog entry may get one.
+    stmt = select(models.UserPlant.id, models.UserPlant.user_id, models.UserPlant.plant_id, models.UserPlant.last_watered, models.UserPlant.created_at) \
+        .where(models.UserPlant.id > after_id) \
+        .where(models.UserPlant.deleted_at == None) \
+        .order_by(models.UserPlant.id)
+    return stream(db, stmt, batch_size)
+
+def get_reminder_rows(db: Session, user_plant_ids: list):
+    return db.execute(
+        select(models.UserPlant.id, models.UserPlant.user_id, models.UserPlant.plant_id, models.UserPlant.last_watered,
+               models.UserPlant.created_at, models.Plant.watering_freq, models.Plant.watering_period, models.Plant.watering_time)
+        .join(models.Plant, models.Plant.id == models.UserPlant.plant_id)
+        .where(models.UserPlant.id.in_(user_plant_ids))
+        .where(models.UserPlant.deleted_at == None)
+    ).all()
+
+def get_due_user_plants(db: Session, current_user, within_hours: float = 0, limit: int = None):
+    columns = get_watering_columns(db, current_user)
+    now = time.time()
+    plan = schedule.compute_schedule(columns, now)
+    return [
+        {
+            "id": int(columns.user_plant_id[i]),
+            "last_watered": schedule.from_epoch(columns.last_watered[i]),
+            "next_due": schedule.from_epoch(plan.next_due[i]),
+            "overdue_seconds": float(plan.overdue[i])
+        }
+        for i in schedule.due_order(plan, now, within_hours * 3600, limit)
+    ]
 
 def delete_user_plant(db: Session, plant_id: int, current_user):
     u = update(models.UserPlant) \
@@ -154,29 +567,32 @@ def delete_user_plant(db: Session, plant_id: int, current_user):
         .where(models.UserPlant.id == plant_id) \
         .where(models.UserPlant.user_id == current_user)
     result = db.execute(u)
+    if result.rowcount:
+        _bump_user_version(db, current_user)
+        _note_reminder_change(db, "removed", [plant_id])
     db.commit()
     return result
 
 def create_user_group(db: Session, group: schemas.UserGroupInput, current_user):
-    db_group = models.UserGroup(
+    db_group = _insert_returning(
+        db, models.UserGroup,
         name=group.name,
         user_id=current_user,
         is_default=group.is_default,
         created_at=datetime.datetime.utcnow()
     )
-    db.add(db_group)
+    _bump_user_version(db, current_user)
     db.commit()
-    db.refresh(db_group)
     return db_group
 
 def update_user_group(db: Session, group_id: int, group: schemas.UserGroupBase, current_user: schemas.User):
-    u = update(models.UserGroup) \
-        .values({"name": group.name}) \
-        .where(models.UserGroup.id == group_id) \
-        .where(models.UserGroup.user_id == current_user)
-    db.execute(u)
+    # The group, or None when the user has no such group (and nothing was written).
+    db_group = _update_returning(db, models.UserGroup, {"name": group.name},
+                                 models.UserGroup.id == group_id, models.UserGroup.user_id == current_user)
+    if db_group is not None:
+        _bump_user_version(db, current_user)
     db.commit()
-    return u
+    return db_group
 
 def get_user_group_by_id(db: Session, group_id: int, current_user: schemas.User):
     res = db.query(models.UserGroup) \
@@ -196,6 +612,26 @@ def get_user_groups(db: Session, current_user):
         .all()
     return res
 
+def get_dashboard(db: Session, current_user, include_notes: bool = False):
+    # One query for the groups and one IN query for their plants; catalog data comes from
+    # the plant cache. Notes are only loaded on request, and then with their own IN query,
+    # so a plant row is never repeated once per note.
+    plants = selectinload(models.UserGroup.plants)
+    options = [plants.raiseload(models.UserPlant.plant_data)]
+    if include_notes:
+        options.append(plants.selectinload(models.UserPlant.note_data))
+    res = db.query(models.UserGroup) \
+        .options(*options) \
+        .filter(models.UserGroup.user_id == current_user) \
+        .filter(models.UserGroup.deleted_at == None) \
+        .order_by(
+            case((models.UserGroup.is_default == True, 1), else_=0),
+            models.UserGroup.name
+        ) \
+        .all()
+    attach_plant_data(db, [plant for group in res for plant in group.plants])
+    return res
+
 def get_has_default_group(db: Session, current_user):
     default_group = db.query(models.UserGroup.id) \
         .filter(models.UserGroup.user_id == current_user) \
@@ -205,21 +641,73 @@ def get_has_default_group(db: Session, current_user):
     return default_group is not None
 
 def create_user_plant_note(db: Session, plant_id: int, note: schemas.UserPlantNoteBase, current_user):
-    db_note = models.UserPlantNotes(
+    db_note = _insert_returning(
+        db, models.UserPlantNotes,
         user_plant_id=plant_id,
         user_id=current_user,
         created_at=datetime.datetime.utcnow(),
         note=note.note
     )
-    db.add(db_note)
+    _bump_user_version(db, current_user)
     db.commit()
-    db.refresh(db_note)
+    note_search.put(current_user, db_note.id, db_note.note)
     return db_note
 
-def get_user_plant_notes(db: Session, plant_id: models.UserPlantNotes.user_plant_id, current_user: int):
-    notes = db.query(models.UserPlantNotes) \
+def get_user_plant_notes(db: Session, plant_id: models.UserPlantNotes.user_plant_id, current_user: int, cursor: str = None, limit: int = 100):
+    q = db.query(models.UserPlantNotes) \
         .filter(models.UserPlantNotes.user_plant_id == plant_id) \
-        .filter(models.UserPlantNotes.user_id == current_user) \
-        .order_by(desc(models.UserPlantNotes.created_at)) \
-        .all()
-    return notes
+        .filter(models.UserPlantNotes.user_id == current_user)
+    if cursor is not None:
+        created_at, note_id = pagination.decode_cursor(cursor, datetime.datetime, int)
+        q = q.filter(tuple_(models.UserPlantNotes.created_at, models.UserPlantNotes.id) < tuple_(created_at, note_id))
+    notes = q.order_by(desc(models.UserPlantNotes.created_at), desc(models.UserPlantNotes.id)).limit(limit + 1).all()
+    return pagination.page(notes, limit, lambda note: (note.created_at, note.id))
+
+def search_user_plant_notes(db: Session, q: str, current_user: int, cursor: str = None, limit: int = 20):
+    # Catches the user's index up with notes written since it last read them (all of
+    # them, the first time), then reads only the notes on the page.
+    index = note_search.index_for(current_user)
+    new_notes = select(models.UserPlantNotes.id, models.UserPlantNotes.note) \
+        .where(models.UserPlantNotes.user_id == current_user) \
+        .where(models.UserPlantNotes.deleted_at.is_(None)) \
+        .where(models.UserPlantNotes.id > index.synced_to) \
+        .order_by(models.UserPlantNotes.id)
+    for rows in stream(db, new_notes, 10000):
+        index.add_synced(rows)
+    after = pagination.decode_cursor(cursor, int, (int, float), int) if cursor is not None else None
+    ranked, words = note_search.search(index, q, after, limit + 1)
+    result = pagination.page(ranked, limit, lambda key: key)
+    if not result["items"]:
+        return result
+    notes = {note.id: note for note in db.execute(
+        select(models.UserPlantNotes.id, models.UserPlantNotes.user_plant_id, models.UserPlantNotes.created_at, models.UserPlantNotes.note)
+        .where(models.UserPlantNotes.id.in_([note_id for _, _, note_id in result["items"]]))
+        .where(models.UserPlantNotes.user_id == current_user)
+    )}
+    hits = []
+    for _, score, note_id in result["items"]:
+        note = notes.get(note_id)
+        if note is not None:
+            text, highlights = snippet(note.note or "", words)
+            hits.append({"id": note_id, "user_plant_id": note.user_plant_id, "created_at": note.created_at,
+                         "snippet": text, "highlights": highlights, "score": score})
+    result["items"] = hits
+    return result
+
+def _owned_columns(model):
+    return [column for column in model.__table__.c if column.name != "user_id"]
+
+def export_user_collection_queries(current_user: int):
+    """(record type, statement) for everything a user owns, deleted rows included, in
+    the order an export writes them."""
+    return [
+        ("group", select(*_owned_columns(models.UserGroup))
+            .where(models.UserGroup.user_id == current_user)
+            .order_by(models.UserGroup.id)),
+        ("user_plant", select(*_owned_columns(models.UserPlant))
+            .where(models.UserPlant.user_id == current_user)
+            .order_by(models.UserPlant.id)),
+        ("note", select(*_owned_columns(models.UserPlantNotes))
+            .where(models.UserPlantNotes.user_id == current_user)
+            .order_by(models.UserPlantNotes.id)),
+    ]
@@ -0,0 +1,163 @@
+"""Awaitable versions of the functions in api.crud.
+
+The query logic lives once, in api.crud. With an AsyncSession each call runs through
+AsyncSession.run_sync, so the driver I/O is awaited on the event loop. With a plain
+Session (DB_ASYNC off) the call is pushed to the threadpool instead of blocking the loop.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from . import crud, schemas
+from .database import AnySession
+
+
+async def _run(db: AnySession, fn, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def get_user(db: AnySession, user_id: int):
+    return await _run(db, crud.get_user, user_id)
+
+
+async def get_user_by_username(db: AnySession, username: str):
+    return await _run(db, crud.get_user_by_username, username)
+
+
+async def get_users(db: AnySession, cursor: str = None, limit: int = 100):
+    return await _run(db, crud.get_users, cursor, limit)
+
+async def invite_user(db: AnySession, user: schemas.UserBase):
+    return await _run(db, crud.invite_user, user)
+
+async def get_existing_invite(db: AnySession, user: schemas.UserBase):
+    return await _run(db, crud.get_existing_invite, user)
+
+async def get_invited_users(db: AnySession, cursor: str = None, limit: int = 100):
+    return await _run(db, crud.get_invited_users, cursor, limit)
+
+async def create_user(db: AnySession, user: schemas.UserIn, hashed_password: str):
+    return await _run(db, crud.create_user, user, hashed_password)
+
+async def change_my_password(db: AnySession, hashed_password: str, current_user: int):
+    return await _run(db, crud.change_my_password, hashed_password, current_user)
+
+async def get_catalog_version(db: AnySession):
+    return await _run(db, crud.get_catalog_version)
+
+async def get_data_versions(db: AnySession, user_id: int):
+    return await _run(db, crud.get_data_versions, user_id)
+
+async def create_plant(db: AnySession, plant: schemas.PlantBase):
+    return await _run(db, crud.create_plant, plant)
+
+async def update_plant(db: AnySession, plant: schemas.PlantResponse):
+    return await _run(db, crud.update_plant, plant)
+
+async def get_plants(db: AnySession, after: tuple = None, limit: int = 100):
+    return await _run(db, crud.get_plants, after, limit)
+
+async def get_plant_by_id(db: AnySession, plant_id: int):
+    return await _run(db, crud.get_plant_by_id, plant_id)
+
+async def get_cached_plants(db: AnySession, cursor: str = None, limit: int = 100):
+    return await _run(db, crud.get_cached_plants, cursor, limit)
+
+async def get_cached_plant(db: AnySession, plant_id: int):
+    return await _run(db, crud.get_cached_plant, plant_id)
+
+async def search_plants(db: AnySession, q: str, limit: int = 20):
+    return await _run(db, crud.search_plants, q, limit)
+
+async def upsert_plants(db: AnySession, plants: list):
+    return await _run(db, crud.upsert_plants, plants)
+
+async def finish_plant_import(db: AnySession):
+    return await _run(db, crud.finish_plant_import)
+
+async def stream(db: AnySession, stmt, batch_size: int, scalars: bool = False):
+    if isinstance(db, AsyncSession):
+        result = await db.stream(stmt.execution_options(yield_per=batch_size))
+        if scalars:
+            result = result.scalars()
+        async for partition in result.partitions():
+            yield partition
+    else:
+        partitions = crud.stream(db, stmt, batch_size, scalars)
+        while (partition := await run_in_threadpool(next, partitions, None)) is not None:
+            yield partition
+
+async def stream_plants(db: AnySession, batch_size: int):
+    async for partition in stream(db, crud.export_plants_query(), batch_size, scalars=True):
+        yield partition
+
+async def get_cached_plants_by_id(db: AnySession, plant_ids):
+    return await _run(db, crud.get_cached_plants_by_id, plant_ids)
+
+async def create_user_plant(db: AnySession, user_plant: schemas.UserPlantBase, current_user):
+    return await _run(db, crud.create_user_plant, user_plant, current_user)
+
+async def update_user_plant(db: AnySession, plant_id: int, user_plant: schemas.UserPlantUpdate, current_user):
+    return await _run(db, crud.update_user_plant, plant_id, user_plant, current_user)
+
+async def apply_user_plant_batch(db: AnySession, batch: schemas.UserPlantBatchInput, current_user):
+    return await _run(db, crud.apply_user_plant_batch, batch, current_user)
+
+async def get_user_plant_by_id(db: AnySession, plant_id: int, current_user):
+    return await _run(db, crud.get_user_plant_by_id, plant_id, current_user)
+
+async def get_deleted_user_plants(db: AnySession, current_user):
+    return await _run(db, crud.get_deleted_user_plants, current_user)
+
+async def set_user_plant_image(db: AnySession, plant_id: int, image_key: str, current_user):
+    return await _run(db, crud.set_user_plant_image, plant_id, image_key, current_user)
+
+async def get_user_plant_image_key(db: AnySession, plant_id: int, current_user):
+    return await _run(db, crud.get_user_plant_image_key, plant_id, current_user)
+
+async def search_user_plant_notes(db: AnySession, q: str, current_user: int, cursor: str = None, limit: int = 20):
+    return await _run(db, crud.search_user_plant_notes, q, current_user, cursor, limit)
+
+async def get_owned_user_plant_ids(db: AnySession, plant_ids: list, current_user):
+    return await _run(db, crud.get_owned_user_plant_ids, plant_ids, current_user)
+
+async def water_plants(db: AnySession, plant_ids: schemas.WaterPlantsInput, current_user):
+    return await _run(db, crud.water_plants, plant_ids, current_user)
+
+async def get_watering_events(db: AnySession, plant_id: int, current_user, cursor: str = None, limit: int = 50):
+    return await _run(db, crud.get_watering_events, plant_id, current_user, cursor, limit)
+
+async def get_due_user_plants(db: AnySession, current_user, within_hours: float = 0, limit: int = None):
+    return await _run(db, crud.get_due_user_plants, current_user, within_hours, limit)
+
+async def delete_user_plant(db: AnySession, plant_id: int, current_user):
+    return await _run(db, crud.delete_user_plant, plant_id, current_user)
+
+async def create_user_group(db: AnySession, group: schemas.UserGroupInput, current_user):
+    return await _run(db, crud.create_user_group, group, current_user)
+
+async def update_user_group(db: AnySession, group_id: int, group: schemas.UserGroupBase, current_user: schemas.User):
+    return await _run(db, crud.update_user_group, group_id, group, current_user)
+
+async def get_user_group_by_id(db: AnySession, group_id: int, current_user: schemas.User):
+    return await _run(db, crud.get_user_group_by_id, group_id, current_user)
+
+async def get_user_groups(db: AnySession, current_user):
+    return await _run(db, crud.get_user_groups, current_user)
+
+async def get_dashboard(db: AnySession, current_user, include_notes: bool = False):
+    return await _run(db, crud.get_dashboard, current_user, include_notes)
+
+async def get_has_default_group(db: AnySession, current_user):
+    return await _run(db, crud.get_has_default_group, current_user)
+
+async def create_user_plant_note(db: AnySession, plant_id: int, note: schemas.UserPlantNoteBase, current_user):
+    return await _run(db, crud.create_user_plant_note, plant_id, note, current_user)
+
+async def get_user_plant_notes(db: AnySession, plant_id: int, current_user: int, cursor: str = None, limit: int = 100):
+    return await _run(db, crud.get_user_plant_notes, plant_id, current_user, cursor, limit)
+
+async def stream_user_collection(db: AnySession, current_user: int, batch_size: int):
+    for kind, stmt in crud.export_user_collection_queries(current_user):
+        async for rows in stream(db, stmt, batch_size):
+            yield kind, rows
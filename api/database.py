@@ -1,16 +1,107 @@
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from typing import Union
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from .settings import DB_URL
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from . import metrics
+from .settings import DB_URL, DB_ASYNC, DB_ASYNC_URL, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT_SECONDS, \
+    DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING, DB_REPLICA_URLS, DB_ASYNC_REPLICA_URLS
 
-engine = create_engine(DB_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Every engine by name, sync ones and the sync side of async ones, for pool statistics.
+engines = {}
+
+
+def _engine_options(url: str) -> dict:
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE_SECONDS}
+    # Only queue pools take sizing; SQLite in memory and aiosqlite use pools that do not.
+    u = make_url(url)
+    if issubclass(u.get_dialect().get_pool_class(u), QueuePool):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT_SECONDS)
+    return options
+
+
+def _create_engine(name: str, url: str):
+    engine = create_engine(url, **_engine_options(url))
+    metrics.instrument_engine(engine)
+    engines[name] = engine
+    return engine
+
+
+def _create_async_engine(name: str, url: str):
+    engine = create_async_engine(url, **_engine_options(url))
+    metrics.instrument_engine(engine.sync_engine)
+    engines[name] = engine.sync_engine
+    return engine
+
+
+engine = _create_engine("primary", DB_URL)
+# Rows written with RETURNING are complete when committed; expiring them would cost a
+# SELECT each when the response is serialized.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+async_engine = _create_async_engine("primary-async", DB_ASYNC_URL) if DB_ASYNC else None
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if DB_ASYNC else None
+
+# Read replicas, of whichever kind get_db serves; api/replicas.py routes GET routes to them.
+if DB_ASYNC:
+    replica_engines = [_create_async_engine(f"replica-{i}-async", url) for i, url in enumerate(DB_ASYNC_REPLICA_URLS)]
+    ReplicaSessionLocals = [async_sessionmaker(e, autoflush=False, expire_on_commit=False) for e in replica_engines]
+else:
+    replica_engines = [_create_engine(f"replica-{i}", url) for i, url in enumerate(DB_REPLICA_URLS)]
+    ReplicaSessionLocals = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in replica_engines]
+
+AnySession = Union[Session, AsyncSession]
 
 Base = declarative_base()
 
-def get_db():
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Routers depend on get_db and hand the session to api.crud_async, which accepts either kind.
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+async def close_db(db: AnySession):
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+@asynccontextmanager
+async def open_db():
+    # For streaming responses: the body is sent after the get_db dependency has closed its
+    # session, so the generator opens and closes its own.
+    db = AsyncSessionLocal() if DB_ASYNC else SessionLocal()
+    try:
+        yield db
+    finally:
+        await close_db(db)
+
+
+def pool_stats() -> dict:
+    stats = {}
+    for name, e in engines.items():
+        pool = e.pool
+        # Only queue pools keep counts; SQLite in memory uses a single connection.
+        if hasattr(pool, "checkedout"):
+            stats[name] = {"size": pool.size(), "checked_out": pool.checkedout(), "checked_in": pool.checkedin(), "overflow": max(pool.overflow(), 0)}
+    return stats
+
+
+def _collect_pool_metrics():
+    for name, counts in pool_stats().items():
+        for state, value in counts.items():
+            metrics.pool_connections.set(value, name, state)
+
+
+metrics.collectors.append(_collect_pool_metrics)
@@ -0,0 +1,62 @@
+"""Conditional GET for polled endpoints.
+
+ETags are built from the version counters the crud write functions bump (users.data_version
+and catalog_version), so checking If-None-Match costs one small query and a match is
+answered with a 304 before the route's own queries run. The version is read before the
+payload, and from the same (possibly replica) session, so an ETag never names data newer
+than the body it was sent with. Catalog bodies come from this worker's plant cache, so the
+catalog version read here is also handed to it: the cache drops whatever it loaded before
+a newer version, and only takes rows this request reads if they are at least that new.
+"""
+from typing import Annotated
+from fastapi import Depends, HTTPException, Request, Response, status
+from api import crud_async
+from api.auth.controller import get_current_user
+from api.catalog import plant_cache, read_version
+from api.database import AnySession
+from api.replicas import get_read_db
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/"x" matches "x".
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _read_catalog_version(version: int):
+    plant_cache.sync(version)
+    read_version.set(version)
+
+
+def conditional(request: Request, response: Response, etag: str, cache_control: str) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _matches(request.headers.get("if-none-match", ""), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return headers
+
+
+async def catalog_etag(request: Request, response: Response, db: AnySession = Depends(get_read_db)) -> dict:
+    """For routes that only read the catalog. Returns the headers, for routes that build
+    their own Response (the ones set here only reach responses FastAPI builds)."""
+    version = await crud_async.get_catalog_version(db)
+    _read_catalog_version(version)
+    return conditional(request, response, f'"c{version}"', "no-cache")
+
+
+async def user_etag(
+        request: Request,
+        response: Response,
+        current_user: Annotated[int, Depends(get_current_user)],
+        db: AnySession = Depends(get_read_db)
+) -> dict:
+    """For routes that read the current user's data, and catalog data along with it."""
+    versions = await crud_async.get_data_versions(db, current_user)
+    if versions is None:
+        # A token still valid for a user deleted since it was issued.
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials",
+                            headers={"WWW-Authenticate": "Bearer"})
+    user_version, catalog_version = versions
+    _read_catalog_version(catalog_version)
+    return conditional(request, response, f'"u{current_user}.{user_version}.{catalog_version}"', "private, no-cache")
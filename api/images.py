@@ -0,0 +1,226 @@
+"""Plant photos, stored by content.
+
+An upload is streamed to a temporary file in IMAGE_STORAGE_DIR while it is hashed, and
+then renamed to ``<sha256>.<ext>`` in a directory named after the hash's first two
+digits. That name is the image key kept in user_plants.image_key: the same photo
+uploaded twice (or for two plants) is stored once, and a stored file never changes, so
+its name doubles as its ETag.
+
+A thumbnail and a preview (JPEGs no larger than IMAGE_THUMBNAIL_SIZE and
+IMAGE_PREVIEW_SIZE pixels a side) are rendered after the upload has been answered, in a
+pool of IMAGE_WORKERS processes, so decoding and resizing neither blocks the event loop
+nor holds the GIL. Until they exist the original is served in their place.
+
+Besides the standard library and api.settings this module only imports starlette's
+threadpool helper, so the worker processes, which import it to find render_variants,
+start quickly; Pillow is imported by the workers alone.
+"""
+import concurrent.futures
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import partial
+from typing import AsyncIterator, Optional
+from starlette.concurrency import run_in_threadpool
+from api.settings import IMAGE_STORAGE_DIR, IMAGE_MAX_BYTES, IMAGE_WORKERS, IMAGE_THUMBNAIL_SIZE, IMAGE_PREVIEW_SIZE, \
+    IMAGE_JPEG_QUALITY
+
+logger = logging.getLogger(__name__)
+
+# (magic bytes, offset, extension, media type)
+_FORMATS = [
+    (b"\xff\xd8\xff", 0, "jpg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "png", "image/png"),
+    (b"GIF87a", 0, "gif", "image/gif"),
+    (b"GIF89a", 0, "gif", "image/gif"),
+    (b"WEBP", 8, "webp", "image/webp"),
+]
+MEDIA_TYPES = {ext: media_type for _, _, ext, media_type in _FORMATS}
+# Uploads are written in pieces of at least this size, each hashed and written in the
+# threadpool (hashlib releases the GIL on large buffers).
+_WRITE_SIZE = 1024 * 1024
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class StoredImage:
+    key: str
+    size: int
+
+
+def sniff(head: bytes) -> Optional[str]:
+    for magic, offset, ext, _ in _FORMATS:
+        if head[offset:offset + len(magic)] == magic:
+            return ext
+    return None
+
+
+def _digest(key: str) -> str:
+    return key.split(".", 1)[0]
+
+
+def original_path(key: str) -> str:
+    return os.path.join(IMAGE_STORAGE_DIR, key[:2], key)
+
+
+def variant_path(key: str, size: str) -> str:
+    digest = _digest(key)
+    return os.path.join(IMAGE_STORAGE_DIR, digest[:2], f"{digest}.{size}.jpg")
+
+
+def locate(key: str, size: str) -> tuple[str, os.stat_result, str]:
+    """(path, stat, media type) of the file to serve for a size, falling back to the
+    original while the variant has not been rendered. Raises FileNotFoundError."""
+    if size != "original":
+        path = variant_path(key, size)
+        try:
+            return path, os.stat(path), "image/jpeg"
+        except FileNotFoundError:
+            pass
+    path = original_path(key)
+    return path, os.stat(path), MEDIA_TYPES[key.rsplit(".", 1)[1]]
+
+
+def _write(f, digest, data: bytes):
+    digest.update(data)
+    f.write(data)
+
+
+def _commit(temp: str, digest: str, ext: str) -> str:
+    key = f"{digest}.{ext}"
+    path = original_path(key)
+    if os.path.exists(path):
+        os.remove(temp)
+        return key
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(temp, path)
+    return key
+
+
+async def store(chunks: AsyncIterator[bytes], max_bytes: int = IMAGE_MAX_BYTES) -> StoredImage:
+    """Streams an upload to storage. Raises UnsupportedImage if it does not start like a
+    JPEG, PNG, GIF or WebP file and ImageTooLarge past max_bytes; nothing is kept then."""
+    os.makedirs(IMAGE_STORAGE_DIR, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=IMAGE_STORAGE_DIR, suffix=".upload")
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    buffer = bytearray()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageTooLarge(f"Images are limited to {max_bytes} bytes")
+                buffer += chunk
+                if ext is None and len(buffer) >= 12:
+                    ext = sniff(bytes(buffer[:12]))
+                    if ext is None:
+                        raise UnsupportedImage("Only JPEG, PNG, GIF and WebP images are accepted")
+                if len(buffer) >= _WRITE_SIZE:
+                    await run_in_threadpool(_write, f, digest, bytes(buffer))
+                    buffer.clear()
+            if ext is None:
+                raise UnsupportedImage("Only JPEG, PNG, GIF and WebP images are accepted")
+            await run_in_threadpool(_write, f, digest, bytes(buffer))
+        key = await run_in_threadpool(_commit, temp, digest.hexdigest(), ext)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return StoredImage(key=key, size=size)
+
+
+def render_variants(original: str, targets: list, quality: int):
+    """Runs in a worker process. targets is [(path, longest side)], rendered largest
+    first, each from the one before."""
+    from PIL import Image, ImageOps
+
+    with Image.open(original) as image:
+        largest = max(side for _, side in targets)
+        # Lets the JPEG decoder scale down while decoding, at a fraction of the cost.
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+        for path, side in sorted(targets, key=lambda target: -target[1]):
+            image.thumbnail((side, side), Image.Resampling.LANCZOS)
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".render")
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(temp, path)
+
+
+class VariantRenderer:
+    """Renders the variants of stored images in a process pool, one job per image.
+
+    The pool is started on first use, with the spawn start method: forking a server
+    that runs threads and holds database connections is not safe. Jobs for an image
+    already being rendered are not queued twice; failures are logged, and the original
+    goes on being served for that image.
+    """
+
+    def __init__(self, workers: int, sizes: dict, quality: int):
+        self.workers = workers
+        self.sizes = sizes
+        self.quality = quality
+        self._executor = None
+        self._pending = {}
+
+    def submit(self, key: str) -> Optional[concurrent.futures.Future]:
+        digest = _digest(key)
+        if digest in self._pending:
+            return self._pending[digest]
+        targets = [(variant_path(key, size), side) for size, side in self.sizes.items() if not os.path.exists(variant_path(key, size))]
+        if not targets:
+            return None
+        try:
+            future = self._pool().submit(render_variants, original_path(key), targets, self.quality)
+        except BrokenProcessPool:
+            # A worker died (killed, out of memory); start over with a new pool.
+            self.shutdown()
+            future = self._pool().submit(render_variants, original_path(key), targets, self.quality)
+        self._pending[digest] = future
+        future.add_done_callback(partial(self._done, digest))
+        return future
+
+    def _pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _done(self, digest: str, future: concurrent.futures.Future):
+        self._pending.pop(digest, None)
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Could not render the variants of image %s: %r", digest, future.exception())
+
+    def wait(self, timeout: float = None):
+        concurrent.futures.wait(list(self._pending.values()), timeout)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+renderer = VariantRenderer(
+    workers=IMAGE_WORKERS,
+    sizes={"thumbnail": IMAGE_THUMBNAIL_SIZE, "preview": IMAGE_PREVIEW_SIZE},
+    quality=IMAGE_JPEG_QUALITY
+)
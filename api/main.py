@@ -1,27 +1,39 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from . import models
-from .database import engine
-from api.routers import auth, users, plants, user_plants, user_groups
-
-models.Base.metadata.create_all(bind=engine)
+from api.routers import auth, users, plants, user_plants, user_groups, health, metrics as metrics_router
+from api.responses import JSONBytesResponse
+from api.metrics import MetricsMiddleware
+from api.query_budget import QueryBudgetMiddleware, check_routes
+from api.admission import AdmissionMiddleware
+from api.startup import lifespan
 
+# alembic upgrade head
 # uvicorn api.main:app --reload
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=JSONBytesResponse)
 
 origins = ["*"]
 
+# Inside CORSMiddleware, so preflights never queue and its 503s carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
+app.add_middleware(QueryBudgetMiddleware)
+# Added last so it is outermost and times everything else.
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(plants.router)
 app.include_router(user_plants.router)
 app.include_router(user_groups.router)
+app.include_router(metrics_router.router)
+app.include_router(health.router)
+
+check_routes(app)
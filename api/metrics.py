@@ -0,0 +1,236 @@
+"""Request and SQL metrics, exposed in the Prometheus text format on /metrics.
+
+MetricsMiddleware times every request and labels it with the route template (so
+/api/userplants/12/ and /api/userplants/13/ are one series). instrument_engine hooks
+SQLAlchemy events that count statements and their time, and time connection checkouts
+from the pool, both in total and for the request being served. Values are per worker
+process, as with any in-process Prometheus exporter.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from typing import Optional
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.label_names = labels
+        self._lock = threading.Lock()
+        self._values: dict = {}
+        registry.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # counts per bucket (the last one is +Inf), then sum
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((labels, list(series)) for labels, series in self._values.items())
+        lines = self.header()
+        for labels, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+registry: list[_Metric] = []
+
+requests_total = Counter("http_requests_total", "Requests served, by route and status.", ("method", "route", "status"))
+requests_in_flight = Gauge("http_requests_in_flight", "Requests being served.")
+request_seconds = Histogram("http_request_duration_seconds", "Time to serve a request, body included.", ("method", "route"))
+request_queries = Histogram("http_request_db_queries", "SQL statements run while serving a request.", ("method", "route"), QUERY_COUNT_BUCKETS)
+request_db_seconds = Histogram("http_request_db_seconds", "Time spent in SQL statements while serving a request.", ("method", "route"))
+request_pool_wait_seconds = Histogram("http_request_db_pool_wait_seconds", "Time spent waiting for pooled connections while serving a request.", ("method", "route"))
+queries_total = Counter("db_queries_total", "SQL statements run, background work included.")
+query_seconds_total = Counter("db_query_seconds_total", "Time spent in SQL statements, background work included.")
+pool_wait_seconds = Histogram("db_pool_wait_seconds", "Time to check a connection out of the pool.")
+pool_connections = Gauge("db_pool_connections", "Pooled connections per engine: pool size, checked out, idle and overflow.", ("engine", "state"))
+replica_up = Gauge("db_replica_up", "1 while a read replica is in rotation, 0 while it is skipped after a failure.", ("engine",))
+read_sessions_total = Counter("db_read_sessions_total", "Sessions opened for GET routes, by the engine that served them.", ("engine",))
+reminders_sent_total = Counter("reminders_sent_total", "Plants users were reminded to water.")
+admission_rejected_total = Counter("admission_rejected_total", "Requests answered 503 by admission control, by route and reason.", ("route", "reason"))
+admission_wait_seconds = Histogram("admission_wait_seconds", "Time admitted requests waited for a slot, by priority.", ("priority",))
+admission_in_flight = Gauge("admission_in_flight", "Requests admitted and being served.")
+admission_waiting = Gauge("admission_waiting", "Requests waiting to be admitted.")
+reminder_plants = Gauge("reminder_scheduled_plants", "User plants with a watering reminder scheduled.")
+
+# Called before each render, to set gauges read from elsewhere (pool counts).
+collectors: list = []
+
+
+def render() -> bytes:
+    for collect in collectors:
+        collect()
+    return ("\n".join(line for metric in registry for line in metric.render()) + "\n").encode()
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "pool_wait_seconds", "statements", "budget")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        # Times each statement text ran, and the route's budget (see api/query_budget.py)
+        self.statements = {}
+        self.budget = None
+
+
+# Set by the middleware for the request being served. Sync crud calls run in the
+# threadpool with a copy of the context, so the SQL hooks still find it.
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+    queries_total.inc()
+    query_seconds_total.inc(amount=elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("metrics_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _time_checkouts(engine):
+    # Pools have no event for the start of a checkout, so the engine's raw_connection
+    # (which every Connection goes through, and which survives engine.dispose()) is wrapped.
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        start = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            elapsed = time.perf_counter() - start
+            pool_wait_seconds.observe(elapsed)
+            stats = current_request.get()
+            if stats is not None:
+                stats.pool_wait_seconds += elapsed
+
+    engine.raw_connection = timed_raw_connection
+
+
+def instrument_engine(engine):
+    """Hook the metrics into a sync Engine (for an AsyncEngine, pass its sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    _time_checkouts(engine)
+
+
+class MetricsMiddleware:
+    """Pure ASGI, so streamed bodies are timed to the last chunk and nothing is buffered."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        stats = RequestStats()
+        token = current_request.set(stats)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_flight.dec()
+            current_request.reset(token)
+            # The router has stored the matched route in the scope by now.
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else "unmatched")
+            requests_total.inc(*labels, str(status))
+            request_seconds.observe(elapsed, *labels)
+            request_queries.observe(stats.queries, *labels)
+            request_db_seconds.observe(stats.db_seconds, *labels)
+            request_pool_wait_seconds.observe(stats.pool_wait_seconds, *labels)
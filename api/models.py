@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Boolean, Column, ForeignKey, Text, Integer, String, DateTime, Enum
+from sqlalchemy import DDL, Boolean, Column, ForeignKey, Text, Integer, String, DateTime, Enum, Index, event
 from sqlalchemy.orm import relationship
 from .database import Base
 from api.schemas import WateringFrequencyPeriodType, WateringTimeType, SunRequirementType, PlantType
@@ -12,6 +12,17 @@ class User(Base):
     hashed_password = Column(String(128))
     created_at = Column(DateTime)
     last_seen = Column(DateTime)
+    # Bumped by every write to the user's groups, plants and notes; see api.etag.
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class CatalogVersion(Base):
+    # A single row, bumped by every write to the plants table.
+    __tablename__ = "catalog_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+event.listen(CatalogVersion.__table__, "after_create", DDL("INSERT INTO catalog_version (id, version) VALUES (1, 0)"))
 
 
 class Plant(Base):
@@ -26,6 +37,11 @@ class Plant(Base):
     watering_time = Column(Enum(WateringTimeType))
     sun_requirement = Column(Enum(SunRequirementType))
     external_link = Column(Text)
+    __table_args__ = (
+        Index("ix_plants_name_id", "name", "id"),
+        # Catalog imports upsert on it.
+        Index("uq_plants_scientific_name", "scientific_name", unique=True),
+    )
 
 
 class UserGroup(Base):
@@ -39,9 +55,12 @@ class UserGroup(Base):
     plants = relationship(
         "UserPlant",
         backref="plants",
-        lazy="joined",
+        lazy="select",
         primaryjoin="and_(UserGroup.id==UserPlant.user_group_id, UserPlant.deleted_at==None)"
     )
+    __table_args__ = (
+        Index("ix_user_groups_user_id_is_default", "user_id", "is_default"),
+    )
 
 
 class UserPlant(Base):
@@ -53,12 +72,25 @@ class UserPlant(Base):
     count = Column(Integer, default=1)
     order = Column(Integer)
     image_path = Column(Text)
+    # "<sha256>.<ext>" of a photo uploaded to the API, see api/images.py
+    image_key = Column(String(80))
     created_at = Column(DateTime)
     user_group_id = Column(Integer, ForeignKey("user_groups.id"))
     last_watered = Column(DateTime)
     deleted_at = Column(DateTime)
     plant_data = relationship("Plant", lazy="joined", backref="plant_data")
-    note_data = relationship("UserPlantNotes", lazy="joined", backref="note_data")
+    # Notes are never part of a plant's default payload; queries that need them ask for them.
+    note_data = relationship("UserPlantNotes", lazy="raise", backref="note_data")
+    __table_args__ = (
+        Index("ix_user_plants_user_id_deleted_at", "user_id", "deleted_at"),
+        # Group membership of live plants, used when loading the dashboard.
+        Index(
+            "ix_user_plants_active_group",
+            "user_group_id",
+            postgresql_where=deleted_at.is_(None),
+            sqlite_where=deleted_at.is_(None)
+        ),
+    )
 
 class UserPlantNotes(Base):
     __tablename__ = "user_plant_notes"
@@ -68,6 +100,21 @@ class UserPlantNotes(Base):
     created_at = Column(DateTime)
     deleted_at = Column(DateTime)
     note = Column(Text)
+    __table_args__ = (
+        Index("ix_user_plant_notes_plant_user_created", user_plant_id, user_id, created_at.desc(), id.desc()),
+        # Collection export, see crud.export_user_collection_queries.
+        Index("ix_user_plant_notes_user_id_id", user_id, id),
+    )
+
+class WateringEvent(Base):
+    __tablename__ = "watering_events"
+    id = Column(Integer, primary_key=True, index=True)
+    user_plant_id = Column(Integer, ForeignKey("user_plants.id"))
+    user_id = Column(Integer, ForeignKey("users.id"))
+    watered_at = Column(DateTime)
+    __table_args__ = (
+        Index("ix_watering_events_history", "user_plant_id", "watered_at", "id"),
+    )
 
 class UserInviteCodes(Base):
     __tablename__ = "user_invite_codes"
@@ -75,3 +122,6 @@ class UserInviteCodes(Base):
     username = Column(String(255), unique=True)
     invite_code = Column(String(255), unique=True)
     created_at = Column(DateTime)
+    __table_args__ = (
+        Index("ix_user_invite_codes_created_at_id", "created_at", "id"),
+    )
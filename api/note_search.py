@@ -0,0 +1,245 @@
+import bisect
+import math
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Iterable, Optional
+import numpy as np
+from api.search import normalize
+from api.settings import NOTE_SEARCH_TTL_SECONDS, NOTE_SEARCH_MAX_NOTES
+
+# Words as they appear in the note text, for highlighting; each is normalized on its own.
+_TOKENS = re.compile(r"[^\W_]+")
+
+
+def _ints(values: array) -> np.ndarray:
+    return np.frombuffer(values, dtype="int64")
+
+
+class _UserNotes:
+    """One user's notes: for every word, the notes (by position) it occurs in and how
+    often. Notes are only ever added, in id order, so each posting list stays sorted."""
+
+    def __init__(self, ttl: float):
+        self.expires_at = time.monotonic() + ttl
+        self.lock = threading.Lock()
+        self.note_ids = array("q")  # position -> note id
+        self.lengths = array("q")  # position -> number of words
+        self.total_length = 0
+        self.word_ids: dict[str, int] = {}
+        self.postings: list[array] = []  # word id -> positions
+        self.frequencies: list[array] = []  # word id -> occurrences, alongside postings
+        self.sorted_words: list[str] = []
+        self.sorted_dirty = False
+        # Notes up to this id have been read from the database; ids above it in ahead
+        # were added by this process's own writes and are skipped when read.
+        self.synced_to = 0
+        self.ahead: set[int] = set()
+        self.norms: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.note_ids)
+
+    def _add(self, note_id: int, text: Optional[str]):
+        counts = {}
+        words = normalize(text)
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        position = len(self.note_ids)
+        self.note_ids.append(note_id)
+        self.lengths.append(len(words))
+        self.total_length += len(words)
+        for word, count in counts.items():
+            word_id = self.word_ids.get(word)
+            if word_id is None:
+                word_id = self.word_ids[word] = len(self.postings)
+                self.postings.append(array("q"))
+                self.frequencies.append(array("q"))
+                self.sorted_words.append(word)
+                self.sorted_dirty = True
+            self.postings[word_id].append(position)
+            self.frequencies[word_id].append(count)
+
+    def add_synced(self, rows: Iterable):
+        """(id, note) rows read from the database, in id order."""
+        with self.lock:
+            for note_id, text in rows:
+                if note_id <= self.synced_to:
+                    continue  # read by a concurrent search already
+                self.synced_to = note_id
+                if note_id in self.ahead:
+                    self.ahead.discard(note_id)
+                else:
+                    self._add(note_id, text)
+
+    def add_written(self, note_id: int, text: Optional[str]):
+        with self.lock:
+            if note_id > self.synced_to and note_id not in self.ahead:
+                self.ahead.add(note_id)
+                self._add(note_id, text)
+
+
+class NoteSearchIndex:
+    """Inverted indexes over users' plant notes, one per user, kept per worker.
+
+    A user's index is read from the database on their first search and refreshed on
+    every search after that with one query for notes above the last id read, so notes
+    written by other workers show up on the next search. create_user_plant_note adds
+    notes written here straight away. A note committed by another worker out of id
+    order can be missed, so each index is rebuilt every ``ttl`` seconds. Indexes are
+    dropped least recently used first to stay under ``max_notes`` notes in all.
+
+    Notes are ranked by how many query words they contain, then by BM25. A query word
+    matches a note word exactly or, scored lower, as its prefix (search-as-you-type).
+    Results are keyset-paginated on (words matched, score, note id); notes added between
+    two pages can shift scores slightly, but no note is returned twice.
+    """
+
+    k1 = 1.2
+    b = 0.75
+    prefix_score = 0.7
+    max_expansions = 128  # note words tried per query word for prefix matches
+
+    def __init__(self, ttl: float, max_notes: int):
+        self.ttl = ttl
+        self.max_notes = max_notes
+        self._lock = threading.Lock()
+        self._users: OrderedDict[int, _UserNotes] = OrderedDict()
+
+    def index_for(self, user_id: int) -> _UserNotes:
+        """The user's index, new and empty when it has to be (re)built; the caller then
+        reads the notes above synced_to into it with add_synced."""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None or index.expires_at < time.monotonic():
+                index = self._users[user_id] = _UserNotes(self.ttl)
+            self._users.move_to_end(user_id)
+            total = sum(len(other) for other in self._users.values())
+            while total > self.max_notes and len(self._users) > 1:
+                _, evicted = self._users.popitem(last=False)
+                total -= len(evicted)
+            return index
+
+    def put(self, user_id: int, note_id: int, text: Optional[str]):
+        # Only users with an index; anyone else's notes are read on their first search.
+        with self._lock:
+            index = self._users.get(user_id)
+        if index is not None:
+            index.add_written(note_id, text)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def _matches(self, index: _UserNotes, term: str) -> dict[str, float]:
+        """note word -> weight for the indexed words ``term`` matches"""
+        if index.sorted_dirty:
+            index.sorted_words.sort()
+            index.sorted_dirty = False
+        start = bisect.bisect_left(index.sorted_words, term)
+        end = min(bisect.bisect_left(index.sorted_words, term + "\uffff", start), start + self.max_expansions)
+        matches = dict.fromkeys(index.sorted_words[start:end], self.prefix_score)
+        if term in index.word_ids:
+            matches[term] = 1.0
+        return matches
+
+    def _norms(self, index: _UserNotes) -> np.ndarray:
+        # The BM25 length normalization of every note, recomputed once notes are added.
+        count = len(index.note_ids)
+        if index.norms is None or len(index.norms) != count:
+            lengths = np.array(index.lengths, dtype=np.float64)
+            index.norms = self.k1 * (1 - self.b + self.b * lengths / max(index.total_length / count, 1))
+        return index.norms
+
+    def _score(self, index: _UserNotes, terms: list[str]):
+        # Called with index.lock held. The NumPy views of the index's arrays must be
+        # gone before it is released (an array cannot grow while a view exports its
+        # buffer), so only copies are returned. Works on the matching notes alone, so a
+        # rare word costs little however many notes the user has.
+        count = len(index.note_ids)
+        norms = self._norms(index)
+        term_positions, term_scores, words = [], [], set()
+        for term in terms:
+            matches = self._matches(index, term)
+            words.update(matches)
+            positions, scores = [], []
+            for word, weight in matches.items():
+                word_id = index.word_ids[word]
+                word_positions = _ints(index.postings[word_id])
+                frequencies = _ints(index.frequencies[word_id])
+                idf = math.log(1 + (count - len(word_positions) + 0.5) / (len(word_positions) + 0.5))
+                positions.append(word_positions.copy())
+                scores.append(weight * idf * frequencies * (self.k1 + 1) / (frequencies + norms[word_positions]))
+            if not positions:
+                continue
+            positions, scores = np.concatenate(positions), np.concatenate(scores)
+            if len(matches) > 1:
+                # A note with several words the term matches scores its best one.
+                order = np.lexsort((-scores, positions))
+                positions, scores = positions[order], scores[order]
+                first = np.concatenate(([True], positions[1:] != positions[:-1]))
+                positions, scores = positions[first], scores[first]
+            term_positions.append(positions)
+            term_scores.append(scores)
+        if not term_positions:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0), empty, words
+        if len(term_positions) == 1:
+            hits, scores = term_positions[0], term_scores[0]
+            return np.ones(len(hits), dtype=np.int64), scores, _ints(index.note_ids)[hits], words
+        hits, inverse = np.unique(np.concatenate(term_positions), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(term_scores), minlength=len(hits))
+        matched = np.bincount(inverse, minlength=len(hits))
+        return matched, scores, _ints(index.note_ids)[hits], words
+
+    def search(self, index: _UserNotes, query: str, after: Optional[tuple], limit: int) -> tuple[list[tuple], set[str]]:
+        """Up to ``limit`` (words matched, score, note id) after the ``after`` key, best
+        first, and the note words the query matched, for highlighting."""
+        terms = list(dict.fromkeys(normalize(query)))
+        with index.lock:
+            if not index.note_ids or not terms:
+                return [], set()
+            matched, scores, note_ids, words = self._score(index, terms)
+        if after is not None:
+            after_matched, after_score, after_id = after
+            later = (matched < after_matched) | ((matched == after_matched) & (
+                (scores < after_score) | ((scores == after_score) & (note_ids < after_id))))
+            matched, scores, note_ids = matched[later], scores[later], note_ids[later]
+        if len(scores) > limit:
+            # Only the best rank in full: everything at least as good as the limit-th.
+            keys = matched * (scores.max() + 1) + scores
+            cutoff = np.partition(keys, len(keys) - limit)[len(keys) - limit]
+            keep = keys >= cutoff
+            matched, scores, note_ids = matched[keep], scores[keep], note_ids[keep]
+        order = np.lexsort((-note_ids, -scores, -matched))[:limit]
+        return list(zip(matched[order].tolist(), scores[order].tolist(), note_ids[order].tolist())), words
+
+
+def snippet(text: str, words: set[str], length: int = 160) -> tuple[str, list[tuple[int, int]]]:
+    """About ``length`` characters of ``text`` around its first matching word, and the
+    (start, end) offsets in it of every word matching ``words``."""
+    spans = [match.span() for match in _TOKENS.finditer(text) if words.intersection(normalize(match.group()))]
+    start = 0
+    if spans and len(text) > length:
+        # Begin a little before the first match, at a word boundary.
+        start = max(0, spans[0][0] - length // 4)
+        if start:
+            space = text.find(" ", start, spans[0][0])
+            start = space + 1 if space != -1 else start
+        start = min(start, max(0, len(text) - length))
+    end = min(len(text), start + length)
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+    prefix = "…" if start else ""
+    shift = len(prefix) - start
+    highlights = [(s + shift, e + shift) for s, e in spans if s >= start and e <= end]
+    return prefix + text[start:end] + ("…" if end < len(text) else ""), highlights
+
+
+note_search = NoteSearchIndex(ttl=NOTE_SEARCH_TTL_SECONDS, max_notes=NOTE_SEARCH_MAX_NOTES)
@@ -0,0 +1,50 @@
+import base64
+import datetime
+import json
+from fastapi import HTTPException, status
+
+
+# Keyset cursors: the sort key values of the last row on a page, as opaque URL-safe text.
+# Clients hand next_cursor back unchanged to get the following page.
+
+def _default(value):
+    if isinstance(value, datetime.datetime):
+        return {"dt": value.isoformat()}
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def _object_hook(obj):
+    if set(obj) == {"dt"}:
+        return datetime.datetime.fromisoformat(obj["dt"])
+    return obj
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, default=_default, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _is(value, expected) -> bool:
+    # bool is an int to isinstance, but never a key value.
+    return isinstance(value, expected) and not isinstance(value, bool)
+
+
+def decode_cursor(cursor: str, *types) -> list:
+    """The cursor's values, which must be one per type in ``types`` (a type or a tuple of
+    them, as for isinstance), so a hand-made cursor never reaches a query as the wrong type."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw, object_hook=_object_hook)
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != len(types) \
+            or not all(_is(value, expected) for value, expected in zip(values, types)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def page(rows: list, limit: int, key) -> dict:
+    """rows must hold up to limit + 1 results; the extra one only signals another page."""
+    items = rows[:limit]
+    next_cursor = encode_cursor(*key(items[-1])) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,133 @@
+"""Per-route SQL statement budgets.
+
+Every route declares how many statements it may run with
+``dependencies=[Depends(query_budget(n))]``. The statements themselves are counted by
+the SQL hooks in api/metrics.py, per request; QueryBudgetMiddleware compares the count
+with the route's budget and also flags any statement text that ran more than
+``max_repeats`` times, which is what a lazy load in a loop (an N+1) looks like.
+
+QUERY_BUDGET_MODE=log (the default) logs violations. QUERY_BUDGET_MODE=raise, for tests
+and benchmarks, answers a violating request with a 500 naming the violation instead
+(or raises QueryBudgetExceeded, for streamed bodies that have already started), and
+refuses to start if a route has no budget. QUERY_BUDGET_MODE=off skips the checks.
+"""
+import logging
+from typing import Optional
+from fastapi.routing import APIRoute
+from api import metrics
+from api.settings import QUERY_BUDGET_MODE, QUERY_BUDGET_MAX_REPEATS
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class QueryBudget:
+    __slots__ = ("max_queries", "max_repeats")
+
+    def __init__(self, max_queries: Optional[int], max_repeats: Optional[int]):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+
+def query_budget(max_queries: Optional[int], max_repeats: Optional[int] = QUERY_BUDGET_MAX_REPEATS):
+    """Dependency declaring a route's budget. ``None`` leaves that check off, for routes
+    whose statement count grows with the request (streamed imports and exports); they
+    must say so explicitly."""
+    budget = QueryBudget(max_queries, max_repeats)
+
+    async def declare_query_budget():
+        stats = metrics.current_request.get()
+        if stats is not None:
+            stats.budget = budget
+
+    declare_query_budget.query_budget = budget
+    return declare_query_budget
+
+
+def route_budget(route: APIRoute) -> Optional[QueryBudget]:
+    for dependency in route.dependant.dependencies:
+        budget = getattr(dependency.call, "query_budget", None)
+        if budget is not None:
+            return budget
+    return None
+
+
+def unbudgeted_routes(app) -> list[str]:
+    return sorted(f"{method} {route.path}" for route in app.routes if isinstance(route, APIRoute) and route_budget(route) is None
+                  for method in route.methods)
+
+
+def check_routes(app):
+    missing = unbudgeted_routes(app)
+    if missing and QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(f"Routes without a query budget: {', '.join(missing)}")
+    if missing and QUERY_BUDGET_MODE == "log":
+        logger.warning("Routes without a query budget: %s", ", ".join(missing))
+
+
+def violations(stats: metrics.RequestStats) -> list[str]:
+    budget = stats.budget
+    if budget is None:
+        return []
+    found = []
+    if budget.max_queries is not None and stats.queries > budget.max_queries:
+        found.append(f"ran {stats.queries} SQL statements, the budget is {budget.max_queries}")
+    if budget.max_repeats is not None:
+        for statement, count in stats.statements.items():
+            if count > budget.max_repeats:
+                found.append(f"ran the same statement {count} times (N+1?): {' '.join(statement.split())[:200]}")
+    return found
+
+
+class QueryBudgetMiddleware:
+    """Goes inside MetricsMiddleware, which sets up the per-request counts.
+
+    Everything but a streamed body has run its statements by the time the response
+    starts, so that is where a violation can still turn the response into a 500.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or QUERY_BUDGET_MODE == "off":
+            return await self.app(scope, receive, send)
+        stats = metrics.current_request.get()
+        if stats is None:
+            return await self.app(scope, receive, send)
+        reported = False
+        replaced = False
+
+        def report() -> list[str]:
+            nonlocal reported
+            found = violations(stats)
+            if found:
+                reported = True
+                route = scope.get("route")
+                logger.warning("%s %s %s", scope["method"], route.path if route is not None else scope["path"], "; ".join(found))
+            return found
+
+        async def send_checked(message):
+            nonlocal replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                found = report()
+                if found and QUERY_BUDGET_MODE == "raise":
+                    replaced = True
+                    body = ("Query budget exceeded: " + "; ".join(found)).encode()
+                    await send({"type": "http.response.start", "status": 500,
+                                "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())]})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+            await send(message)
+
+        await self.app(scope, receive, send_checked)
+        # A streamed body runs its statements after the response has started.
+        if not reported:
+            found = report()
+            if found and QUERY_BUDGET_MODE == "raise":
+                raise QueryBudgetExceeded("; ".join(found))
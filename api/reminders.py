@@ -0,0 +1,397 @@
+"""Watering reminders across all users.
+
+ReminderSchedule keeps the next reminder time of every user plant in NumPy arrays
+indexed by user plant id, and the ids in a timing wheel: one array of ids per
+REMINDER_TICK_SECONDS slot, keyed by slot number. Scheduling a plant is an append to
+its slot and each tick reads only the slots that have come round. A plant that is
+rescheduled is not taken out of its old slot; slots are checked against the arrays
+when they fire. Due times are worked out with api.schedule, as GET /api/userplants/due/
+does.
+
+ReminderScheduler reads every user plant once at startup, then on each tick:
+
+- reads the user plants created since then (by id, so only new rows);
+- takes the plants whose reminder is due, reads them again (one query per
+  ``check_batch`` plants) so waterings and deletions by other workers are seen, and
+  hands those still due to the sender, one Reminder per user. A plant left unwatered is
+  reminded again every REMINDER_REPEAT_SECONDS.
+
+Writes made in this process update the schedule as they commit: api.crud notes them
+in session.info, as it does for the replica routing. Every process with
+REMINDERS_ENABLED sends reminders, so enable it in one of them only.
+"""
+import abc
+import datetime
+import importlib
+import logging
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from api import crud, metrics, schedule
+from api.database import SessionLocal
+from api.settings import REMINDERS_ENABLED, REMINDER_TICK_SECONDS, REMINDER_REPEAT_SECONDS, REMINDER_SENDER
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Reminder:
+    user_id: int
+    # (user plant id, when it fell due), most overdue first
+    plants: list[tuple[int, datetime.datetime]] = field(default_factory=list)
+
+
+class ReminderSender(abc.ABC):
+    """Delivers reminders: a push service, email, a queue. Called from the scheduler
+    thread with every reminder of one tick."""
+
+    @abc.abstractmethod
+    def send(self, reminders: list[Reminder]):
+        ...
+
+
+class LogSender(ReminderSender):
+    def send(self, reminders: list[Reminder]):
+        for reminder in reminders:
+            logger.info("Reminding user %s to water %d plants", reminder.user_id, len(reminder.plants))
+
+
+class RecordingSender(ReminderSender):
+    """Keeps what it is sent, for tests and benchmarks."""
+
+    def __init__(self):
+        self.sent: list[Reminder] = []
+        self._lock = threading.Lock()
+
+    def send(self, reminders: list[Reminder]):
+        with self._lock:
+            self.sent.extend(reminders)
+
+    def take(self) -> list[Reminder]:
+        with self._lock:
+            sent, self.sent = self.sent, []
+        return sent
+
+
+def load_sender(path: str) -> ReminderSender:
+    # "package.module.ClassName"
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(module), name)()
+
+
+def _same(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+class ReminderSchedule:
+    """Reminder times by user plant id, and the timing wheel over them. Thread-safe."""
+
+    def __init__(self, tick: float, repeat: float):
+        self.tick = tick
+        self.repeat = repeat
+        self._lock = threading.Lock()
+        self.remind_at = np.full(0, np.inf)  # epoch seconds; inf: no reminder
+        # INTEGER columns, so 32 bits; 0 in user_id: no such user plant (or deleted)
+        self.user_id = np.zeros(0, dtype="int32")
+        self.plant_id = np.zeros(0, dtype="int32")
+        self.anchor = np.full(0, np.nan)  # last watered, or added if never watered
+        self.watered = np.zeros(0, dtype=bool)
+        self.interval = np.full(0, np.nan)  # by plant id, as in api.schedule
+        self.watering_hour = np.full(0, np.nan)
+        self.plant_known = np.zeros(0, dtype=bool)  # by plant id: its plan has been read
+        self.synced_to = 0  # user plants up to this id have been read
+        # Set by catalog imports, and by user plants of plants not read yet (created by
+        # another worker); the scheduler reloads the catalog.
+        self.catalog_stale = False
+        self._slots: dict[int, array] = {}
+        self._next_slot = int(time.time() // tick)
+
+    def __len__(self):
+        return int(np.isfinite(self.remind_at).sum())
+
+    @staticmethod
+    def _grow(values: np.ndarray, size: int, fill) -> np.ndarray:
+        grown = np.full(max(size, 2 * len(values)), fill, dtype=values.dtype)
+        grown[:len(values)] = values
+        return grown
+
+    def _reserve(self, max_user_plant_id: int, max_plant_id: int = -1):
+        if max_user_plant_id >= len(self.remind_at):
+            size = max_user_plant_id + 1
+            self.remind_at = self._grow(self.remind_at, size, np.inf)
+            self.user_id = self._grow(self.user_id, size, 0)
+            self.plant_id = self._grow(self.plant_id, size, 0)
+            self.anchor = self._grow(self.anchor, size, np.nan)
+            self.watered = self._grow(self.watered, size, False)
+        if max_plant_id >= len(self.interval):
+            self.interval = self._grow(self.interval, max_plant_id + 1, np.nan)
+            self.watering_hour = self._grow(self.watering_hour, max_plant_id + 1, np.nan)
+            self.plant_known = self._grow(self.plant_known, max_plant_id + 1, False)
+
+    def _enqueue(self, ids: np.ndarray, times: np.ndarray):
+        finite = np.isfinite(times)
+        ids = ids[finite]
+        slots = np.maximum(times[finite] // self.tick, self._next_slot).astype("int64")
+        if len(ids) == 0:
+            return
+        if len(ids) == 1:
+            self._slots.setdefault(int(slots[0]), array("q")).append(int(ids[0]))
+            return
+        order = np.argsort(slots, kind="stable")
+        slots, ids = slots[order], ids[order].astype("int64")
+        starts = np.flatnonzero(np.diff(slots)) + 1
+        for slot, chunk in zip(slots[np.concatenate(([0], starts))].tolist(), np.split(ids, starts)):
+            self._slots.setdefault(slot, array("q")).frombytes(chunk.tobytes())
+
+    def _reschedule(self, ids: np.ndarray, now: float):
+        plants = self.plant_id[ids]
+        columns = schedule.WateringColumns(
+            user_plant_id=ids,
+            user_id=self.user_id[ids],
+            last_watered=np.where(self.watered[ids], self.anchor[ids], np.nan),
+            created_at=self.anchor[ids],
+            interval=self.interval[plants],
+            watering_hour=self.watering_hour[plants],
+        )
+        due = schedule.compute_schedule(columns, now).next_due
+        # Plants whose catalog entry has no watering schedule get no reminders.
+        due[np.isnan(due) | np.isnan(columns.interval)] = np.inf
+        self.remind_at[ids] = due
+        self._enqueue(ids, due)
+
+    def set_plants(self, rows: Iterable, replace: bool = False):
+        """(plant id, watering_freq, watering_period, watering_time) catalog rows. The
+        user plants of the plants whose schedule changed are rescheduled; with replace
+        the rows are the whole catalog and every user plant is."""
+        plans = schedule.build_columns((plant_id, 0, None, None, freq, period, hour) for plant_id, freq, period, hour in rows)
+        plant_ids = plans.user_plant_id
+        with self._lock:
+            self._reserve(-1, int(plant_ids.max(initial=-1)))
+            if replace:
+                self.interval[:] = np.nan
+                self.watering_hour[:] = np.nan
+                self.plant_known[:] = False
+            self.plant_known[plant_ids] = True
+            changed = ~(_same(self.interval[plant_ids], plans.interval) & _same(self.watering_hour[plant_ids], plans.watering_hour))
+            if not (replace or changed.any()):
+                return
+            self.interval[plant_ids] = plans.interval
+            self.watering_hour[plant_ids] = plans.watering_hour
+            known = np.flatnonzero(self.user_id)
+            if not replace:
+                known = known[np.isin(self.plant_id[known], plant_ids[changed])]
+            self._reschedule(known, time.time())
+
+    def add(self, rows: Iterable):
+        """(user plant id, user id, plant id, last_watered, created_at) rows, new or read again."""
+        rows = list(rows)
+        if rows:
+            ids, users, plants, last_watered, created_at = zip(*rows)
+            self.add_columns(np.array(ids), np.array(users), np.array(plants), schedule.to_epoch(last_watered), schedule.to_epoch(created_at))
+
+    def add_columns(self, ids: np.ndarray, user_ids: np.ndarray, plant_ids: np.ndarray, last_watered: np.ndarray, created_at: np.ndarray):
+        """As add, with a column per field; times in epoch seconds, NaN if never watered."""
+        with self._lock:
+            self._reserve(int(ids.max()), int(plant_ids.max()))
+            self.user_id[ids] = user_ids
+            self.plant_id[ids] = plant_ids
+            self.watered[ids] = ~np.isnan(last_watered)
+            self.anchor[ids] = np.where(self.watered[ids], last_watered, created_at)
+            if not self.plant_known[plant_ids].all():
+                self.catalog_stale = True
+            self._reschedule(ids, time.time())
+
+    def synced(self, user_plant_id: int):
+        with self._lock:
+            self.synced_to = max(self.synced_to, user_plant_id)
+
+    def watered_at(self, events: Iterable):
+        """(user plant id, watered_at) pairs."""
+        events = [(plant_id, watered_at) for plant_id, watered_at in events if plant_id < len(self.remind_at)]
+        if not events:
+            return
+        ids = np.array([plant_id for plant_id, _ in events], dtype="int64")
+        times = schedule.to_epoch([watered_at for _, watered_at in events])
+        with self._lock:
+            known = self.user_id[ids] != 0
+            ids, times = ids[known], times[known]
+            later = ~self.watered[ids] | (times > self.anchor[ids])
+            ids, times = ids[later], times[later]
+            self.anchor[ids] = times
+            self.watered[ids] = True
+            self._reschedule(ids, time.time())
+
+    def remove(self, ids: Iterable[int]):
+        with self._lock:
+            ids = np.array([i for i in ids if i < len(self.remind_at)], dtype="int64")
+            self.remind_at[ids] = np.inf
+            self.user_id[ids] = 0
+
+    def remind_again(self, ids: np.ndarray, at: float):
+        with self._lock:
+            self.remind_at[ids] = at
+            self._enqueue(ids, np.full(len(ids), at))
+
+    def _distinct(self, ids: np.ndarray) -> np.ndarray:
+        # A plant rescheduled before its slot came round is in several slots.
+        if len(ids) < len(self.remind_at) // 64:
+            ids.sort()
+            return ids[np.concatenate(([True], ids[1:] != ids[:-1]))]
+        seen = np.zeros(len(self.remind_at), dtype=bool)
+        seen[ids] = True
+        return np.flatnonzero(seen)
+
+    def pop_due(self, now: float) -> np.ndarray:
+        """Ids of the plants due by ``now``, in no particular order. They stay scheduled
+        at their current time until remind_again, add or remove is called for them."""
+        with self._lock:
+            current = int(now // self.tick)
+            chunks = [self._slots.pop(slot) for slot in range(self._next_slot, current + 1) if slot in self._slots]
+            self._next_slot = current + 1
+            if not chunks:
+                return np.zeros(0, dtype="int64")
+            ids = self._distinct(np.concatenate([np.frombuffer(chunk, dtype="int64") for chunk in chunks]))
+            remind_at = self.remind_at[ids]
+            due = remind_at <= now
+            # Rescheduled into this slot but later in it: the next tick takes them.
+            later = ~due & (remind_at < (current + 1) * self.tick)
+            self._enqueue(ids[later], remind_at[later])
+            return ids[due]
+
+
+class ReminderScheduler:
+    """Runs a ReminderSchedule: loads it, then every ``tick`` seconds sends what is due."""
+
+    check_batch = 1000
+    load_batch = 10000
+
+    def __init__(self, schedule_: ReminderSchedule, session_factory, sender: ReminderSender):
+        self.schedule = schedule_
+        self.session_factory = session_factory
+        self.sender = sender
+        self.loaded = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def load(self):
+        with self.session_factory() as db:
+            self.schedule.set_plants(crud.get_watering_plans(db), replace=True)
+            self.catch_up(db)
+        self.loaded.set()
+
+    def catch_up(self, db) -> int:
+        added = 0
+        for rows in crud.stream_reminder_rows(db, self.schedule.synced_to, self.load_batch):
+            self.schedule.add(rows)
+            self.schedule.synced(rows[-1][0])
+            added += len(rows)
+        return added
+
+    def run_once(self, now: Optional[float] = None) -> list[Reminder]:
+        """One tick; returns the reminders sent."""
+        now = time.time() if now is None else now
+        reminders: dict[int, Reminder] = {}
+        with self.session_factory() as db:
+            self.catch_up(db)
+            if self.schedule.catalog_stale:
+                self.schedule.catalog_stale = False
+                self.schedule.set_plants(crud.get_watering_plans(db), replace=True)
+            due = self.schedule.pop_due(now)
+            for start in range(0, len(due), self.check_batch):
+                try:
+                    self._check(db, due[start:start + self.check_batch], now, reminders)
+                except Exception:
+                    # Popped plants are out of the wheel: put them all back.
+                    self.schedule.remind_again(due, now)
+                    raise
+        sent = list(reminders.values())
+        if not sent:
+            return sent
+        plant_ids = np.array([plant_id for reminder in sent for plant_id, _ in reminder.plants])
+        try:
+            self.sender.send(sent)
+        except Exception:
+            logger.exception("Sending %d watering reminders failed, retrying on the next tick", len(sent))
+            self.schedule.remind_again(plant_ids, now)
+            return []
+        self.schedule.remind_again(plant_ids, now + self.schedule.repeat)
+        metrics.reminders_sent_total.inc(amount=len(plant_ids))
+        return sent
+
+    def _check(self, db, ids: np.ndarray, now: float, reminders: dict):
+        # The plants are read again: they may have been watered, deleted or moved to
+        # another catalog plant since, by any worker.
+        rows = crud.get_reminder_rows(db, ids.tolist())
+        self.schedule.remove(set(ids.tolist()) - {row.id for row in rows})
+        self.schedule.set_plants({(row.plant_id, row.watering_freq, row.watering_period, row.watering_time) for row in rows})
+        self.schedule.add((row.id, row.user_id, row.plant_id, row.last_watered, row.created_at) for row in rows)
+        remind_at = self.schedule.remind_at
+        still_due = sorted((row for row in rows if remind_at[row.id] <= now), key=lambda row: remind_at[row.id])
+        for row in still_due:
+            reminders.setdefault(row.user_id, Reminder(row.user_id)).plants.append((row.id, schedule.from_epoch(remind_at[row.id])))
+
+    def _run(self):
+        try:
+            self.load()
+        except Exception:
+            logger.exception("Loading the reminder schedule failed")
+            return
+        while not self._stopping.wait(self.schedule.tick):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Sending watering reminders failed")
+
+
+def _after_commit(session: Session):
+    for kind, items in session.info.pop("reminder_changes", ()):
+        if kind == "added":
+            reminder_schedule.add(items)
+        elif kind == "watered":
+            reminder_schedule.watered_at(items)
+        elif kind == "removed":
+            reminder_schedule.remove(items)
+        elif kind == "plants":
+            reminder_schedule.set_plants(items)
+        elif kind == "catalog":
+            reminder_schedule.catalog_stale = True
+
+
+def _after_rollback(session: Session):
+    session.info.pop("reminder_changes", None)
+
+
+def _collect_reminder_metrics():
+    metrics.reminder_plants.set(len(reminder_schedule))
+
+
+reminder_schedule = ReminderSchedule(REMINDER_TICK_SECONDS, REMINDER_REPEAT_SECONDS) if REMINDERS_ENABLED else None
+reminder_scheduler = ReminderScheduler(reminder_schedule, SessionLocal, load_sender(REMINDER_SENDER)) if REMINDERS_ENABLED else None
+
+if REMINDERS_ENABLED:
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    metrics.collectors.append(_collect_reminder_metrics)
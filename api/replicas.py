@@ -0,0 +1,157 @@
+"""Read/write split: GET routes read from replicas, everything else from the primary.
+
+Routes that only read depend on get_read_db instead of get_db. It hands out a session on
+the next replica in round-robin order, connecting first so that a replica that cannot be
+reached is taken out of rotation for DB_REPLICA_RETRY_SECONDS and the next one (and
+finally the primary) is tried instead. A replica whose connection drops mid-request is
+taken out the same way.
+
+Replicas lag behind the primary, so reads stay on the primary for
+DB_READ_AFTER_WRITE_SECONDS after a user's last write, and catalog reads (which fill the
+shared catalog cache) after any catalog write. Writes are noted when they commit, by
+the version bumps in api.crud. They are remembered per worker process: a client
+spread over several workers can still read its own write late from another one.
+"""
+import itertools
+import logging
+import threading
+import time
+from functools import partial
+from typing import Annotated
+from fastapi import Depends
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from api import database, metrics
+from api.auth.controller import get_current_user
+from api.settings import DB_ASYNC, DB_REPLICA_RETRY_SECONDS, DB_READ_AFTER_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaSet:
+    def __init__(self, names: list, session_factories: list, retry_after: float):
+        self.names = names
+        self.session_factories = session_factories
+        self.retry_after = retry_after
+        self._down_until = [0.0] * len(names)
+        self._next = itertools.count()
+
+    def candidates(self) -> list[int]:
+        """Replicas in rotation, starting with the next one in round-robin order."""
+        now = time.monotonic()
+        up = [i for i in range(len(self.names)) if self._down_until[i] <= now]
+        if not up:
+            return []
+        start = next(self._next) % len(up)
+        return up[start:] + up[:start]
+
+    def mark_down(self, i: int):
+        if self._down_until[i] <= time.monotonic():
+            logger.warning("Read replica %s failed, skipping it for %ss", self.names[i], self.retry_after)
+        self._down_until[i] = time.monotonic() + self.retry_after
+
+    def is_up(self, i: int) -> bool:
+        return self._down_until[i] <= time.monotonic()
+
+
+class RecentWrites:
+    max_users = 100000
+
+    def __init__(self, window: float):
+        self.window = window
+        self._users = {}
+        self._catalog = float("-inf")
+        self._lock = threading.Lock()
+
+    def record(self, user_ids, catalog: bool):
+        now = time.monotonic()
+        with self._lock:
+            if catalog:
+                self._catalog = now
+            for user_id in user_ids:
+                self._users[user_id] = now
+            if len(self._users) > self.max_users:
+                self._users = {user_id: t for user_id, t in self._users.items() if now - t < self.window}
+
+    def recent(self, user_id: int) -> bool:
+        now = time.monotonic()
+        return now - self._catalog < self.window or now - self._users.get(user_id, float("-inf")) < self.window
+
+
+replica_set = ReplicaSet(
+    [f"replica-{i}" for i in range(len(database.replica_engines))],
+    database.ReplicaSessionLocals,
+    DB_REPLICA_RETRY_SECONDS
+) if database.replica_engines else None
+recent_writes = RecentWrites(DB_READ_AFTER_WRITE_SECONDS)
+
+
+def _after_commit(session: Session):
+    user_ids = session.info.pop("written_user_ids", ())
+    catalog = session.info.pop("wrote_catalog", False)
+    if user_ids or catalog:
+        recent_writes.record(user_ids, catalog)
+
+
+def _after_rollback(session: Session):
+    session.info.pop("written_user_ids", None)
+    session.info.pop("wrote_catalog", None)
+
+
+def _replica_error(i: int, context):
+    if context.is_disconnect:
+        replica_set.mark_down(i)
+
+
+if replica_set is not None:
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    for i, e in enumerate(database.replica_engines):
+        event.listen(e.sync_engine if DB_ASYNC else e, "handle_error", partial(_replica_error, i))
+
+
+async def _connect(db) -> None:
+    if isinstance(db, AsyncSession):
+        await db.connection()
+    else:
+        await run_in_threadpool(db.connection)
+
+
+async def _read_session(current_user: int):
+    if replica_set is not None and not recent_writes.recent(current_user):
+        for i in replica_set.candidates():
+            db = replica_set.session_factories[i]()
+            try:
+                await _connect(db)
+            except exc.DBAPIError:
+                await database.close_db(db)
+                replica_set.mark_down(i)
+                continue
+            except exc.TimeoutError:
+                # Pool exhausted: busy, not broken, so it stays in rotation.
+                await database.close_db(db)
+                continue
+            metrics.read_sessions_total.inc(replica_set.names[i])
+            return db
+    metrics.read_sessions_total.inc("primary")
+    return database.AsyncSessionLocal() if DB_ASYNC else database.SessionLocal()
+
+
+async def get_read_db(current_user: Annotated[int, Depends(get_current_user)]):
+    """get_db for routes that only read, routed to a replica where one can serve them."""
+    db = await _read_session(current_user)
+    try:
+        yield db
+    finally:
+        await database.close_db(db)
+
+
+def _collect_replica_metrics():
+    for i, name in enumerate(replica_set.names):
+        metrics.replica_up.set(1 if replica_set.is_up(i) else 0, name)
+
+
+if replica_set is not None:
+    metrics.collectors.append(_collect_replica_metrics)
@@ -0,0 +1,177 @@
+"""JSON responses serialized by pydantic-core.
+
+FastAPI's generic path validates a route's return value against its response_model,
+dumps the result to Python dicts and json.dumps those again. JSONBytesRoute does the
+same validation, with a TypeAdapter built once per route, but dumps straight to JSON
+bytes and returns them in a JSONBytesResponse, which FastAPI sends as it is (a route
+may always return a Response). It only uses FastAPI's public API: the endpoint is
+wrapped, and the wrapper also takes the Response parameter that dependencies set
+headers and status codes on, to copy them over. Every router uses JSONBytesRoute, and
+JSONBytesResponse is the app's default response class, so routes without a
+response_model are encoded by pydantic-core too.
+
+RangeFileResponse serves files with byte ranges, for image downloads.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import re
+from typing import Any, Callable, Optional
+import anyio
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.exceptions import ResponseValidationError
+from fastapi.responses import FileResponse, JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter, ValidationError
+from starlette.datastructures import Headers
+
+_any = TypeAdapter(Any)
+
+
+class JSONBytesResponse(JSONResponse):
+    # A JSONResponse, so the OpenAPI schema documents routes' response models.
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return _any.dump_json(content)
+
+
+class JSONBytesRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        response_model = kwargs.get("response_model")
+        self.response_adapter = None
+        if response_model is not None and not isinstance(response_model, DefaultPlaceholder):
+            self.response_adapter = TypeAdapter(response_model)
+            # include_router builds its routes again from ours: wrap the original endpoint.
+            endpoint = self._wrap(getattr(endpoint, "json_bytes_endpoint", endpoint))
+        super().__init__(path, endpoint, **kwargs)
+
+    def serialize(self, value: Any) -> bytes:
+        """The endpoint's return value, validated against the response model and dumped
+        with the route's response_model_* options."""
+        try:
+            value = self.response_adapter.validate_python(value, from_attributes=True)
+        except ValidationError as e:
+            raise ResponseValidationError(errors=e.errors(include_url=False), body=value)
+        return self.response_adapter.dump_json(
+            value,
+            include=self.response_model_include,
+            exclude=self.response_model_exclude,
+            by_alias=self.response_model_by_alias,
+            exclude_unset=self.response_model_exclude_unset,
+            exclude_defaults=self.response_model_exclude_defaults,
+            exclude_none=self.response_model_exclude_none,
+        )
+
+    def _render(self, value: Any, response: Response) -> Response:
+        if isinstance(value, Response):
+            return value
+        rendered = JSONBytesResponse(self.serialize(value), status_code=response.status_code or self.status_code or 200)
+        rendered.headers.raw.extend(response.headers.raw)
+        return rendered
+
+    def _wrap(self, endpoint: Callable) -> Callable:
+        # FastAPI hands its Response to one parameter only: the endpoint's own if it has
+        # one, else one added to the wrapper's signature and kept from the endpoint.
+        signature = inspect.signature(endpoint)
+        name = next((param.name for param in signature.parameters.values() if param.annotation is Response), None)
+        own = name is not None
+        if not own:
+            name = "_json_bytes_response"
+            response_param = inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=Response)
+            signature = signature.replace(parameters=[*signature.parameters.values(), response_param])
+
+        # Sync endpoints stay sync, so FastAPI still runs them in its threadpool.
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapper(**kwargs):
+                response = kwargs[name] if own else kwargs.pop(name)
+                return self._render(await endpoint(**kwargs), response)
+        else:
+            @functools.wraps(endpoint)
+            def wrapper(**kwargs):
+                response = kwargs[name] if own else kwargs.pop(name)
+                return self._render(endpoint(**kwargs), response)
+        wrapper.__signature__ = signature
+        wrapper.json_bytes_endpoint = endpoint
+        return wrapper
+
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+_UNSATISFIABLE = (-1, -1)
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse that also answers a single-range Range request (bytes=a-b, a- or -n)
+    with a 206, or a 416 when the range starts past the end, honouring If-Range. Other
+    Range headers (several ranges, other units) get the whole file, as RFC 9110 allows.
+
+    The whole file goes out as FileResponse sends it, in one http.response.pathsend
+    when the server supports that extension. A range is sent with
+    http.response.zerocopysend (sendfile) when the server supports that, and read in
+    chunks otherwise. stat_result is required: the route has it from checking the file.
+    """
+
+    def __init__(self, path: str, stat_result: os.stat_result, **kwargs):
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.headers["accept-ranges"] = "bytes"
+
+    def _requested_range(self, scope) -> Optional[tuple[int, int]]:
+        headers = Headers(scope=scope)
+        match = _RANGE.fullmatch(headers.get("range", "").strip())
+        if match is None or scope["method"].upper() not in ("GET", "HEAD"):
+            return None
+        if_range = headers.get("if-range")
+        if if_range is not None and if_range not in (self.headers.get("etag"), self.headers.get("last-modified")):
+            return None
+        size = self.stat_result.st_size
+        first, last = match.groups()
+        if not first:
+            if not last:
+                return None
+            suffix = int(last)
+            return (max(size - suffix, 0), size - 1) if suffix and size else _UNSATISFIABLE
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            return _UNSATISFIABLE
+        return start, min(int(last), size - 1) if last else size - 1
+
+    async def __call__(self, scope, receive, send):
+        byte_range = self._requested_range(scope)
+        if byte_range is None:
+            return await super().__call__(scope, receive, send)
+        size = self.stat_result.st_size
+        if byte_range == _UNSATISFIABLE:
+            response = Response(status_code=416, headers={"content-range": f"bytes */{size}", "accept-ranges": "bytes"})
+            return await response(scope, receive, send)
+        start, end = byte_range
+        count = end - start + 1
+        self.status_code = 206
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(count)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": start, "count": count, "more_body": False})
+            finally:
+                file.close()
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(start)
+                remaining = count
+                while True:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    remaining -= len(chunk)
+                    more_body = remaining > 0 and len(chunk) > 0
+                    await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                    if not more_body:
+                        break
+        if self.background is not None:
+            await self.background()
@@ -1,17 +1,19 @@
 from fastapi import Depends, HTTPException, status, APIRouter
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
 
-from api import crud, models, schemas
-from api.auth.controller import verify_password, create_access_token, create_refresh_token, verify_refresh_token
-from api.database import get_db
+from api import crud_async, models, schemas
+from api.auth.controller import verify_password_async, create_access_token, create_refresh_token, verify_refresh_token
+from api.database import get_db, AnySession
+from api.admission import admission, EXPENSIVE
+from api.query_budget import query_budget
+from api.responses import JSONBytesRoute
 
-router = APIRouter(prefix="/api/auth")
+router = APIRouter(prefix="/api/auth", route_class=JSONBytesRoute)
 
-@router.post("/login/", summary="Create access and refresh tokens for user", response_model=schemas.Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_username(db, form_data.username)
+@router.post("/login/", summary="Create access and refresh tokens for user", response_model=schemas.Token, dependencies=[Depends(query_budget(1)), Depends(admission(EXPENSIVE))])
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AnySession = Depends(get_db)):
+    user = await crud_async.get_user_by_username(db, form_data.username)
     # print(user)
     if user is None:
         raise HTTPException(
@@ -19,7 +21,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
             detail="Incorrect username or password"
         )
     hashed_pass = user.hashed_password
-    if not verify_password(form_data.password, hashed_pass):
+    if not await verify_password_async(form_data.password, hashed_pass):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect username or password"
@@ -38,7 +40,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     # return response
     return {"access_token": access_token, "refresh_token": refresh_token}
 
-@router.get("/refresh/", status_code=status.HTTP_200_OK)
+@router.get("/refresh/", status_code=status.HTTP_200_OK, dependencies=[Depends(query_budget(0))])
 async def get_new_access_token(token: str):
     refresh_data = verify_refresh_token(token)
 
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from api import startup
+from api.admission import admission
+from api.query_budget import query_budget
+from api.responses import JSONBytesRoute
+
+router = APIRouter(route_class=JSONBytesRoute)
+
+@router.get("/healthz", include_in_schema=False, dependencies=[Depends(query_budget(0)), Depends(admission(exempt=True))])
+async def healthz():
+    # For load balancers and process managers: 200 once startup has finished, 503 from
+    # the moment shutdown begins. Touches no database, see api/startup.py.
+    if not startup.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Not ready")
+    return {"status": "ok"}
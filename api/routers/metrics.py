@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends, Response
+from api import metrics
+from api.admission import admission
+from api.query_budget import query_budget
+from api.responses import JSONBytesRoute
+
+router = APIRouter(route_class=JSONBytesRoute)
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(query_budget(0)), Depends(admission(exempt=True))])
+async def get_metrics():
+    # Prometheus text format. Not behind auth: restrict it where the app is exposed.
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
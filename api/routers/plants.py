@@ -1,29 +1,93 @@
-from fastapi import Depends, HTTPException, status, APIRouter
-from sqlalchemy.orm import Session
-from api import crud, models, schemas
-from api.database import get_db
+import json
+from typing import Optional
+from fastapi import Depends, HTTPException, status, APIRouter, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from api import catalog_io, crud_async, models, schemas
+from api.etag import catalog_etag
+from api.admission import admission, EXPENSIVE
+from api.query_budget import query_budget
+from api.replicas import get_read_db
+from api.responses import JSONBytesRoute
+from api.database import get_db, open_db, AnySession
+from api.settings import PLANT_IMPORT_BATCH_SIZE, PLANT_EXPORT_BATCH_SIZE
 from api.auth.controller import jwt_required, get_current_user
 
 router = APIRouter(
     prefix="/api/plants",
-    dependencies=[Depends(get_current_user)]
+    dependencies=[Depends(get_current_user)],
+    route_class=JSONBytesRoute
 )
 
-@router.post("/create/", response_model=schemas.PlantResponse)
-async def create_plant(plant: schemas.PlantBase, db: Session = Depends(get_db)):
-    return crud.create_plant(db=db, plant=plant)
+def _duplicate_scientific_name():
+    # scientific_name is the only unique column plants have.
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A plant with this scientific name already exists")
 
-@router.post("/update/", response_model=schemas.PlantId)
-async def update_plant(plant: schemas.PlantResponse, db: Session = Depends(get_db)):
-    return crud.update_plant(db=db, plant=plant)
+@router.post("/create/", response_model=schemas.PlantResponse, dependencies=[Depends(query_budget(2))])
+async def create_plant(plant: schemas.PlantBase, db: AnySession = Depends(get_db)):
+    try:
+        return await crud_async.create_plant(db=db, plant=plant)
+    except IntegrityError:
+        raise _duplicate_scientific_name()
 
-@router.get("/", response_model=list[schemas.PlantResponse])
-async def get_plants(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_plants(db, skip, limit)
+@router.post("/update/", response_model=schemas.PlantId, dependencies=[Depends(query_budget(2))])
+async def update_plant(plant: schemas.PlantResponse, db: AnySession = Depends(get_db)):
+    try:
+        res = await crud_async.update_plant(db=db, plant=plant)
+    except IntegrityError:
+        raise _duplicate_scientific_name()
+    if res is None:
+        raise HTTPException(status_code=404, detail="Plant not found")
+    return res
+
+@router.post("/import/", response_model=schemas.PlantImportResult, dependencies=[Depends(query_budget(None, None)), Depends(admission(EXPENSIVE))])
+async def import_plants(request: Request, db: AnySession = Depends(get_db)):
+    # Streamed CSV (with a header row) or NDJSON body, upserted on scientific_name in
+    # batches; nothing is committed unless every row is valid.
+    format = catalog_io.format_for(request.headers.get("content-type", ""))
+    rows, batch = 0, []
+    async for plant in catalog_io.parse(format, request.stream()):
+        batch.append(plant)
+        if len(batch) == PLANT_IMPORT_BATCH_SIZE:
+            await crud_async.upsert_plants(db, batch)
+            rows, batch = rows + len(batch), []
+    if batch:
+        await crud_async.upsert_plants(db, batch)
+        rows += len(batch)
+    await crud_async.finish_plant_import(db)
+    return {"rows": rows}
+
+async def _export(format: schemas.CatalogFormat):
+    yield catalog_io.header(format)
+    async with open_db() as db:
+        async for plants in crud_async.stream_plants(db, PLANT_EXPORT_BATCH_SIZE):
+            yield catalog_io.encode(format, plants)
+
+@router.get("/export/", dependencies=[Depends(query_budget(None, None)), Depends(admission(EXPENSIVE))])
+async def export_plants(format: schemas.CatalogFormat = schemas.CatalogFormat.ndjson):
+    return StreamingResponse(
+        _export(format),
+        media_type=catalog_io.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="plants.{format.value}"'}
+    )
+
+@router.get("/", response_model=schemas.Page[schemas.PlantResponse], dependencies=[Depends(query_budget(3))])
+async def get_plants(cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=500), etag_headers: dict = Depends(catalog_etag), db: AnySession = Depends(get_read_db)):
+    # Served from the catalog cache's pre-serialized payloads.
+    page = await crud_async.get_cached_plants(db, cursor, limit)
+    content = b'{"items":[' + b",".join(entry.payload for entry in page["items"]) + b'],"next_cursor":' \
+        + json.dumps(page["next_cursor"]).encode() + b"}"
+    return Response(content=content, media_type="application/json", headers=etag_headers)
+
+@router.get("/search/", response_model=list[schemas.PlantResponse], dependencies=[Depends(query_budget(4))])
+async def search_plants(q: str = Query(..., min_length=1, max_length=200), limit: int = Query(20, ge=1, le=100), db: AnySession = Depends(get_read_db)):
+    # Ranked best first. Declared before /{plant_id}/ so "search" is not taken for an id.
+    entries = await crud_async.search_plants(db, q, limit)
+    return Response(content=b"[" + b",".join(entry.payload for entry in entries) + b"]", media_type="application/json")
 
-@router.get("/{plant_id}/", response_model=schemas.PlantResponse)
-async def get_plant_id(plant_id: int, db: Session = Depends(get_db)):
-    db_plant = crud.get_plant_by_id(db, plant_id=plant_id)
-    if db_plant is None:
+@router.get("/{plant_id}/", response_model=schemas.PlantResponse, dependencies=[Depends(query_budget(2))])
+async def get_plant_id(plant_id: int, etag_headers: dict = Depends(catalog_etag), db: AnySession = Depends(get_read_db)):
+    entry = await crud_async.get_cached_plant(db, plant_id=plant_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Plant not found")
-    return db_plant
+    return Response(content=entry.payload, media_type="application/json", headers=etag_headers)
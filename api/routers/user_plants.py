@@ -1,83 +1,220 @@
-from fastapi import Depends, HTTPException, status, APIRouter
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from typing import Annotated
-from api import crud, models, schemas
-from api.database import get_db
+import datetime
+import os
+from fastapi import Depends, HTTPException, status, APIRouter, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Annotated, Optional
+from starlette.concurrency import run_in_threadpool
+from api import crud, crud_async, images, models, schemas
+from api.database import get_db, open_db, AnySession
+from api.etag import conditional, user_etag
+from api.admission import admission, EXPENSIVE
+from api.query_budget import query_budget
+from api.replicas import get_read_db
+from api.responses import JSONBytesRoute, RangeFileResponse
+from api.settings import COLLECTION_EXPORT_BATCH_SIZE, IMAGE_MAX_BYTES
 from api.auth.controller import jwt_required, get_current_user
+from api.watering import watering_writer
 
 router = APIRouter(
     prefix="/api/userplants",
-    dependencies=[Depends(jwt_required)]
+    dependencies=[Depends(jwt_required)],
+    route_class=JSONBytesRoute
 )
 
-@router.post("/create/")
-async def create_plant(current_user: Annotated[schemas.User, Depends(get_current_user)], user_plant: schemas.UserPlantBase, db: Session = Depends(get_db)):
-    res = crud.create_user_plant(db=db, user_plant=user_plant, current_user=current_user)
+@router.post("/create/", dependencies=[Depends(query_budget(2))])
+async def create_plant(current_user: Annotated[schemas.User, Depends(get_current_user)], user_plant: schemas.UserPlantBase, db: AnySession = Depends(get_db)):
+    res = await crud_async.create_user_plant(db=db, user_plant=user_plant, current_user=current_user)
     return {"id": res.id}
 
-@router.get("/graveyard/", response_model=list[schemas.UserPlantInfoResponse])
+@router.post("/batch/", response_model=schemas.UserPlantBatchResult, dependencies=[Depends(query_budget(8)), Depends(admission(EXPENSIVE))])
+async def apply_user_plant_batch(current_user: Annotated[schemas.User, Depends(get_current_user)], batch: schemas.UserPlantBatchInput, db: AnySession = Depends(get_db)):
+    # All operations are applied, in the order given, or none are.
+    try:
+        return await crud_async.apply_user_plant_batch(db=db, batch=batch, current_user=current_user)
+    except crud.InvalidBatchOperation as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+@router.get("/graveyard/", response_model=list[schemas.UserPlantInfoResponse], dependencies=[Depends(query_budget(3)), Depends(user_etag)])
 async def get_deleted_user_plants(
-        db: Annotated[Session, Depends(get_db)],
+        db: Annotated[AnySession, Depends(get_read_db)],
         current_user: Annotated[int, Depends(get_current_user)]
 ):
-    q = crud.get_deleted_user_plants(db=db, current_user=current_user)
-    print(q)
-    if not q:
-        raise HTTPException(status_code=500, detail="Could not complete request")
-    return q
+    return await crud_async.get_deleted_user_plants(db=db, current_user=current_user)
 
-@router.post("/{plant_id:int}/update/", response_model=schemas.UserPlantInfoResponse)
-async def update_user_plant(current_user: Annotated[schemas.User, Depends(get_current_user)], plant_id: int, user_plant: schemas.UserPlantUpdate, db: Session = Depends(get_db)):
-    res = crud.update_user_plant(db=db, plant_id=plant_id, user_plant=user_plant, current_user=current_user)
-    return res
+@router.get("/due/", response_model=list[schemas.UserPlantDueResponse], dependencies=[Depends(query_budget(1))])
+async def get_due_user_plants(
+        current_user: Annotated[int, Depends(get_current_user)],
+        db: Annotated[AnySession, Depends(get_read_db)],
+        within_hours: float = 0,
+        limit: Optional[int] = Query(None, ge=1, le=500)
+):
+    # Plants due now (or within the next within_hours), most overdue first.
+    return await crud_async.get_due_user_plants(db=db, current_user=current_user, within_hours=within_hours, limit=limit)
+
+_EXPORT_SCHEMAS = {"group": schemas.UserGroupExport, "user_plant": schemas.UserPlantExport, "note": schemas.UserPlantNoteExport}
+
+def _export_record(kind: str, row) -> bytes:
+    # Through the schema, so a record never holds more than the JSON routes show (image_key).
+    data = _EXPORT_SCHEMAS[kind].model_validate(row, from_attributes=True).model_dump_json()
+    return b'{"type":"' + kind.encode() + b'","data":' + data.encode() + b"}"
+
+async def _export_collection(current_user: int):
+    # Catalog plants are written once each, ahead of the first user plant that uses them.
+    async with open_db() as db:
+        exported_plants = set()
+        async for kind, rows in crud_async.stream_user_collection(db, current_user, COLLECTION_EXPORT_BATCH_SIZE):
+            lines = []
+            if kind == "user_plant":
+                plant_ids = {row.plant_id for row in rows} - exported_plants
+                if plant_ids:
+                    entries = await crud_async.get_cached_plants_by_id(db, plant_ids)
+                    lines += [b'{"type":"plant","data":' + entry.payload + b"}" for entry in entries.values() if entry is not None]
+                    exported_plants |= plant_ids
+            lines += [_export_record(kind, row) for row in rows]
+            yield b"\n".join(lines) + b"\n"
+
+@router.get("/notes/search/", response_model=schemas.Page[schemas.NoteSearchHit], dependencies=[Depends(query_budget(3)), Depends(user_etag)])
+async def search_user_plant_notes(
+        current_user: Annotated[int, Depends(get_current_user)],
+        db: Annotated[AnySession, Depends(get_read_db)],
+        q: str = Query(min_length=1, max_length=200),
+        cursor: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=100)
+):
+    # The current user's notes across all their plants, best match first.
+    return await crud_async.search_user_plant_notes(db=db, q=q, current_user=current_user, cursor=cursor, limit=limit)
 
-@router.get("/", response_model=list[schemas.UserDashboardGroup])  # schemas.UserPlantInfoResponse
-async def get_user_plants(current_user: Annotated[schemas.User, Depends(get_current_user)], db: Session = Depends(get_db)):
-    res = crud.get_user_groups(db=db, current_user=current_user)
+@router.get("/export/", dependencies=[Depends(query_budget(None, None)), Depends(admission(EXPENSIVE))])
+async def export_collection(current_user: Annotated[int, Depends(get_current_user)]):
+    # NDJSON, one {"type": "group" | "plant" | "user_plant" | "note", "data": {...}} per line.
+    # Deleted groups, plants and notes are included, with their deleted_at.
+    return StreamingResponse(
+        _export_collection(current_user),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="collection.ndjson"'}
+    )
+
+@router.post("/{plant_id:int}/update/", response_model=schemas.UserPlantInfoResponse, dependencies=[Depends(query_budget(4))])
+async def update_user_plant(current_user: Annotated[schemas.User, Depends(get_current_user)], plant_id: int, user_plant: schemas.UserPlantUpdate, db: AnySession = Depends(get_db)):
+    res = await crud_async.update_user_plant(db=db, plant_id=plant_id, user_plant=user_plant, current_user=current_user)
+    if res is None:
+        raise HTTPException(status_code=404, detail="Could not find user plant")
     return res
 
-@router.get("/{plant_id:int}/", response_model=schemas.UserPlantInfoResponse)
-async def get_user_plant_by_id(plant_id: int, current_user: Annotated[schemas.User, Depends(get_current_user)], db: Session = Depends(get_db)):
-    res = crud.get_user_plant_by_id(db=db, plant_id=plant_id, current_user=current_user)
+# Without include_notes the payload is list[schemas.UserDashboardGroup]; note_data is left
+# unset and dropped by response_model_exclude_unset. With include_notes the ORM groups
+# match the response model as they are.
+@router.get("/", response_model=list[schemas.UserDashboardGroupWithNotes], response_model_exclude_unset=True, dependencies=[Depends(query_budget(5)), Depends(user_etag)])
+async def get_user_plants(current_user: Annotated[schemas.User, Depends(get_current_user)], include_notes: bool = False, db: AnySession = Depends(get_read_db)):
+    res = await crud_async.get_dashboard(db=db, current_user=current_user, include_notes=include_notes)
+    if include_notes:
+        return res
+    return [schemas.UserDashboardGroup.model_validate(group, from_attributes=True) for group in res]
+
+@router.get("/{plant_id:int}/", response_model=schemas.UserPlantInfoResponse, dependencies=[Depends(query_budget(3)), Depends(user_etag)])
+async def get_user_plant_by_id(plant_id: int, current_user: Annotated[schemas.User, Depends(get_current_user)], db: AnySession = Depends(get_read_db)):
+    res = await crud_async.get_user_plant_by_id(db=db, plant_id=plant_id, current_user=current_user)
     if not res:
         raise HTTPException(status_code=404, detail="Could not find user plant")
     return res
 
+@router.post("/{plant_id:int}/image/", response_model=schemas.UserPlantImageResult, dependencies=[Depends(query_budget(3)), Depends(admission(EXPENSIVE))])
+async def upload_user_plant_image(request: Request, plant_id: int, current_user: Annotated[int, Depends(get_current_user)], db: AnySession = Depends(get_db)):
+    # The body is the image itself (JPEG, PNG, GIF or WebP), not a form. The plant is
+    # checked in a session of its own, closed before the upload, so no connection is
+    # held while it streams and no file is stored for a plant that is not the user's.
+    try:
+        content_length = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length header")
+    if content_length > IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Images are limited to {IMAGE_MAX_BYTES} bytes")
+    async with open_db() as check_db:
+        if not await crud_async.get_owned_user_plant_ids(db=check_db, plant_ids=[plant_id], current_user=current_user):
+            raise HTTPException(status_code=404, detail="Could not find user plant")
+    try:
+        stored = await images.store(request.stream())
+    except images.ImageTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except images.UnsupportedImage as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    res = await crud_async.set_user_plant_image(db=db, plant_id=plant_id, image_key=stored.key, current_user=current_user)
+    if res is None:
+        raise HTTPException(status_code=404, detail="Could not find user plant")
+    images.renderer.submit(stored.key)
+    return {"image_path": res.image_path, "bytes": stored.size}
+
+@router.get("/{plant_id:int}/image/", dependencies=[Depends(query_budget(1))])
+async def get_user_plant_image(
+        request: Request,
+        response: Response,
+        plant_id: int,
+        current_user: Annotated[int, Depends(get_current_user)],
+        db: Annotated[AnySession, Depends(get_read_db)],
+        size: schemas.ImageSize = schemas.ImageSize.original
+):
+    key = await crud_async.get_user_plant_image_key(db=db, plant_id=plant_id, current_user=current_user)
+    if key is None:
+        raise HTTPException(status_code=404, detail="This plant has no uploaded image")
+    try:
+        path, stat_result, media_type = await run_in_threadpool(images.locate, key, size.value)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="This plant has no uploaded image")
+    # Stored files never change, so the file name is the ETag.
+    headers = conditional(request, response, f'"{os.path.basename(path)}"', "private, no-cache")
+    return RangeFileResponse(path, stat_result=stat_result, media_type=media_type, headers=headers)
+
+@router.post("/water/", dependencies=[Depends(query_budget(4))])
+async def water_plants(plant_ids: schemas.WaterPlantsInput, current_user: Annotated[schemas.User, Depends(get_current_user)], db: AnySession = Depends(get_db)):
+    if watering_writer is not None and watering_writer.running:
+        # Ownership is checked now; the event insert and last_watered update happen in the
+        # writer's next batch.
+        watered = await crud_async.get_owned_user_plant_ids(db=db, plant_ids=plant_ids.plant_ids, current_user=current_user)
+        watering_writer.submit(current_user, watered, datetime.datetime.utcnow())
+    else:
+        watered = await crud_async.water_plants(db=db, plant_ids=plant_ids, current_user=current_user)
+    return {"plants_watered": {"plant_ids": watered}}
 
-@router.post("/water/")
-async def water_plants(plant_ids: schemas.WaterPlantsInput, current_user: Annotated[schemas.User, Depends(get_current_user)], db: Session = Depends(get_db)):
-    plants_watered = crud.water_plants(db=db, plant_ids=plant_ids, current_user=current_user)
-    return {"plants_watered": plants_watered}
+@router.get("/{plant_id:int}/waterings/", response_model=schemas.Page[schemas.WateringEventResponse], dependencies=[Depends(query_budget(2)), Depends(user_etag)])
+async def get_watering_history(
+        plant_id: int,
+        current_user: Annotated[int, Depends(get_current_user)],
+        db: Annotated[AnySession, Depends(get_read_db)],
+        cursor: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=500)
+):
+    return await crud_async.get_watering_events(db=db, plant_id=plant_id, current_user=current_user, cursor=cursor, limit=limit)
 
-@router.post("/{plant_id}/notes/")
+@router.post("/{plant_id}/notes/", dependencies=[Depends(query_budget(2))])
 async def post_user_plant_note(
         plant_id: int,
         note: schemas.UserPlantNoteBase,
         current_user: Annotated[schemas.User, Depends(get_current_user)],
-        db: Annotated[Session, Depends(get_db)]
+        db: Annotated[AnySession, Depends(get_db)]
 ):
-    q = crud.create_user_plant_note(db=db, plant_id=plant_id, note=note, current_user=current_user)
+    q = await crud_async.create_user_plant_note(db=db, plant_id=plant_id, note=note, current_user=current_user)
     if not q:
         raise HTTPException(status_code=500, detail="Could not complete request")
     return JSONResponse(status_code=200, content={"message": "Note created successfully"})
 
-@router.get("/{plant_id}/notes/", response_model=list[schemas.UserPlantNoteResponse])
+@router.get("/{plant_id}/notes/", response_model=schemas.Page[schemas.UserPlantNoteResponse], dependencies=[Depends(query_budget(2)), Depends(user_etag)])
 async def get_user_plant_notes(
         plant_id: int,
         current_user: Annotated[int, Depends(get_current_user)],
-        db: Annotated[Session, Depends(get_db)]
+        db: Annotated[AnySession, Depends(get_read_db)],
+        cursor: Optional[str] = None,
+        limit: int = Query(100, ge=1, le=500)
 ):
-    q = crud.get_user_plant_notes(db=db, plant_id=plant_id, current_user=current_user)
+    q = await crud_async.get_user_plant_notes(db=db, plant_id=plant_id, current_user=current_user, cursor=cursor, limit=limit)
     return q
 
-@router.delete("/{plant_id}/delete/")
+@router.delete("/{plant_id}/delete/", dependencies=[Depends(query_budget(2))])
 async def delete_user_plant(
         plant_id: int,
         current_user: Annotated[int, Depends(get_current_user)],
-        db: Annotated[Session, Depends(get_db)]
+        db: Annotated[AnySession, Depends(get_db)]
 ):
-    q = crud.delete_user_plant(db=db, plant_id=plant_id, current_user=current_user)
+    q = await crud_async.delete_user_plant(db=db, plant_id=plant_id, current_user=current_user)
     if not q:
         raise HTTPException(status_code=500, detail="Could not complete request")
     return JSONResponse(status_code=200, content={"message": "User plant deleted successfully"})
@@ -1,7 +1,15 @@
 import datetime
 from enum import Enum
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Annotated, Generic, Literal, Optional, List, Tuple, TypeVar, Union
+from pydantic import BaseModel, Field, computed_field
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
 
 class UserBase(BaseModel):
     username: str
@@ -21,7 +29,7 @@ class User(UserBase):
     last_seen: Optional[datetime.datetime]
 
     class Config:
-        orm_model = True
+        from_attributes = True
 
 class ChangePasswordInput(BaseModel):
     oldPassword: str
@@ -32,6 +40,11 @@ class Token(BaseModel):
     access_token: str
     refresh_token: str
 
+class AuthContext(BaseModel):
+    id: int
+    username: str
+    expires_at: datetime.datetime
+
 
 class WateringFrequencyPeriodType(str, Enum):
     HOUR = "HOUR"
@@ -57,6 +70,15 @@ class PlantType(str, Enum):
     HERB = "HERB"
     VEGETABLE = "VEGETABLE"
 
+class CatalogFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+class ImageSize(str, Enum):
+    original = "original"
+    preview = "preview"
+    thumbnail = "thumbnail"
+
 
 class WateringInfo(BaseModel):
     watering_freq: Optional[int] = None
@@ -79,11 +101,14 @@ class PlantResponse(PlantBase):
     id: int
 
     class Config:
-        orm_model = True
+        from_attributes = True
 
 class PlantId(BaseModel):
     id: int
 
+class PlantImportResult(BaseModel):
+    rows: int
+
 
 class UserGroupBase(BaseModel):
     name: Optional[str] = ""
@@ -110,6 +135,41 @@ class UserPlantUpdate(BaseModel):
     image_path: Optional[str] = None
     user_group_id: Optional[int] = None
 
+class UserPlantCreateOp(UserPlantBase):
+    op: Literal["create"]
+    image_path: Optional[str] = None
+
+class UserPlantUpdateOp(UserPlantUpdate):
+    op: Literal["update"]
+    id: int
+
+class UserPlantMoveOp(BaseModel):
+    op: Literal["move"]
+    id: int
+    user_group_id: int
+
+class UserPlantReorderOp(BaseModel):
+    # The listed plants swap their current order values so they sort in the given
+    # sequence; other plants keep theirs.
+    op: Literal["reorder"]
+    ids: List[int]
+
+UserPlantBatchOp = Annotated[
+    Union[UserPlantCreateOp, UserPlantUpdateOp, UserPlantMoveOp, UserPlantReorderOp],
+    Field(discriminator="op")
+]
+
+class UserPlantBatchInput(BaseModel):
+    operations: List[UserPlantBatchOp] = Field(max_length=5000)
+
+class UserPlantImageResult(BaseModel):
+    image_path: str
+    bytes: int
+
+class UserPlantBatchResult(BaseModel):
+    created_ids: List[int]
+    updated_ids: List[int]
+
 class UserPlantDBInput(UserPlantBase):
     user_id: int
     count: int
@@ -117,21 +177,40 @@ class UserPlantDBInput(UserPlantBase):
 class UserPlantResponse(UserPlantDBInput):
     id: int
 
-class UserPlantInfoResponse(BaseModel):
+class UserPlantInfoBase(BaseModel):
     id: int
     nickname: Optional[str]
     order: int
     count: int
     image_path: Optional[str]
+    image_key: Optional[str] = Field(None, exclude=True)
     last_watered: Optional[datetime.datetime]
-    plant_data: PlantResponse
+
+    @computed_field
+    @property
+    def thumbnail_path(self) -> Optional[str]:
+        # For dashboard tiles, instead of the full-size image_path.
+        return f"/api/userplants/{self.id}/image/?size=thumbnail" if self.image_key else None
 
     class Config:
-        orm_model = True
+        from_attributes = True
+
+class UserPlantInfoResponse(UserPlantInfoBase):
+    plant_data: PlantResponse
+
+class UserPlantDueResponse(BaseModel):
+    id: int
+    last_watered: Optional[datetime.datetime]
+    next_due: datetime.datetime
+    overdue_seconds: float
 
 class WaterPlantsInput(BaseModel):
     plant_ids: List[int]
 
+class WateringEventResponse(BaseModel):
+    id: int
+    watered_at: datetime.datetime
+
 class UserDashboardGroup(UserGroupResponse):
     plants: List[UserPlantInfoResponse] = []
 
@@ -141,3 +220,34 @@ class UserPlantNoteBase(BaseModel):
 class UserPlantNoteResponse(UserPlantNoteBase):
     id: int
     created_at: datetime.datetime
+
+class NoteSearchHit(BaseModel):
+    id: int
+    user_plant_id: int
+    created_at: datetime.datetime
+    # Part of the note around the first match; highlights are [start, end) offsets of
+    # the matching words in it.
+    snippet: str
+    highlights: List[Tuple[int, int]]
+    score: float
+
+class UserPlantInfoWithNotesResponse(UserPlantInfoResponse):
+    note_data: List[UserPlantNoteResponse] = []
+
+class UserDashboardGroupWithNotes(UserGroupResponse):
+    plants: List[UserPlantInfoWithNotesResponse] = []
+
+# Collection export records: the fields the JSON routes show, plus the ids and deletion
+# times that tie the records together.
+class UserGroupExport(UserGroupResponse):
+    deleted_at: Optional[datetime.datetime]
+
+class UserPlantExport(UserPlantInfoBase):
+    plant_id: int
+    user_group_id: Optional[int]
+    created_at: datetime.datetime
+    deleted_at: Optional[datetime.datetime]
+
+class UserPlantNoteExport(UserPlantNoteResponse):
+    user_plant_id: int
+    deleted_at: Optional[datetime.datetime]
@@ -0,0 +1,293 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from functools import reduce
+from itertools import chain, islice
+from typing import Iterable, Optional
+import numpy as np
+from api.settings import PLANT_SEARCH_TTL_SECONDS
+
+_WORDS = re.compile(r"[a-z0-9]+")
+
+# Relative weight of a match in each searchable field.
+NAME_WEIGHT = 1.0
+SCIENTIFIC_NAME_WEIGHT = 0.8
+
+
+def normalize(text: Optional[str]) -> list[str]:
+    # "Ficus lyrata 'Bambino'" -> ["ficus", "lyrata", "bambino"]
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return _WORDS.findall(text)
+
+
+def trigrams(word: str) -> frozenset:
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _ids(values: array) -> np.ndarray:
+    return np.frombuffer(values, dtype="int64")
+
+
+def one_edit(a: str, b: str) -> bool:
+    # Levenshtein distance of at most one: one insertion, deletion or substitution.
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + 1:] == b[i + 1:] if len(a) == len(b) else a[i:] == b[i + 1:]
+
+
+class _WordIndex:
+    # Id lists are kept in array("q") rather than lists or sets: NumPy reads them without
+    # a copy, and the garbage collector does not have to walk a million small ints.
+
+    def __init__(self):
+        self.building = False  # sorted lists are sorted once at the end of a bulk build
+        self.words: list[str] = []  # word id -> word
+        self.word_ids: dict[str, int] = {}
+        # word id -> (-field weight, name, plant id) for every plant with the word, in
+        # rank order, and the same plant ids for intersecting query words.
+        self.postings: list[list[tuple]] = []
+        self.posting_ids: list[array] = []
+        self.sorted_words: list[str] = []
+        self.trigram_words: dict[str, array] = {}
+        self.trigram_counts = array("q")  # word id -> number of trigrams
+        self.word_lengths = array("q")  # word id -> length
+        self.plant_words: dict[int, tuple] = {}  # plant id -> ((word id, field weight), ...)
+        self.names: dict[int, str] = {}
+
+    def word_id(self, word: str) -> int:
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.words.append(word)
+            self.word_ids[word] = word_id
+            self.postings.append([])
+            self.posting_ids.append(array("q"))
+            if self.building:
+                self.sorted_words.append(word)
+            else:
+                bisect.insort(self.sorted_words, word)
+            grams = trigrams(word)
+            self.trigram_counts.append(len(grams))
+            self.word_lengths.append(len(word))
+            for gram in grams:
+                self.trigram_words.setdefault(gram, array("q")).append(word_id)
+        return word_id
+
+    def remove(self, plant_id: int):
+        name = self.names.pop(plant_id, None)
+        for word_id, weight in self.plant_words.pop(plant_id, ()):
+            postings = self.postings[word_id]
+            i = bisect.bisect_left(postings, (-weight, name, plant_id))
+            if i < len(postings) and postings[i][2] == plant_id:
+                del postings[i]
+            self.posting_ids[word_id].remove(plant_id)
+
+    def add(self, plant_id: int, name: Optional[str], scientific_name: Optional[str]):
+        self.remove(plant_id)
+        name = name or ""
+        weights = {}
+        for words, weight in ((normalize(scientific_name), SCIENTIFIC_NAME_WEIGHT), (normalize(name), NAME_WEIGHT)):
+            for word in words:
+                word_id = self.word_id(word)
+                weights[word_id] = max(weight, weights.get(word_id, 0))
+        for word_id, weight in weights.items():
+            if self.building:
+                self.postings[word_id].append((-weight, name, plant_id))
+            else:
+                bisect.insort(self.postings[word_id], (-weight, name, plant_id))
+            self.posting_ids[word_id].append(plant_id)
+        self.plant_words[plant_id] = tuple(weights.items())
+        self.names[plant_id] = name
+
+    def finish_build(self):
+        self.sorted_words.sort()
+        for postings in self.postings:
+            postings.sort()
+        self.building = False
+
+    def _shared(self, grams: frozenset) -> np.ndarray:
+        # Trigrams each indexed word has in common with ``grams``, by word id.
+        lists = [_ids(self.trigram_words[gram]) for gram in grams if gram in self.trigram_words]
+        if not lists:
+            return np.zeros(len(self.words), dtype="int64")
+        return np.bincount(np.concatenate(lists), minlength=len(self.words))
+
+    def similarity(self, word: str) -> np.ndarray:
+        """Trigram (Jaccard) similarity of ``word`` to every indexed word, by word id."""
+        grams = trigrams(word)
+        shared = self._shared(grams)
+        return shared / (len(grams) + _ids(self.trigram_counts) - shared)
+
+    def within_one_edit(self, word: str) -> list[int]:
+        """Ids of the indexed words one edit away from ``word``. An edit changes at most
+        three of a word's trigrams, so only words sharing the rest are compared."""
+        grams = trigrams(word)
+        shared = self._shared(grams)
+        candidates = np.flatnonzero((shared >= max(len(grams) - 3, 1)) & (np.abs(_ids(self.word_lengths) - len(word)) <= 1))
+        return [word_id for word_id in candidates.tolist() if one_edit(word, self.words[word_id])]
+
+    def plants_with(self, word_ids: Iterable[int]) -> np.ndarray:
+        return np.unique(np.concatenate([_ids(self.posting_ids[word_id]) for word_id in word_ids]))
+
+
+class PlantSearchIndex:
+    """Word, prefix and trigram index over plant names and scientific names, per worker.
+
+    Plants are split into words. A query word scores against a plant word as an exact
+    match or as a prefix of it (search-as-you-type). A query word that matches no plant
+    word that way and is at least ``fuzzy_min_length`` long is taken as misspelled and
+    scored by trigram similarity instead. Short words share few trigrams even one letter
+    off ("frn" and "fern" score 0.29), so up to ``edit_max_length`` letters, words one
+    insertion, deletion or substitution away match as well. A plant's
+    score is the sum over query words of its best match, weighted by field; results are
+    ranked by score, then in catalog order. Plants matching every query word are
+    preferred over plants matching some of them.
+
+    The index is built from the plants table on first use and again every ``ttl``
+    seconds, so plants written by other workers show up. The crud write functions keep
+    it current for this process in between.
+    """
+
+    prefix_score = 0.9  # for a query word that is a prefix of a longer plant word
+    fuzzy_score = 0.8  # times the trigram similarity
+    min_similarity = 0.4
+    fuzzy_min_length = 3
+    edit_max_length = 5
+    max_expansions = 256  # plant words tried per query word for prefix matches
+    max_scored = 500  # plants scored in full for a query of several words
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = _WordIndex()
+        self._expires_at: Optional[float] = None
+        self._generation = 0
+
+    def stale(self) -> bool:
+        return self._expires_at is None or self._expires_at < time.monotonic()
+
+    def generation(self) -> int:
+        # Same contract as PlantCatalogCache.generation: taken before reading the plants
+        # table and handed back to load().
+        return self._generation
+
+    def load(self, rows: Iterable, generation: int) -> bool:
+        """Rebuild from (id, name, scientific_name) rows. Returns False if a write came in
+        since ``generation`` was taken, in which case the current index is kept."""
+        index = _WordIndex()
+        index.building = True
+        for plant_id, name, scientific_name in rows:
+            index.add(plant_id, name, scientific_name)
+        index.finish_build()
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._index = index
+            self._expires_at = time.monotonic() + self.ttl
+            return True
+
+    def put(self, db_plants: Iterable):
+        with self._lock:
+            self._generation += 1
+            for plant in db_plants:
+                self._index.add(plant.id, plant.name, plant.scientific_name)
+
+    def remove(self, plant_id: int):
+        with self._lock:
+            self._generation += 1
+            self._index.remove(plant_id)
+
+    def invalidate(self):
+        # Rebuilt from the database on the next search.
+        with self._lock:
+            self._generation += 1
+            self._expires_at = None
+
+    def _matches(self, index: _WordIndex, term: str) -> dict[int, float]:
+        """word id -> match score for the indexed words ``term`` matches"""
+        start = bisect.bisect_left(index.sorted_words, term)
+        end = min(bisect.bisect_left(index.sorted_words, term + "\uffff", start), start + self.max_expansions)
+        scale = self.prefix_score * 0.5 * len(term)
+        matches = {index.word_ids[word]: self.prefix_score * 0.5 + scale / len(word) for word in index.sorted_words[start:end]}
+        if term in index.word_ids:
+            matches[index.word_ids[term]] = 1.0
+        if matches or len(term) < self.fuzzy_min_length:
+            return matches
+        # Nothing starts with the term: try it as a misspelling.
+        similarity = index.similarity(term)
+        for word_id in np.flatnonzero(similarity >= self.min_similarity).tolist():
+            matches[word_id] = max(matches.get(word_id, 0), self.fuzzy_score * float(similarity[word_id]))
+        if len(term) <= self.edit_max_length:
+            for word_id in index.within_one_edit(term):
+                # As similar as a word that long can be with one letter wrong.
+                similar = 1 - 1 / max(len(term), len(index.words[word_id]))
+                matches[word_id] = max(matches.get(word_id, 0), self.fuzzy_score * similar)
+        return matches
+
+    @staticmethod
+    def _top(index: _WordIndex, matches: dict[int, float], limit: int, among: Optional[set] = None) -> list[int]:
+        # Best plants for one query word. Words are visited best score first and each
+        # word's postings are already in rank order, so reading stops as soon as nothing
+        # further can beat the plant currently ranked ``limit``-th (the cutoff, which only
+        # ever improves, so refreshing it now and then is enough).
+        best: dict[int, tuple] = {}  # plant id -> rank key
+        cutoff, added = None, 0
+        for word_id, score in sorted(matches.items(), key=lambda item: item[1], reverse=True):
+            if cutoff is not None and -score > cutoff[0]:
+                break
+            postings = index.postings[word_id]
+            if among is not None:
+                postings = (posting for posting in postings if posting[2] in among)
+            for neg_weight, name, plant_id in islice(postings, limit):
+                key = (neg_weight * score, name, plant_id)
+                if cutoff is not None and key > cutoff:
+                    break
+                previous = best.get(plant_id)
+                if previous is None or key < previous:
+                    best[plant_id] = key
+                    added += previous is None
+                if added >= limit:
+                    cutoff, added = heapq.nsmallest(limit, best.values())[-1], 0
+        return heapq.nsmallest(limit, best, key=best.get)
+
+    def search(self, query: str, limit: int) -> list[int]:
+        """Ids of the best matching plants, best first."""
+        with self._lock:
+            index = self._index
+            per_term = [matches for matches in (self._matches(index, term) for term in dict.fromkeys(normalize(query))) if matches]
+            if not per_term:
+                return []
+            if len(per_term) == 1:
+                return self._top(index, per_term[0], limit)
+
+            matching = [index.plants_with(matches) for matches in per_term]
+            in_all = reduce(np.intersect1d, matching)
+            if len(in_all) <= self.max_scored:
+                candidates = in_all.tolist()
+            else:
+                rarest = min(range(len(per_term)), key=lambda i: len(matching[i]))
+                candidates = self._top(index, per_term[rarest], self.max_scored, among=set(in_all.tolist()))
+            if not candidates:
+                candidates = set(chain.from_iterable(self._top(index, matches, limit) for matches in per_term))
+
+            def score(plant_id):
+                words = index.plant_words[plant_id]
+                return sum(max(matches.get(word_id, 0) * weight for word_id, weight in words) for matches in per_term)
+
+            scores = {plant_id: score(plant_id) for plant_id in candidates}
+            return heapq.nsmallest(limit, scores, key=lambda plant_id: (-scores[plant_id], index.names[plant_id], plant_id))
+
+
+plant_search = PlantSearchIndex(ttl=PLANT_SEARCH_TTL_SECONDS)
@@ -1,9 +1,99 @@
 import os
 
 DB_URL = os.environ["DB_URL"]
+# Set DB_ASYNC=true to serve requests through an AsyncSession. DB_ASYNC_URL must then
+# name an async driver, e.g. postgresql+asyncpg://... or sqlite+aiosqlite:///...
+DB_ASYNC = os.environ.get("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+DB_ASYNC_URL = os.environ.get("DB_ASYNC_URL", DB_URL)
+# Connection pool per engine (primary and each replica). Pre-ping tests a pooled
+# connection before handing it out; recycle replaces connections older than this many
+# seconds (-1: never), for servers and proxies that drop idle ones.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", 30))
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Admission control, see api/admission.py, off unless ADMISSION_ENABLED is set: requests
+# served at once per worker, per user and per expensive route, and how many may wait for
+# a slot and for how long. The worker limit defaults to what the pool can serve at once,
+# DB_POOL_SIZE + DB_MAX_OVERFLOW; the user and expensive-route limits to a quarter of it
+# (at least 2 and 1), so a few streamed exports or imports, which hold their slot until
+# the whole body is sent, cannot fill the worker. The routes hold the GIL for much of a
+# request, so with a local database a lower limit can serve faster. A queue that has not
+# emptied for the CoDel interval sheds requests that have waited longer than the target.
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "false").lower() in ("1", "true", "yes")
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", DB_POOL_SIZE + DB_MAX_OVERFLOW))
+ADMISSION_USER_CONCURRENCY = int(os.environ.get("ADMISSION_USER_CONCURRENCY", max(2, ADMISSION_MAX_CONCURRENCY // 4)))
+ADMISSION_EXPENSIVE_CONCURRENCY = int(os.environ.get("ADMISSION_EXPENSIVE_CONCURRENCY", max(1, ADMISSION_MAX_CONCURRENCY // 4)))
+ADMISSION_MAX_WAITING = int(os.environ.get("ADMISSION_MAX_WAITING", 256))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS", 2))
+ADMISSION_CODEL_TARGET_SECONDS = float(os.environ.get("ADMISSION_CODEL_TARGET_SECONDS", 0.1))
+ADMISSION_CODEL_INTERVAL_SECONDS = float(os.environ.get("ADMISSION_CODEL_INTERVAL_SECONDS", 0.5))
+# Comma-separated read replica URLs for the GET routes, see api/replicas.py. With
+# DB_ASYNC, DB_ASYNC_REPLICA_URLS must name async drivers. A replica that fails is
+# skipped for DB_REPLICA_RETRY_SECONDS. A user's reads stay on the primary for
+# DB_READ_AFTER_WRITE_SECONDS after they write (everyone's catalog reads, after a
+# catalog write); set it above the replicas' usual lag.
+DB_REPLICA_URLS = [url.strip() for url in os.environ.get("DB_REPLICA_URLS", "").split(",") if url.strip()]
+DB_ASYNC_REPLICA_URLS = [url.strip() for url in os.environ.get("DB_ASYNC_REPLICA_URLS", ",".join(DB_REPLICA_URLS)).split(",") if url.strip()]
+DB_REPLICA_RETRY_SECONDS = float(os.environ.get("DB_REPLICA_RETRY_SECONDS", 10))
+DB_READ_AFTER_WRITE_SECONDS = float(os.environ.get("DB_READ_AFTER_WRITE_SECONDS", 5))
+# Log every SQL statement. For debugging only: the logging is synchronous and costs
+# throughput. /metrics has statement counts and timings.
+DB_ECHO = os.environ.get("DB_ECHO", "false").lower() in ("1", "true", "yes")
+# Per-route SQL statement budgets, see api/query_budget.py: "log", "raise" (tests and
+# benchmarks) or "off". A statement running more than QUERY_BUDGET_MAX_REPEATS times in
+# one request is reported as a likely N+1.
+QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "log").lower()
+QUERY_BUDGET_MAX_REPEATS = int(os.environ.get("QUERY_BUDGET_MAX_REPEATS", 3))
+# In-process plant catalog cache, see api/catalog.py
+PLANT_CACHE_MAX_SIZE = int(os.environ.get("PLANT_CACHE_MAX_SIZE", 20000))
+PLANT_CACHE_TTL_SECONDS = float(os.environ.get("PLANT_CACHE_TTL_SECONDS", 300))
+# Catalog search index, rebuilt from the database this often, see api/search.py
+PLANT_SEARCH_TTL_SECONDS = float(os.environ.get("PLANT_SEARCH_TTL_SECONDS", 300))
+# Per-user note search indexes, rebuilt this often and capped at this many notes in
+# all per worker, see api/note_search.py
+NOTE_SEARCH_TTL_SECONDS = float(os.environ.get("NOTE_SEARCH_TTL_SECONDS", 600))
+NOTE_SEARCH_MAX_NOTES = int(os.environ.get("NOTE_SEARCH_MAX_NOTES", 2000000))
+# Rows per INSERT batch for catalog imports, and per fetch for catalog exports
+PLANT_IMPORT_BATCH_SIZE = int(os.environ.get("PLANT_IMPORT_BATCH_SIZE", 1000))
+PLANT_EXPORT_BATCH_SIZE = int(os.environ.get("PLANT_EXPORT_BATCH_SIZE", 1000))
+# Rows per fetch for a user's collection export
+COLLECTION_EXPORT_BATCH_SIZE = int(os.environ.get("COLLECTION_EXPORT_BATCH_SIZE", 1000))
+# Watering events are buffered and written in batches, see api/watering.py
+WATERING_BUFFER_ENABLED = os.environ.get("WATERING_BUFFER_ENABLED", "true").lower() in ("1", "true", "yes")
+WATERING_FLUSH_INTERVAL_SECONDS = float(os.environ.get("WATERING_FLUSH_INTERVAL_SECONDS", 0.5))
+WATERING_MAX_BATCH = int(os.environ.get("WATERING_MAX_BATCH", 5000))
+# Uploaded plant photos, stored by content hash, and the JPEG variants rendered from
+# them in a pool of IMAGE_WORKERS processes, see api/images.py
+IMAGE_STORAGE_DIR = os.environ.get("IMAGE_STORAGE_DIR", "./images")
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", 20 * 1024 * 1024))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", os.cpu_count() or 1))
+IMAGE_THUMBNAIL_SIZE = int(os.environ.get("IMAGE_THUMBNAIL_SIZE", 320))
+IMAGE_PREVIEW_SIZE = int(os.environ.get("IMAGE_PREVIEW_SIZE", 1280))
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", 82))
+# Watering reminders, sent by a background scheduler, see api/reminders.py. Enable them
+# in one process only: every process with them enabled sends its own. REMINDER_SENDER is
+# the dotted path of the ReminderSender class reminders are handed to.
+REMINDERS_ENABLED = os.environ.get("REMINDERS_ENABLED", "false").lower() in ("1", "true", "yes")
+REMINDER_TICK_SECONDS = float(os.environ.get("REMINDER_TICK_SECONDS", 60))
+REMINDER_REPEAT_SECONDS = float(os.environ.get("REMINDER_REPEAT_SECONDS", 24 * 60 * 60))
+REMINDER_SENDER = os.environ.get("REMINDER_SENDER", "api.reminders.LogSender")
+# Startup, see api/startup.py. SCHEMA_CHECK compares the database's migration revision
+# with the migrations' head: "off", "warn" (log a mismatch) or "fail" (refuse to start).
+SCHEMA_CHECK = os.environ.get("SCHEMA_CHECK", "off").lower()
+# Warm pools, caches and statement caches before serving, and how many connections to
+# open per engine while doing so
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+DB_POOL_WARM_CONNECTIONS = int(os.environ.get("DB_POOL_WARM_CONNECTIONS", 1))
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 30 minutes
 REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 ALGORITHM = "HS256"
 JWT_SECRET_KEY = os.environ['JWT_SECRET_KEY']   # should be kept secret
 JWT_REFRESH_SECRET_KEY = os.environ['JWT_REFRESH_SECRET_KEY']   # should be kept secret
-
+# bcrypt runs on a bounded worker pool, see api/auth/password_pool.py
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS", 2))
+PASSWORD_HASH_MAX_WAITING = int(os.environ.get("PASSWORD_HASH_MAX_WAITING", 64))
+# Number of verified access tokens remembered per worker, see api/auth/token_cache.py
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", 10000))
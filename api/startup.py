@@ -0,0 +1,158 @@
+"""Worker startup and shutdown, run by the app lifespan.
+
+Importing api.main touches no database: engines connect on first use, so a worker
+started while the database is down comes up and fails requests until it is back,
+instead of crashing in a restart loop. Only SCHEMA_CHECK=fail makes the database a
+condition of starting.
+
+Startup checks the schema (SCHEMA_CHECK), then, with STARTUP_WARMUP, does the work the
+first requests would otherwise pay for: opening DB_POOL_WARM_CONNECTIONS connections
+per engine, loading the plant catalog cache and search index, configuring the ORM
+mappers and compiling the statements of the busiest routes, and loading the bcrypt
+backend. A warm-up step that fails is logged and skipped. Then the background workers
+start and /healthz reports the worker ready.
+"""
+import asyncio
+import gc
+import logging
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from sqlalchemy.orm import configure_mappers
+from starlette.concurrency import run_in_threadpool
+from api import crud, crud_async, database
+from api.auth.controller import password_context, password_pool
+from api.images import renderer as image_renderer
+from api.reminders import reminder_scheduler
+from api.settings import DB_ASYNC, SCHEMA_CHECK, STARTUP_WARMUP, DB_POOL_WARM_CONNECTIONS
+from api.watering import watering_writer
+
+logger = logging.getLogger(__name__)
+
+# Set once startup has finished, cleared when shutdown begins; see /healthz.
+ready = False
+
+
+class SchemaMismatch(RuntimeError):
+    pass
+
+
+def _migration_heads() -> set[str]:
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = Config(os.path.join(root, "alembic.ini"))
+    # alembic.ini gives it relative to the directory alembic is run from.
+    config.set_main_option("script_location", os.path.join(root, "migrations"))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def check_schema():
+    """Compares the revision the database was migrated to with the migrations' head,
+    one query; run ``alembic upgrade head`` when they differ."""
+    from alembic.runtime.migration import MigrationContext
+    with database.engine.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+    expected = _migration_heads()
+    if current != expected:
+        raise SchemaMismatch(f"The database is at revision {', '.join(sorted(current)) or 'none'}, "
+                             f"the migrations' head is {', '.join(sorted(expected))}")
+
+
+def _open_connections(engine, count: int):
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+async def _open_async_connections(engine, count: int):
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(await engine.connect())
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+async def warm_pools(count: int = DB_POOL_WARM_CONNECTIONS):
+    # The primary's sync engine serves the background writers in either mode.
+    sync_engines = [database.engine] + ([] if DB_ASYNC else database.replica_engines)
+    async_engines = [database.async_engine] + database.replica_engines if DB_ASYNC else []
+    await asyncio.gather(*(run_in_threadpool(_open_connections, engine, count) for engine in sync_engines),
+                         *(_open_async_connections(engine, count) for engine in async_engines))
+
+
+def warm_catalog():
+    with database.SessionLocal() as db:
+        crud.get_cached_plants(db, limit=1)
+        crud.load_plant_search(db)
+
+
+async def warm_statements():
+    # Queries for a user id that does not exist: nothing is read, but each statement is
+    # compiled into the engine's cache, as the first real request would do.
+    configure_mappers()
+    async with database.open_db() as db:
+        await crud_async.get_user_by_username(db, "")
+        await crud_async.get_dashboard(db, 0)
+        await crud_async.get_user_groups(db, 0)
+        await crud_async.get_due_user_plants(db, 0)
+
+
+def warm_passwords():
+    password_context.handler().get_backend()
+
+
+async def warm_up():
+    steps = [("pools", warm_pools()), ("catalog", run_in_threadpool(warm_catalog)),
+             ("statements", warm_statements()), ("passwords", run_in_threadpool(warm_passwords))]
+    for name, step in steps:
+        try:
+            await step
+        except Exception:
+            logger.warning("Warming up %s failed, continuing without", name, exc_info=True)
+
+
+async def startup():
+    global ready
+    if SCHEMA_CHECK != "off":
+        try:
+            await run_in_threadpool(check_schema)
+        except Exception as e:
+            if SCHEMA_CHECK == "fail":
+                raise
+            logger.warning("Schema check failed: %s", e)
+    if STARTUP_WARMUP:
+        await warm_up()
+    # What startup allocated lives as long as the worker: moved out of the collector's
+    # reach, the first full collections (otherwise in the first requests) skip it.
+    gc.collect()
+    gc.freeze()
+    if watering_writer is not None:
+        watering_writer.start()
+    if reminder_scheduler is not None:
+        reminder_scheduler.start()
+    ready = True
+
+
+async def shutdown():
+    global ready
+    ready = False
+    if reminder_scheduler is not None:
+        reminder_scheduler.stop()
+    if watering_writer is not None:
+        watering_writer.stop()
+    password_pool.shutdown()
+    image_renderer.shutdown()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    yield
+    await shutdown()
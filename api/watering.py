@@ -0,0 +1,94 @@
+import datetime
+import logging
+import threading
+from api import crud
+from api.database import SessionLocal
+from api.settings import WATERING_BUFFER_ENABLED, WATERING_FLUSH_INTERVAL_SECONDS, WATERING_MAX_BATCH
+
+logger = logging.getLogger(__name__)
+
+
+class WateringEventWriter:
+    """Buffers watering events from many requests and writes them in batches.
+
+    A background thread flushes every ``flush_interval`` seconds, or as soon as
+    ``max_batch`` events are waiting. Each flush is one multi-row INSERT into
+    watering_events plus the matching last_watered updates, in a single transaction.
+    Readers may therefore see last_watered up to one interval late. A batch that fails
+    is retried on the next flush and dropped after ``max_attempts`` failures in a row.
+    """
+
+    max_attempts = 3
+
+    def __init__(self, session_factory, write_batch, flush_interval: float, max_batch: int):
+        self.session_factory = session_factory
+        self.write_batch = write_batch
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="watering-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, user_id: int, user_plant_ids: list, watered_at: datetime.datetime):
+        with self._lock:
+            self._pending.extend((plant_id, user_id, watered_at) for plant_id in user_plant_ids)
+            if len(self._pending) >= self.max_batch:
+                self._wakeup.set()
+
+    def flush(self) -> int:
+        with self._lock:
+            events, self._pending = self._pending, []
+        if not events:
+            return 0
+        try:
+            with self.session_factory() as db:
+                self.write_batch(db, events)
+        except Exception:
+            self._failures += 1
+            if self._failures >= self.max_attempts:
+                logger.exception("Dropping %d watering events after %d failed writes", len(events), self._failures)
+                self._failures = 0
+            else:
+                logger.exception("Writing %d watering events failed, retrying on the next flush", len(events))
+                with self._lock:
+                    self._pending[:0] = events
+            return 0
+        self._failures = 0
+        return len(events)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()
+
+
+watering_writer = WateringEventWriter(
+    session_factory=SessionLocal,
+    write_batch=crud.record_waterings,
+    flush_interval=WATERING_FLUSH_INTERVAL_SECONDS,
+    max_batch=WATERING_MAX_BATCH
+) if WATERING_BUFFER_ENABLED else None
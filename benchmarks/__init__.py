@@ -0,0 +1,14 @@
+"""Benchmarks for the API. Run each module with ``python -m benchmarks.<name>``.
+
+api.settings reads its configuration from the environment at import time, so the
+defaults below point the benchmarks at a throwaway SQLite file unless DB_URL is set.
+"""
+import os
+
+os.environ.setdefault("DB_URL", "sqlite:///./bench.db")
+os.environ.setdefault("DB_ASYNC_URL", os.environ["DB_URL"].replace("sqlite://", "sqlite+aiosqlite://", 1))
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+os.environ.setdefault("JWT_REFRESH_SECRET_KEY", "bench-refresh-secret")
+os.environ.setdefault("IMAGE_STORAGE_DIR", "./bench-images")
+# Fail requests that go over their route's query budget, see api/query_budget.py
+os.environ.setdefault("QUERY_BUDGET_MODE", "raise")
@@ -0,0 +1,108 @@
+"""Concurrent-request throughput of the sync and async database paths.
+
+    python -m benchmarks.async_db --concurrency 50 --requests 2000
+
+Each simulated request opens a session, lists the plant catalog and closes the session,
+the way a route does. Three modes are compared:
+
+* blocking   - the old behaviour, sync crud called straight from the coroutine
+* threadpool - DB_ASYNC off, sync Session driven through api.crud_async
+* async      - DB_ASYNC on, AsyncSession driven through api.crud_async
+
+Alongside throughput the benchmark reports event-loop lag, measured by a ticker that
+asks to wake up every millisecond. Lag is what every other in-flight request pays.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import statistics
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine
+
+from api import crud, crud_async, models, settings
+from api.schemas import PlantType
+
+
+def seed(engine, plants: int):
+    models.Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        existing = db.query(models.Plant).count()
+        db.add_all(
+            models.Plant(name=f"Plant {i}", scientific_name=f"Planta {i}", type=PlantType.LEAFY_PLANT,
+                         watering_freq=1, created_at=datetime.datetime.utcnow())
+            for i in range(existing, plants)
+        )
+        db.commit()
+
+
+async def ticker(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def run_mode(mode: str, session_factory, concurrency: int, requests: int, page: int):
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            if mode == "async":
+                async with session_factory() as db:
+                    await crud_async.get_plants(db, 0, page)
+            else:
+                with session_factory() as db:
+                    if mode == "blocking":
+                        crud.get_plants(db, 0, page)
+                    else:
+                        await crud_async.get_plants(db, 0, page)
+
+    lags, stop = [], asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    lags.sort()
+    return {
+        "mode": mode,
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "loop_lag_ms_p50": round(statistics.median(lags) * 1000, 3) if lags else None,
+        "loop_lag_ms_max": round(lags[-1] * 1000, 3) if lags else None,
+    }
+
+
+async def main(args):
+    sync_engine = create_engine(settings.DB_URL)
+    seed(sync_engine, args.plants)
+    async_engine = create_async_engine(settings.DB_ASYNC_URL)
+    factories = {
+        "blocking": sessionmaker(bind=sync_engine),
+        "threadpool": sessionmaker(bind=sync_engine),
+        "async": async_sessionmaker(async_engine, expire_on_commit=False),
+    }
+    results = []
+    for mode in args.modes:
+        results.append(await run_mode(mode, factories[mode], args.concurrency, args.requests, args.page))
+    await async_engine.dispose()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--plants", type=int, default=500)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--modes", nargs="+", default=["blocking", "threadpool", "async"])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""Adding plants to a collection one request at a time against one batch request.
+
+    python -m benchmarks.batch_mutations --plants 1000
+
+Drives the app in-process over ASGI as a fresh user. Adds --plants plants through
+POST /api/userplants/create/, then the same number again as a single
+POST /api/userplants/batch/ request. It then reverses the order of the collection with
+one update per plant and puts it back with a single reorder operation. Reports wall
+time and the number of SQL statements each way.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import time
+
+import httpx
+from sqlalchemy import event
+
+from api import models
+from api.auth import controller
+from api.database import SessionLocal, engine
+from api.main import app
+
+
+def seed(username: str, password: str, plants: int):
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        user = models.User(username=username, hashed_password=controller.get_hashed_password(password), created_at=now, admin=False)
+        catalog = [models.Plant(name=f"Batch plant {i}", created_at=now) for i in range(min(plants, 50))]
+        db.add_all([user, *catalog])
+        db.flush()
+        db.add(models.UserGroup(user_id=user.id, is_default=True, name="", created_at=now))
+        db.commit()
+        return user.id, [plant.id for plant in catalog]
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+async def timed(counter: StatementCounter, requests):
+    counter.count = 0
+    start = time.perf_counter()
+    for request in requests:
+        (await request).raise_for_status()
+    return {"seconds": round(time.perf_counter() - start, 3), "sql_statements": counter.count}
+
+
+async def main(args):
+    username = f"batch-{time.time()}"
+    user_id, catalog = seed(username, args.password, args.plants)
+    counter = StatementCounter()
+    plants = [{"plant_id": catalog[i % len(catalog)], "nickname": f"Plant {i}", "image_path": None} for i in range(args.plants)]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/api/auth/login/", data={"username": username, "password": args.password})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        results = {"plants": args.plants}
+        results["create_one_by_one"] = await timed(counter, (
+            client.post("/api/userplants/create/", json=plant, headers=headers) for plant in plants))
+        results["create_batch"] = await timed(counter, [
+            client.post("/api/userplants/batch/", json={"operations": [{"op": "create", **plant} for plant in plants]}, headers=headers)])
+
+        with SessionLocal() as db:
+            rows = db.query(models.UserPlant.id, models.UserPlant.order) \
+                .filter(models.UserPlant.user_id == user_id) \
+                .order_by(models.UserPlant.order).limit(args.plants).all()
+        ids = [row.id for row in rows]
+        orders = [row.order for row in rows]
+        results["reorder_one_by_one"] = await timed(counter, (
+            client.post(f"/api/userplants/{plant_id}/update/", json={"order": order}, headers=headers)
+            for plant_id, order in zip(ids, reversed(orders))))
+        results["reorder_batch"] = await timed(counter, [
+            client.post("/api/userplants/batch/", json={"operations": [{"op": "reorder", "ids": ids}]}, headers=headers)])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=1000)
+    parser.add_argument("--password", default="batch-password")
+    asyncio.run(main(parser.parse_args()))
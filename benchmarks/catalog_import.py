@@ -0,0 +1,96 @@
+"""Bulk catalog import and export against one-plant-per-request creation.
+
+    python -m benchmarks.catalog_import --plants 50000
+
+Drives the app in-process over ASGI. Creates a sample of plants through
+POST /api/plants/create/ and extrapolates to the full catalog, then uploads the whole
+catalog as a streamed NDJSON body to POST /api/plants/import/, imports it again (every
+row now an update), and runs the body generator of GET /api/plants/export/ while
+tracking peak Python memory. (httpx's ASGI transport buffers whole response bodies, so
+the export is consumed straight from the generator rather than through the client.)
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import time
+import tracemalloc
+
+import httpx
+
+from api import models
+from api.auth import controller
+from api.database import SessionLocal, engine
+from api.main import app
+from api.routers import plants as plants_router
+from api.schemas import CatalogFormat
+
+
+def seed_user(username: str, password: str):
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if db.query(models.User).filter(models.User.username == username).first() is None:
+            now = datetime.datetime.utcnow()
+            db.add(models.User(username=username, hashed_password=controller.get_hashed_password(password), created_at=now, admin=False))
+            db.commit()
+
+
+def plant(i: int, run: str) -> dict:
+    return {"name": f"Plant {i}", "scientific_name": f"Planta {run} {i}", "type": "LEAFY_PLANT",
+            "watering_freq": 1 + i % 4, "watering_period": "WEEK"}
+
+
+async def ndjson_body(count: int, run: str, chunk_size: int = 65536):
+    buffer = bytearray()
+    for i in range(count):
+        buffer += json.dumps(plant(i, run)).encode() + b"\n"
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def main(args):
+    seed_user(args.username, args.password)
+    run = str(time.time())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/api/auth/login/", data={"username": args.username, "password": args.password})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        start = time.perf_counter()
+        for i in range(args.sample):
+            (await client.post("/api/plants/create/", json=plant(i, run + "-single"), headers=headers)).raise_for_status()
+        per_plant = (time.perf_counter() - start) / args.sample
+
+        results = {"plants": args.plants, "single_create": {
+            "sample": args.sample, "ms_per_plant": round(per_plant * 1000, 3),
+            "extrapolated_seconds": round(per_plant * args.plants, 1)}}
+        for name in ("import_insert", "import_update"):
+            start = time.perf_counter()
+            response = await client.post("/api/plants/import/", content=ndjson_body(args.plants, run),
+                                         headers={**headers, "Content-Type": "application/x-ndjson"})
+            response.raise_for_status()
+            seconds = time.perf_counter() - start
+            results[name] = {"rows": response.json()["rows"], "seconds": round(seconds, 2), "rows_per_second": round(args.plants / seconds)}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    exported = 0
+    async for chunk in plants_router._export(CatalogFormat.ndjson):
+        exported += chunk.count(b"\n")
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["export"] = {"rows": exported, "seconds": round(seconds, 2), "peak_python_mb": round(peak / 2 ** 20, 1)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=50_000)
+    parser.add_argument("--sample", type=int, default=300)
+    parser.add_argument("--username", default="catalog-import")
+    parser.add_argument("--password", default="catalog-import-password")
+    asyncio.run(main(parser.parse_args()))
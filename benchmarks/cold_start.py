@@ -0,0 +1,107 @@
+"""Cold start: from exec of a worker process to its first 200 response.
+
+    python -m benchmarks.cold_start --runs 5 --budget-seconds 5
+
+Fills the database with benchmarks.datagen once, then --runs times starts
+``uvicorn api.main:app`` in a new process and polls --probe until it answers 200.
+That time, from exec to first 200, is what a restarted or newly scaled-out worker
+takes before it can serve. Each run then times the first requests a user makes (log
+in, the dashboard, the plant catalog, due plants) and the same requests again, so
+work left to the first request shows up as the difference. Also reports how long
+importing api.main takes on its own.
+
+Medians across runs go to stdout as JSON. Exits non-zero when the median exec to
+first 200 is over --budget-seconds.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import datagen
+
+REQUESTS = [("GET", "/api/userplants/"), ("GET", "/api/plants/?limit=50"), ("GET", "/api/userplants/due/")]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_seconds() -> float:
+    code = "import time; start = time.perf_counter(); import api.main; print(time.perf_counter() - start)"
+    return float(subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout)
+
+
+def session(client: httpx.Client, username: str, password: str) -> dict:
+    timings = {}
+    start = time.perf_counter()
+    response = client.post("/api/auth/login/", data={"username": username, "password": password})
+    timings["POST /api/auth/login/"] = time.perf_counter() - start
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    for method, path in REQUESTS:
+        start = time.perf_counter()
+        client.request(method, path, headers=headers).raise_for_status()
+        timings[f"{method} {path}"] = time.perf_counter() - start
+    return timings
+
+
+def run(args, username: str, password: str) -> dict:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"])
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"The server exited with {server.returncode} before answering")
+                try:
+                    if client.get(args.probe).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+            ready = time.perf_counter() - start
+            first = session(client, username, password)
+            again = session(client, username, password)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"ready": ready, "first": first, "again": again}
+
+
+def main(args):
+    data = datagen.generate(users=args.users, plants_per_user=args.plants_per_user, catalog=args.catalog, reset=True)
+    username = data.users[0][1]
+    runs = [run(args, username, data.password) for _ in range(args.runs)]
+    median_ms = lambda values: round(statistics.median(values) * 1000, 1)
+    ready = statistics.median(run["ready"] for run in runs)
+    result = {
+        "runs": args.runs,
+        "import_api_main_ms": median_ms([import_seconds() for _ in range(args.runs)]),
+        "exec_to_first_200_ms": round(ready * 1000, 1),
+        "first_requests_ms": {name: median_ms([run["first"][name] for run in runs]) for name in runs[0]["first"]},
+        "repeated_requests_ms": {name: median_ms([run["again"][name] for run in runs]) for name in runs[0]["again"]},
+    }
+    print(json.dumps(result, indent=2))
+    if ready > args.budget_seconds:
+        sys.exit(f"Median exec to first 200 took {ready:.2f}s, the budget is {args.budget_seconds}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--probe", default="/healthz")
+    parser.add_argument("--budget-seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--plants-per-user", type=int, default=50)
+    parser.add_argument("--catalog", type=int, default=1000)
+    main(parser.parse_args())
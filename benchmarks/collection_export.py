@@ -0,0 +1,88 @@
+"""Time to first byte and peak memory of a user's collection export.
+
+    python -m benchmarks.collection_export --notes 10000 100000
+
+Seeds one user per size with ``--plants`` plants and the given number of notes, then
+runs the body generator of GET /api/userplants/export/ (httpx's ASGI transport would
+buffer the whole body) and reports time to the first chunk, total time and peak
+Python memory. For comparison it also loads the same collection the way the dashboard
+does with include_notes, which holds everything at once.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import time
+import tracemalloc
+
+from sqlalchemy import insert
+
+from api import crud, models
+from api.database import SessionLocal, engine
+from api.routers import user_plants as user_plants_router
+
+
+def seed(plants: int, notes: int) -> int:
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        user = models.User(username=f"export-{now.timestamp()}-{notes}", hashed_password="x", created_at=now, admin=False)
+        catalog = models.Plant(name="Export fern", created_at=now)
+        db.add_all([user, catalog])
+        db.flush()
+        group = models.UserGroup(user_id=user.id, is_default=True, name="", created_at=now)
+        db.add(group)
+        db.flush()
+        db.execute(insert(models.UserPlant), [
+            {"user_id": user.id, "plant_id": catalog.id, "user_group_id": group.id, "count": 1, "order": i, "created_at": now}
+            for i in range(plants)
+        ])
+        plant_ids = [row.id for row in db.query(models.UserPlant.id).filter(models.UserPlant.user_id == user.id)]
+        for start in range(0, notes, 10000):
+            db.execute(insert(models.UserPlantNotes), [
+                {"user_id": user.id, "user_plant_id": plant_ids[i % plants], "created_at": now,
+                 "note": f"Note {i}: rotated a quarter turn and misted the leaves."}
+                for i in range(start, min(notes, start + 10000))
+            ])
+        db.commit()
+        return user.id
+
+
+async def export(user_id: int):
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    first_byte, size = None, 0
+    async for chunk in user_plants_router._export_collection(user_id):
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    seconds = time.perf_counter() - start
+    return {"ttfb_ms": round(first_byte * 1000, 1), "seconds": round(seconds, 2),
+            "mb_sent": round(size / 2 ** 20, 1), "peak_python_mb": round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)}
+
+
+def dashboard(user_id: int):
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        crud.get_dashboard(db, user_id, include_notes=True)
+    return {"seconds": round(time.perf_counter() - start, 2), "peak_python_mb": round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)}
+
+
+async def main(args):
+    results = []
+    tracemalloc.start()
+    for notes in args.notes:
+        tracemalloc.stop()
+        user_id = seed(args.plants, notes)
+        tracemalloc.start()
+        results.append({"notes": notes, "export": await export(user_id), "dashboard_with_notes": dashboard(user_id)})
+    tracemalloc.stop()
+    print(json.dumps({"plants": args.plants, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=500)
+    parser.add_argument("--notes", type=int, nargs="+", default=[10_000, 100_000])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,99 @@
+"""Latency of a conditional GET answered with 304 against the full response.
+
+    python -m benchmarks.conditional_get --plants 500 --notes 5 --requests 300
+
+Seeds one user with --plants plants and --notes notes per plant, then drives the app
+in-process over ASGI. For each polled endpoint it times --requests plain GETs and
+--requests GETs sending the ETag back in If-None-Match, and reports latency
+percentiles, the SQL statements per request and the body size each way.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import time
+
+import httpx
+from sqlalchemy import event, insert
+
+from api import models
+from api.auth import controller
+from api.database import SessionLocal, engine
+from api.main import app
+
+
+def seed(username: str, password: str, plants: int, notes: int):
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        user = models.User(username=username, hashed_password=controller.get_hashed_password(password), created_at=now, admin=False)
+        catalog = [models.Plant(name=f"Polled plant {i}", created_at=now) for i in range(50)]
+        db.add_all([user, *catalog])
+        db.flush()
+        group = models.UserGroup(user_id=user.id, is_default=True, name="", created_at=now)
+        db.add(group)
+        db.flush()
+        db.execute(insert(models.UserPlant), [
+            {"user_id": user.id, "plant_id": catalog[i % len(catalog)].id, "user_group_id": group.id, "count": 1, "order": i, "created_at": now}
+            for i in range(plants)
+        ])
+        plant_ids = [row.id for row in db.query(models.UserPlant.id).filter(models.UserPlant.user_id == user.id)]
+        db.execute(insert(models.UserPlantNotes), [
+            {"user_id": user.id, "user_plant_id": plant_id, "created_at": now, "note": f"Note {n} on plant {plant_id}."}
+            for plant_id in plant_ids for n in range(notes)
+        ])
+        db.commit()
+        return plant_ids[0]
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+async def measure(client, path: str, headers: dict, requests: int):
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    samples, size = [], 0
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            samples.append(time.perf_counter() - start)
+            size = len(response.content)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return {"status": response.status_code, "bytes": size, "sql_per_request": statements / requests, **percentiles(samples)}
+
+
+async def main(args):
+    username = f"polling-{time.time()}"
+    plant_id = seed(username, args.password, args.plants, args.notes)
+    paths = ["/api/userplants/", "/api/userplants/?include_notes=true", "/api/plants/", f"/api/userplants/{plant_id}/notes/"]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/api/auth/login/", data={"username": username, "password": args.password})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        results = {}
+        for path in paths:
+            etag = (await client.get(path, headers=headers)).headers["ETag"]
+            results[path] = {
+                "full": await measure(client, path, headers, args.requests),
+                "not_modified": await measure(client, path, {**headers, "If-None-Match": etag}, args.requests),
+            }
+    print(json.dumps({"plants": args.plants, "notes_per_plant": args.notes, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=500)
+    parser.add_argument("--notes", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--password", default="polling-password")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,173 @@
+"""Rows and bytes the dashboard query pulls for a large collection.
+
+    python -m benchmarks.dashboard --plants 200 --notes 20
+
+Seeds one user with the given number of plants and notes per plant, then runs the
+dashboard load with the old all-joined strategy and with crud.get_dashboard, on a cold
+plant cache. Every SELECT the session emits is replayed to count the rows and bytes it
+returns. GET /api/userplants/ is then served in-process, to count its statements and the
+size of its body. Exits non-zero when the dashboard goes over any of its budgets (see
+budget()), so it can gate CI; tests/test_dashboard.py runs the same check.
+"""
+import argparse
+import datetime
+import json
+import sys
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, joinedload
+
+from api import crud, models, settings
+from api.auth.controller import create_access_token
+from api.catalog import plant_cache
+from api.database import engine as app_engine
+from api.main import app
+from api.query_budget import route_budget
+from api.schemas import PlantType
+
+GROUPS = 5
+CATALOG_SIZE = 50
+# Seeded notes are 120 characters; the rest is ids, timestamps and (in responses) JSON.
+FETCHED_BYTES_PER_ROW = 100
+FETCHED_BYTES_PER_NOTE = 200
+RESPONSE_BYTES_PER_PLANT = 400
+RESPONSE_BYTES_PER_NOTE = 200
+
+
+def seed(db, plants: int, notes: int):
+    now = datetime.datetime.utcnow()
+    user = models.User(username=f"dashboard-{now.timestamp()}", hashed_password="x", created_at=now, admin=False)
+    db.add(user)
+    db.flush()
+    groups = [models.UserGroup(user_id=user.id, is_default=i == 0, name=f"Group {i}", created_at=now) for i in range(GROUPS)]
+    catalog = [models.Plant(name=f"Plant {i}", scientific_name=f"Planta {i}", type=PlantType.LEAFY_PLANT,
+                            watering_freq=1, created_at=now) for i in range(CATALOG_SIZE)]
+    db.add_all(groups + catalog)
+    db.flush()
+    user_plants = [
+        models.UserPlant(user_id=user.id, plant_id=catalog[i % len(catalog)].id, nickname=f"#{i}", count=1, order=i,
+                         user_group_id=groups[i % len(groups)].id, created_at=now)
+        for i in range(plants)
+    ]
+    db.add_all(user_plants)
+    db.flush()
+    db.add_all(
+        models.UserPlantNotes(user_plant_id=up.id, user_id=user.id, created_at=now, note="Watered and rotated towards the window. " * 3)
+        for up in user_plants for _ in range(notes)
+    )
+    db.commit()
+    return user.id
+
+
+def budget(plants: int, notes: int, include_notes: bool, slack: int = 10) -> dict:
+    """What the dashboard may cost: one row per group, per plant, per distinct catalog
+    plant and per note (when asked for), with a little slack; three statements (groups,
+    their plants, the catalog plants) and one more for the notes."""
+    notes = notes if include_notes else 0
+    rows = GROUPS + plants + min(plants, CATALOG_SIZE) + slack
+    return {
+        "queries": 3 + include_notes,
+        "rows": rows + plants * notes,
+        "bytes": rows * FETCHED_BYTES_PER_ROW + plants * notes * FETCHED_BYTES_PER_NOTE,
+        "response_bytes": plants * (RESPONSE_BYTES_PER_PLANT + notes * RESPONSE_BYTES_PER_NOTE),
+    }
+
+
+def measure(engine, load):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    plant_cache.invalidate()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with sessionmaker(bind=engine)() as db:
+            load(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    rows = size = 0
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            for row in conn.exec_driver_sql(statement, parameters).fetchall():
+                rows += 1
+                size += sum(len(str(value)) for value in row if value is not None)
+    return {"queries": len(statements), "rows": rows, "bytes": size}
+
+
+def measure_route(client, user_id: int, username: str, include_notes: bool) -> dict:
+    """Statements and body size of GET /api/userplants/, as served by the app."""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    headers = {"Authorization": f"Bearer {create_access_token({'username': username, 'id': user_id})}"}
+    plant_cache.invalidate()
+    event.listen(app_engine, "before_cursor_execute", count)
+    try:
+        response = client.get("/api/userplants/", headers=headers, params={"include_notes": include_notes})
+    finally:
+        event.remove(app_engine, "before_cursor_execute", count)
+    response.raise_for_status()
+    return {"statements": len(statements), "response_bytes": len(response.content)}
+
+
+def route_statement_budget() -> int:
+    # As declared on the route with query_budget().
+    route = next(route for route in app.routes
+                 if isinstance(route, APIRoute) and route.path == "/api/userplants/" and "GET" in route.methods)
+    return route_budget(route).max_queries
+
+
+def over_budget(results: dict, plants: int, notes: int, slack: int) -> list[str]:
+    found = []
+    for suffix, include_notes in (("", False), ("_with_notes", True)):
+        limits = {**budget(plants, notes, include_notes, slack), "statements": route_statement_budget()}
+        for name in ("dashboard" + suffix, "route" + suffix):
+            found += [f"{name}: {key} {value}, budget {limits[key]}" for key, value in results[name].items() if value > limits[key]]
+    return found
+
+
+def main(args):
+    engine = create_engine(settings.DB_URL)
+    models.Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        user_id = seed(db, args.plants, args.notes)
+        username = db.get(models.User, user_id).username
+
+    def joined_everything(db):
+        plants = joinedload(models.UserGroup.plants)
+        db.query(models.UserGroup) \
+            .options(plants.joinedload(models.UserPlant.plant_data), plants.joinedload(models.UserPlant.note_data)) \
+            .filter(models.UserGroup.user_id == user_id) \
+            .all()
+
+    client = TestClient(app)
+    results = {
+        "plants": args.plants,
+        "notes_per_plant": args.notes,
+        "joined": measure(engine, joined_everything),
+        "dashboard": measure(engine, lambda db: crud.get_dashboard(db, user_id)),
+        "dashboard_with_notes": measure(engine, lambda db: crud.get_dashboard(db, user_id, include_notes=True)),
+        "route": measure_route(client, user_id, username, include_notes=False),
+        "route_with_notes": measure_route(client, user_id, username, include_notes=True),
+        "budget": budget(args.plants, args.notes, False, args.slack),
+        "budget_with_notes": budget(args.plants, args.notes, True, args.slack),
+    }
+    print(json.dumps(results, indent=2))
+    failures = over_budget(results, args.plants, args.notes, args.slack)
+    if failures:
+        sys.exit("dashboard over budget: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=200)
+    parser.add_argument("--notes", type=int, default=20)
+    parser.add_argument("--slack", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,153 @@
+"""Seeded synthetic data: a plant catalog and users with groups, plants, notes and waterings.
+
+    python -m benchmarks.datagen --users 100 --plants-per-user 50 --notes-per-plant 3 --catalog 2000
+
+Writes to the database in DB_URL (SQLite by default, see benchmarks/__init__.py; point
+it at a local Postgres to benchmark that). The same arguments and --seed give the same
+rows. --reset drops and recreates every table first, so ids come out the same too; without
+it the rows are added next to whatever is there. Rows go in with multi-row INSERTs in
+chunks, so a large dataset takes seconds rather than minutes.
+"""
+import argparse
+import datetime
+import json
+import random
+from types import SimpleNamespace
+
+from sqlalchemy import insert, select
+
+from api import models, schemas
+from api.auth import controller
+from api.database import SessionLocal, engine
+
+CHUNK = 5000
+GENERA = ["Ficus", "Monstera", "Philodendron", "Calathea", "Peperomia", "Begonia", "Aloe", "Echeveria",
+          "Pilea", "Hoya", "Dracaena", "Sansevieria", "Anthurium", "Alocasia", "Tradescantia", "Crassula"]
+EPITHETS = ["lyrata", "deliciosa", "elastica", "orbifolia", "obtusifolia", "maculata", "vera", "elegans",
+            "peperomioides", "carnosa", "marginata", "trifasciata", "andraeanum", "zebrina", "ovata", "argentea"]
+COMMON = ["fig", "fern", "palm", "ivy", "lily", "orchid", "cactus", "pothos", "jade", "violet", "prayer plant", "snake plant"]
+ROOMS = ["Living room", "Kitchen", "Bedroom", "Balcony", "Office", "Bathroom", "Hallway", "Greenhouse"]
+NOTES = ["Repotted into a bigger pot.", "New leaf unfurling.", "Moved away from the window.", "Some yellow leaves, watering less.",
+         "Fertilised.", "Checked for pests, all clear.", "Rotated a quarter turn.", "Pruned the leggy stems."]
+
+
+def _insert(db, model, rows: list):
+    for start in range(0, len(rows), CHUNK):
+        db.execute(insert(model), rows[start:start + CHUNK])
+
+
+def catalog_rows(count: int, rng: random.Random, now: datetime.datetime, prefix: str) -> list:
+    rows = []
+    for i in range(count):
+        genus, epithet = rng.choice(GENERA), rng.choice(EPITHETS)
+        rows.append({
+            "name": f"{rng.choice(COMMON).title()} {genus} {i}",
+            # Unique, as plants are upserted on it.
+            "scientific_name": f"{genus} {epithet} '{prefix}-{i}'",
+            "type": rng.choice(list(schemas.PlantType)),
+            "watering_freq": rng.randint(1, 4),
+            "watering_period": rng.choice([schemas.WateringFrequencyPeriodType.DAY, schemas.WateringFrequencyPeriodType.WEEK]),
+            "watering_time": rng.choice(list(schemas.WateringTimeType)),
+            "sun_requirement": rng.choice(list(schemas.SunRequirementType)),
+            "created_at": now,
+        })
+    return rows
+
+
+def generate(users: int = 100, groups_per_user: int = 3, plants_per_user: int = 50, notes_per_plant: int = 2,
+             waterings_per_plant: int = 2, catalog: int = 1000, seed: int = 1, password: str = "bench-password",
+             prefix: str = "bench", reset: bool = False) -> SimpleNamespace:
+    """Returns the generated ids: ``users`` as (id, username) pairs, ``catalog`` as
+    {plant id: scientific_name}, and per user id their ``groups`` and ``plants``."""
+    rng = random.Random(seed)
+    now = datetime.datetime(2026, 1, 1)
+    if reset:
+        models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    # One bcrypt hash shared by every user; hashing each would dominate the run.
+    hashed_password = controller.get_hashed_password(password)
+    with SessionLocal() as db:
+        _insert(db, models.Plant, catalog_rows(catalog, rng, now, prefix))
+        catalog_plants = dict(db.execute(
+            select(models.Plant.id, models.Plant.scientific_name)
+            .where(models.Plant.scientific_name.like(f"%'{prefix}-%'"))
+            .order_by(models.Plant.id)
+        ).all())
+        catalog_ids = list(catalog_plants)
+
+        usernames = [f"{prefix}-user-{i:06d}" for i in range(users)]
+        _insert(db, models.User, [
+            {"username": username, "hashed_password": hashed_password, "admin": i == 0, "created_at": now}
+            for i, username in enumerate(usernames)
+        ])
+        user_ids = dict(db.execute(select(models.User.username, models.User.id).where(models.User.username.in_(usernames))).all())
+        user_rows = [(user_ids[username], username) for username in usernames]
+
+        _insert(db, models.UserGroup, [
+            {"user_id": user_id, "is_default": g == 0, "name": "" if g == 0 else ROOMS[(g - 1) % len(ROOMS)], "created_at": now}
+            for user_id, _ in user_rows for g in range(max(1, groups_per_user))
+        ])
+        groups = {}
+        for group_id, user_id in db.execute(
+                select(models.UserGroup.id, models.UserGroup.user_id).where(models.UserGroup.user_id.in_(user_ids.values()))
+                .order_by(models.UserGroup.id)):
+            groups.setdefault(user_id, []).append(group_id)
+
+        _insert(db, models.UserPlant, [
+            {"user_id": user_id, "plant_id": rng.choice(catalog_ids), "user_group_id": rng.choice(groups[user_id]),
+             "nickname": f"Plant {p}", "count": rng.randint(1, 3), "order": p + 1,
+             "created_at": now - datetime.timedelta(days=rng.randint(0, 365)),
+             "last_watered": now - datetime.timedelta(hours=rng.randint(0, 24 * 14))}
+            for user_id, _ in user_rows for p in range(plants_per_user)
+        ])
+        plants = {}
+        for plant_id, user_id in db.execute(
+                select(models.UserPlant.id, models.UserPlant.user_id).where(models.UserPlant.user_id.in_(user_ids.values()))
+                .order_by(models.UserPlant.id)):
+            plants.setdefault(user_id, []).append(plant_id)
+
+        _insert(db, models.UserPlantNotes, [
+            {"user_id": user_id, "user_plant_id": plant_id, "note": rng.choice(NOTES),
+             "created_at": now - datetime.timedelta(hours=rng.randint(0, 24 * 365))}
+            for user_id, plant_ids in plants.items() for plant_id in plant_ids for _ in range(notes_per_plant)
+        ])
+        _insert(db, models.WateringEvent, [
+            {"user_id": user_id, "user_plant_id": plant_id, "watered_at": now - datetime.timedelta(hours=rng.randint(0, 24 * 60))}
+            for user_id, plant_ids in plants.items() for plant_id in plant_ids for _ in range(waterings_per_plant)
+        ])
+        db.commit()
+    return SimpleNamespace(users=user_rows, password=password, catalog=catalog_plants, groups=groups, plants=plants)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--groups-per-user", type=int, default=3)
+    parser.add_argument("--plants-per-user", type=int, default=50)
+    parser.add_argument("--notes-per-plant", type=int, default=2)
+    parser.add_argument("--waterings-per-plant", type=int, default=2)
+    parser.add_argument("--catalog", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--prefix", default="bench")
+
+
+def from_arguments(args, reset: bool) -> SimpleNamespace:
+    return generate(users=args.users, groups_per_user=args.groups_per_user, plants_per_user=args.plants_per_user,
+                    notes_per_plant=args.notes_per_plant, waterings_per_plant=args.waterings_per_plant,
+                    catalog=args.catalog, seed=args.seed, password=args.password, prefix=args.prefix, reset=reset)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument("--reset", action="store_true")
+    args = parser.parse_args()
+    data = from_arguments(args, args.reset)
+    print(json.dumps({
+        "database": engine.url.render_as_string(hide_password=True),
+        "users": len(data.users),
+        "catalog_plants": len(data.catalog),
+        "user_plants": sum(map(len, data.plants.values())),
+        "first_user": data.users[0][1] if data.users else None,
+        "password": data.password,
+    }, indent=2))
@@ -0,0 +1,175 @@
+"""Photo uploads: chunked upload throughput, variant rendering and dashboard bytes.
+
+    python -m benchmarks.images --users 5 --photos 40 --concurrency 4
+
+Fills the database with benchmarks.datagen, then runs the app in-process over ASGI:
+
+- upload: --photos seeded, photo-like JPEGs (--width by 3/4 of it) are uploaded to
+  random plants, --concurrency at a time, each body streamed in --chunk-size pieces.
+  --duplicates of the uploads reuse an earlier photo, which storage keeps once. Reports
+  MB/s, latency percentiles and how many uploads reused a photo;
+- render: how long the process pool takes to render every thumbnail and preview after
+  the last upload has been answered;
+- dashboard: every user's dashboard with each photo loaded as the original (what
+  image_path gives) and as a thumbnail (thumbnail_path), and the bytes saved;
+- checks: a Range request answered with 206 and the matching bytes, and a repeated
+  thumbnail request answered with 304;
+- storage: files and bytes added under IMAGE_STORAGE_DIR against bytes uploaded.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import time
+
+import httpx
+import numpy
+from PIL import Image
+
+from api import images, settings
+from api.main import app
+from benchmarks import datagen
+
+
+def photo(rng: numpy.random.Generator, width: int, quality: int = 90) -> bytes:
+    # Smooth colour fields with grain: compresses about like a photo, unlike pure noise.
+    height = width * 3 // 4
+    fields = rng.integers(0, 256, (height // 32 + 1, width // 32 + 1, 3), dtype=numpy.uint8)
+    image = Image.fromarray(fields).resize((width, height), Image.Resampling.BICUBIC)
+    grain = rng.normal(0, 6, (height, width, 3))
+    pixels = numpy.clip(numpy.asarray(image, dtype=numpy.float64) + grain, 0, 255).astype(numpy.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def storage_usage() -> tuple[int, int]:
+    files = size = 0
+    for root, _, names in os.walk(settings.IMAGE_STORAGE_DIR):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+async def chunked(body: bytes, chunk_size: int):
+    for start in range(0, len(body), chunk_size):
+        yield body[start:start + chunk_size]
+
+
+async def upload(client, sessions: list, photos: list, args):
+    rng = random.Random(args.seed)
+    jobs = []
+    for i in range(args.photos):
+        user_id, headers, plant_ids = rng.choice(sessions)
+        body = photos[rng.randrange(i)] if i and rng.random() < args.duplicates else photos[i]
+        jobs.append((headers, rng.choice(plant_ids), body))
+    queue = iter(jobs)
+    samples, uploaded = [], 0
+
+    async def worker():
+        nonlocal uploaded
+        for headers, plant_id, body in queue:
+            start = time.perf_counter()
+            response = await client.post(f"/api/userplants/{plant_id}/image/", headers=headers, content=chunked(body, args.chunk_size))
+            samples.append(time.perf_counter() - start)
+            response.raise_for_status()
+            uploaded += len(body)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    seconds = time.perf_counter() - start
+    return {
+        "uploads": len(jobs),
+        "deduplicated": len(jobs) - len({body for _, _, body in jobs}),
+        "megabytes": round(uploaded / 1e6, 2),
+        "seconds": round(seconds, 2),
+        "megabytes_per_second": round(uploaded / 1e6 / seconds, 2),
+        **percentiles(samples),
+    }, uploaded
+
+
+async def dashboard(client, sessions: list):
+    original = thumbnail = photos = 0
+    for _, headers, _ in sessions:
+        groups = (await client.get("/api/userplants/", headers=headers)).json()
+        for plant in (plant for group in groups for plant in group["plants"]):
+            if plant["thumbnail_path"] is None:
+                continue
+            photos += 1
+            original += len((await client.get(plant["image_path"], headers=headers)).content)
+            thumbnail += len((await client.get(plant["thumbnail_path"], headers=headers)).content)
+    return {
+        "photos_shown": photos,
+        "original_bytes": original,
+        "thumbnail_bytes": thumbnail,
+        "bytes_saved": original - thumbnail,
+        "saved_percent": round(100 * (1 - thumbnail / original), 1) if original else None,
+    }
+
+
+async def checks(client, sessions: list):
+    for _, headers, _ in sessions:
+        for group in (await client.get("/api/userplants/", headers=headers)).json():
+            for plant in group["plants"]:
+                if plant["thumbnail_path"] is None:
+                    continue
+                whole = (await client.get(plant["image_path"], headers=headers)).content
+                ranged = await client.get(plant["image_path"], headers={**headers, "Range": "bytes=100-1123"})
+                first = await client.get(plant["thumbnail_path"], headers=headers)
+                again = await client.get(plant["thumbnail_path"], headers={**headers, "If-None-Match": first.headers["etag"]})
+                return {
+                    "range_status": ranged.status_code,
+                    "range_content_range": ranged.headers.get("content-range"),
+                    "range_bytes_match": ranged.content == whole[100:1124],
+                    "revalidated_status": again.status_code,
+                }
+    return {}
+
+
+async def main(args):
+    data = datagen.generate(users=args.users, plants_per_user=args.plants_per_user, catalog=args.catalog, reset=True)
+    rng = numpy.random.default_rng(args.seed)
+    photos = [photo(rng, args.width) for _ in range(args.photos)]
+    files_before, bytes_before = storage_usage()
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        sessions = []
+        for user_id, username in data.users:
+            response = await client.post("/api/auth/login/", data={"username": username, "password": data.password})
+            response.raise_for_status()
+            sessions.append((user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}, list(data.plants[user_id])))
+        result = {"config": {"db_async": settings.DB_ASYNC, "image_workers": settings.IMAGE_WORKERS, "photos": args.photos,
+                             "width": args.width, "chunk_size": args.chunk_size, "concurrency": args.concurrency}}
+        result["upload"], uploaded = await upload(client, sessions, photos, args)
+        start = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, images.renderer.wait)
+        result["render_seconds_after_last_upload"] = round(time.perf_counter() - start, 2)
+        result["dashboard"] = await dashboard(client, sessions)
+        result["checks"] = await checks(client, sessions)
+    files_after, bytes_after = storage_usage()
+    result["storage"] = {"files_added": files_after - files_before, "bytes_added": bytes_after - bytes_before, "bytes_uploaded": uploaded}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--plants-per-user", type=int, default=20)
+    parser.add_argument("--catalog", type=int, default=200)
+    parser.add_argument("--photos", type=int, default=40)
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--duplicates", type=float, default=0.25)
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,297 @@
+"""Mixed load across every router, for comparing commits.
+
+    python -m benchmarks.load --users 50 --concurrency 10 --requests 3000 --output load.json
+
+Resets the database in DB_URL and fills it with benchmarks.datagen (same arguments, same
+data), logs every user in, then runs the app in-process over ASGI (with its lifespan,
+so background writers run as in production) while --concurrency clients send
+--requests requests drawn from a weighted, seeded mix covering every route under
+api/routers. Reports per route and overall: latency percentiles, throughput, error
+counts and SQL statements per request, as JSON on stdout and in --output. Routes the
+mix does not cover are listed under "uncovered_routes", so a new route without a
+scenario shows up, and since benchmarks run with QUERY_BUDGET_MODE=raise a route going
+over its query budget shows up as 500s. Diff two outputs to see what a change did:
+
+    git checkout main && python -m benchmarks.load --output before.json
+    git checkout my-branch && python -m benchmarks.load --output after.json
+"""
+import os
+
+# The closed-loop clients keep the worker saturated by design, and admission control
+# would shed some of that as 503s; benchmarks.overload measures it instead.
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+import argparse
+import asyncio
+import contextvars
+import json
+import random
+import statistics
+import subprocess
+import time
+from types import SimpleNamespace
+
+import httpx
+import numpy
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from api import settings
+from api.database import async_engine, engine
+from api.main import app
+from benchmarks import datagen
+from benchmarks.images import photo
+
+_queries: contextvars.ContextVar = contextvars.ContextVar("queries", default=None)
+
+
+def _count_query(*args):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(samples[-1] * 1000, 2)}
+
+
+class Session:
+    """One logged-in user and the ids they can use."""
+
+    def __init__(self, user_id: int, username: str, tokens: dict, groups: list, plants: list):
+        self.user_id = user_id
+        self.username = username
+        self.headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        self.refresh_token = tokens["refresh_token"]
+        self.groups = groups
+        self.plants = plants
+        self.created = []  # user plants created during the run, the only ones deleted
+        self.with_image = []  # user plants given a photo during the run
+
+
+def scenarios(data: SimpleNamespace):
+    """(weight, method, route path, build) for each request kind. build(session, rng)
+    returns the httpx request arguments and a callback for the response, or None when
+    the request cannot be made right now."""
+    catalog_ids = list(data.catalog)
+    counter = iter(range(10 ** 9))
+    invites = []
+    photos = [photo(numpy.random.default_rng(i), 640) for i in range(8)]
+
+    def plant(session, rng):
+        return rng.choice(session.plants)
+
+    def words(rng):
+        return data.catalog[rng.choice(catalog_ids)].split()[rng.randint(0, 1)][:rng.randint(3, 8)]
+
+    def keep(items):
+        return lambda response: items.append(response.json()["id"])
+
+    def invited(response):
+        invites.append((response.json()["username"], response.json()["invite_code"]))
+
+    def register(session, rng):
+        if not invites:
+            return None
+        username, code = invites.pop()
+        return {"json": {"username": username, "invite_code": code, "password": data.password}}, None
+
+    def delete(session, rng):
+        if not session.created:
+            return None
+        plant_id = session.created.pop()
+        return {"url": f"/api/userplants/{plant_id}/delete/"}, None
+
+    def batch(session, rng):
+        operations = [{"op": "create", "plant_id": rng.choice(catalog_ids)} for _ in range(3)]
+        operations.append({"op": "move", "id": plant(session, rng), "user_group_id": rng.choice(session.groups)})
+        operations.append({"op": "reorder", "ids": rng.sample(session.plants, min(3, len(session.plants)))})
+        return {"json": {"operations": operations}}, lambda response: session.created.extend(response.json()["created_ids"])
+
+    def upload_image(session, rng):
+        plant_id = plant(session, rng)
+        return {"url": f"/api/userplants/{plant_id}/image/", "content": rng.choice(photos), "headers": {"Content-Type": "image/jpeg"}}, \
+            lambda response: session.with_image.append(plant_id)
+
+    def get_image(session, rng):
+        if not session.with_image:
+            return None
+        return {"url": f"/api/userplants/{rng.choice(session.with_image)}/image/", "params": {"size": rng.choice(["thumbnail", "thumbnail", "preview", "original"])}}, None
+
+    def import_body(rng):
+        lines = []
+        for plant_id in rng.sample(catalog_ids, min(20, len(catalog_ids))):
+            lines.append(json.dumps({"name": f"Imported {plant_id}", "scientific_name": data.catalog[plant_id]}))
+        return ("\n".join(lines) + "\n").encode()
+
+    return [
+        (1, "POST", "/api/auth/login/", lambda s, r: ({"data": {"username": s.username, "password": data.password}, "auth": False}, None)),
+        (1, "GET", "/api/auth/refresh/", lambda s, r: ({"params": {"token": s.refresh_token}}, None)),
+        (2, "GET", "/api/users/", lambda s, r: ({"params": {"limit": 50}}, None)),
+        (2, "GET", "/api/users/me/", lambda s, r: ({}, None)),
+        (1, "POST", "/api/users/me/changepassword/", lambda s, r: ({"json": {"oldPassword": data.password, "newPassword": data.password}}, None)),
+        (1, "POST", "/api/users/invite/", lambda s, r: ({"json": {"username": f"invited-{next(counter)}"}}, invited)),
+        (1, "GET", "/api/users/invites/", lambda s, r: ({"params": {"limit": 50}}, None)),
+        (2, "GET", "/api/users/{user_id}/", lambda s, r: ({"url": f"/api/users/{r.choice(data.users)[0]}/"}, None)),
+        (1, "POST", "/api/users/register/", register),
+        (1, "POST", "/api/plants/create/", lambda s, r: ({"json": {"name": "Load plant", "scientific_name": f"Planta onerosa {next(counter)}"}}, None)),
+        (1, "POST", "/api/plants/update/", lambda s, r: (lambda plant_id: ({"json": {"id": plant_id, "name": f"Updated {plant_id}", "scientific_name": data.catalog[plant_id]}}, None))(r.choice(catalog_ids))),
+        (1, "POST", "/api/plants/import/", lambda s, r: ({"content": import_body(r), "headers": {"Content-Type": "application/x-ndjson"}}, None)),
+        (1, "GET", "/api/plants/export/", lambda s, r: ({}, None)),
+        (8, "GET", "/api/plants/", lambda s, r: ({"params": {"limit": 100}}, None)),
+        (6, "GET", "/api/plants/search/", lambda s, r: ({"params": {"q": words(r)}}, None)),
+        (6, "GET", "/api/plants/{plant_id}/", lambda s, r: ({"url": f"/api/plants/{r.choice(catalog_ids)}/"}, None)),
+        (3, "POST", "/api/userplants/create/", lambda s, r: ({"json": {"plant_id": r.choice(catalog_ids), "image_path": None}}, keep(s.created))),
+        (2, "POST", "/api/userplants/batch/", batch),
+        (1, "GET", "/api/userplants/graveyard/", lambda s, r: ({}, None)),
+        (3, "GET", "/api/userplants/due/", lambda s, r: ({}, None)),
+        (1, "GET", "/api/userplants/export/", lambda s, r: ({}, None)),
+        (3, "POST", "/api/userplants/{plant_id:int}/update/", lambda s, r: ({"url": f"/api/userplants/{plant(s, r)}/update/", "json": {"nickname": f"Renamed {next(counter)}"}}, None)),
+        (20, "GET", "/api/userplants/", lambda s, r: ({"params": {"include_notes": r.random() < 0.2}}, None)),
+        (5, "GET", "/api/userplants/{plant_id:int}/", lambda s, r: ({"url": f"/api/userplants/{plant(s, r)}/"}, None)),
+        (5, "POST", "/api/userplants/water/", lambda s, r: ({"json": {"plant_ids": r.sample(s.plants, min(3, len(s.plants)))}}, None)),
+        (3, "GET", "/api/userplants/{plant_id:int}/waterings/", lambda s, r: ({"url": f"/api/userplants/{plant(s, r)}/waterings/"}, None)),
+        (1, "POST", "/api/userplants/{plant_id:int}/image/", upload_image),
+        (4, "GET", "/api/userplants/{plant_id:int}/image/", get_image),
+        (3, "POST", "/api/userplants/{plant_id}/notes/", lambda s, r: ({"url": f"/api/userplants/{plant(s, r)}/notes/", "json": {"note": "Load test note."}}, None)),
+        (3, "GET", "/api/userplants/notes/search/", lambda s, r: ({"params": {"q": r.choice(r.choice(datagen.NOTES).split())}}, None)),
+        (5, "GET", "/api/userplants/{plant_id}/notes/", lambda s, r: ({"url": f"/api/userplants/{plant(s, r)}/notes/"}, None)),
+        (1, "DELETE", "/api/userplants/{plant_id}/delete/", delete),
+        (1, "POST", "/api/usergroups/create/", lambda s, r: ({"json": {"name": f"Room {next(counter)}", "is_default": False}}, keep(s.groups))),
+        (1, "POST", "/api/usergroups/{group_id}/update/", lambda s, r: ({"url": f"/api/usergroups/{r.choice(s.groups)}/update/", "json": {"name": f"Room {next(counter)}"}}, None)),
+        (1, "GET", "/metrics", lambda s, r: ({"auth": False}, None)),
+        (1, "GET", "/healthz", lambda s, r: ({"auth": False}, None)),
+    ]
+
+
+def uncovered(mix: list) -> list:
+    covered = {(method, path) for _, method, path, _ in mix}
+    routes = {(method, route.path) for route in app.routes if isinstance(route, APIRoute) for method in route.methods}
+    return sorted(f"{method} {path}" for method, path in routes - covered)
+
+
+async def login(client, username: str, password: str) -> dict:
+    response = await client.post("/api/auth/login/", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()
+
+
+async def run(client, sessions: list, mix: list, requests: int, concurrency: int, seed: int):
+    weights = [weight for weight, *_ in mix]
+    results = {f"{method} {path}": {"samples": [], "queries": 0, "statuses": {}} for _, method, path, _ in mix}
+    remaining = iter(range(requests))
+
+    async def worker(n: int):
+        rng = random.Random(seed * 1000 + n)
+        for _ in remaining:
+            while True:
+                session = rng.choice(sessions)
+                _, method, path, build = rng.choices(mix, weights)[0]
+                request = build(session, rng)
+                if request is not None:
+                    break
+            kwargs, on_response = request
+            url = kwargs.pop("url", path)
+            headers = {**(session.headers if kwargs.pop("auth", True) else {}), **kwargs.pop("headers", {})}
+            counter = [0]
+            token = _queries.set(counter)
+            try:
+                start = time.perf_counter()
+                response = await client.request(method, url, headers=headers, **kwargs)
+                elapsed = time.perf_counter() - start
+            finally:
+                _queries.reset(token)
+            result = results[f"{method} {path}"]
+            result["samples"].append(elapsed)
+            result["queries"] += counter[0]
+            result["statuses"][response.status_code] = result["statuses"].get(response.status_code, 0) + 1
+            if response.is_success and on_response is not None:
+                on_response(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def report(results: dict, seconds: float) -> dict:
+    routes, samples, queries = {}, [], 0
+    for name, result in sorted(results.items()):
+        if not result["samples"]:
+            continue
+        count = len(result["samples"])
+        routes[name] = {
+            "requests": count,
+            "errors": sum(n for code, n in result["statuses"].items() if code >= 400),
+            "statuses": {str(code): n for code, n in sorted(result["statuses"].items())},
+            "queries_per_request": round(result["queries"] / count, 2),
+            "mean_ms": round(statistics.fmean(result["samples"]) * 1000, 2),
+            **percentiles(result["samples"]),
+        }
+        samples += result["samples"]
+        queries += result["queries"]
+    overall = {
+        "requests": len(samples),
+        "seconds": round(seconds, 2),
+        "throughput_rps": round(len(samples) / seconds, 1),
+        "errors": sum(route["errors"] for route in routes.values()),
+        "queries_per_request": round(queries / len(samples), 2),
+        **percentiles(samples),
+    }
+    return {"overall": overall, "routes": routes}
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    data = datagen.from_arguments(args, reset=True)
+    mix = scenarios(data)
+    for bind in (engine, async_engine.sync_engine if async_engine is not None else None):
+        if bind is not None:
+            event.listen(bind, "before_cursor_execute", _count_query)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # One at a time: the password pool turns away logins beyond its queue.
+        tokens = [await login(client, username, data.password) for _, username in data.users]
+        sessions = [
+            Session(user_id, username, user_tokens, list(data.groups[user_id]), list(data.plants[user_id]))
+            for (user_id, username), user_tokens in zip(data.users, tokens)
+        ]
+        if args.warmup:
+            await run(client, sessions, mix, args.warmup, args.concurrency, args.seed + 1)
+        results, seconds = await run(client, sessions, mix, args.requests, args.concurrency, args.seed)
+
+    output = {
+        "commit": commit(),
+        "config": {
+            "database": engine.dialect.name, "db_async": settings.DB_ASYNC, "users": args.users,
+            "plants_per_user": args.plants_per_user, "notes_per_plant": args.notes_per_plant, "catalog": args.catalog,
+            "concurrency": args.concurrency, "requests": args.requests, "warmup": args.warmup, "seed": args.seed,
+        },
+        **report(results, seconds),
+        "uncovered_routes": uncovered(mix),
+    }
+    text = json.dumps(output, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    datagen.add_arguments(parser)
+    parser.set_defaults(users=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--output")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""Dashboard latency during a login storm.
+
+    python -m benchmarks.login_storm --logins 200 --concurrency 50
+
+Drives the app in-process over ASGI. One client polls the dashboard back to back while
+``concurrency`` clients keep logging in, first with bcrypt on the worker pool and then
+with bcrypt run inline on the event loop (how login used to behave). Reports dashboard
+latency percentiles for a quiet baseline and for both storms, plus login outcomes.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import statistics
+import time
+
+import httpx
+
+from api import models
+from api.auth import controller
+from api.database import SessionLocal, engine
+from api.main import app
+
+
+class InlinePool:
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+def seed(username: str, password: str):
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = db.query(models.User).filter(models.User.username == username).first()
+        if user is None:
+            now = datetime.datetime.utcnow()
+            user = models.User(username=username, hashed_password=controller.get_hashed_password(password), created_at=now, admin=False)
+            db.add(user)
+            db.flush()
+            db.add(models.UserGroup(user_id=user.id, is_default=True, name="", created_at=now))
+            db.commit()
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+    return {"count": len(samples), "p50_ms": pick(0.5), "p99_ms": pick(0.99), "max_ms": round(samples[-1] * 1000, 2)}
+
+
+async def poll_dashboard(client: httpx.AsyncClient, token: str, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/userplants/", headers={"Authorization": f"Bearer {token}"})
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+
+
+async def storm(client: httpx.AsyncClient, args, outcomes: dict):
+    remaining = iter(range(args.logins))
+
+    async def login_loop():
+        for _ in remaining:
+            response = await client.post("/api/auth/login/", data={"username": args.username, "password": args.password})
+            outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+
+    await asyncio.gather(*(login_loop() for _ in range(args.concurrency)))
+
+
+async def scenario(client, token, args, pool=None, quiet_seconds=None):
+    samples, outcomes, stop = [], {}, asyncio.Event()
+    original = controller.password_pool
+    if pool is not None:
+        controller.password_pool = pool
+    poller = asyncio.create_task(poll_dashboard(client, token, stop, samples))
+    start = time.perf_counter()
+    try:
+        if quiet_seconds is None:
+            await storm(client, args, outcomes)
+        else:
+            await asyncio.sleep(quiet_seconds)
+    finally:
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await poller
+        controller.password_pool = original
+    result = {"seconds": round(elapsed, 2), "dashboard": percentiles(samples)}
+    if outcomes:
+        result["logins"] = {str(code): count for code, count in sorted(outcomes.items())}
+    return result
+
+
+async def main(args):
+    seed(args.username, args.password)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/api/auth/login/", data={"username": args.username, "password": args.password})
+        token = response.json()["access_token"]
+        results = {
+            "quiet": await scenario(client, token, args, quiet_seconds=2),
+            "storm_worker_pool": await scenario(client, token, args),
+            "storm_inline": await scenario(client, token, args, pool=InlinePool()),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--username", default="storm")
+    parser.add_argument("--password", default="storm-password")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,177 @@
+"""Note search latency for a user with a very large number of notes.
+
+    python -m benchmarks.note_search --notes 100000 --queries 2000
+
+Writes --notes generated notes for one user into DB_URL (reset first), then runs
+crud.search_user_plant_notes as the route does, one session per search:
+
+- cold: the first search, which reads every note into the user's index;
+- search: --queries warm searches over a mix of common words, rare words, prefixes and
+  two-word queries, with the statements each one ran (the catch-up query and the
+  page's notes);
+- pages: walking --pages pages of a common word with next_cursor;
+- incremental: a note written through crud.create_user_plant_note and found by the
+  next search;
+- like_scan: the same rare-word queries as ``note LIKE '%word%'`` over the user's notes,
+  what finding a note took without the index.
+
+Exits non-zero when warm p99 latency is over --budget-ms, so it can gate CI.
+"""
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+
+from sqlalchemy import event, insert, select
+
+from api import crud, models, schemas
+from api.database import SessionLocal, engine
+from api.note_search import note_search
+from api.search import normalize
+from benchmarks.search import word
+
+PHRASES = ["Repotted into a bigger pot", "New leaf unfurling", "Moved away from the window", "Some yellow leaves",
+           "watering less", "Fertilised with half strength feed", "Checked for pests, all clear", "Rotated a quarter turn",
+           "Pruned the leggy stems", "Roots coming out of the drainage holes", "Misted the leaves", "Brown tips on the fronds",
+           "Took cuttings for propagation", "Flowering at last", "Wiped the dust off the leaves", "Soil still damp"]
+
+
+def notes(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    # Rare words: place names, products and the like, a few notes each.
+    rare = [word(rng, rng.randint(2, 4)) for _ in range(max(1, count // 5))]
+    for _ in range(count):
+        parts = rng.sample(PHRASES, rng.randint(1, 3)) + [rng.choice(rare) for _ in range(rng.randint(0, 2))]
+        yield ". ".join(parts) + "."
+
+
+def seed(count: int) -> tuple[int, list[int], list[str]]:
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        user = models.User(username="noter", hashed_password="x", created_at=now, admin=False)
+        plant = models.Plant(name="Noted plant", scientific_name="Planta notata", created_at=now)
+        db.add_all([user, plant])
+        db.flush()
+        group = models.UserGroup(user_id=user.id, is_default=True, name="", created_at=now)
+        db.add(group)
+        db.flush()
+        user_plants = [models.UserPlant(user_id=user.id, plant_id=plant.id, user_group_id=group.id, count=1, order=i + 1, created_at=now)
+                       for i in range(100)]
+        db.add_all(user_plants)
+        db.flush()
+        texts = list(notes(count))
+        rows = [{"user_id": user.id, "user_plant_id": user_plants[i % 100].id, "note": text,
+                 "created_at": now - datetime.timedelta(minutes=i)} for i, text in enumerate(texts)]
+        for start in range(0, len(rows), 5000):
+            db.execute(insert(models.UserPlantNotes), rows[start:start + 5000])
+        db.commit()
+        return user.id, [up.id for up in user_plants], texts
+
+
+def queries(texts: list, count: int, seed: int = 2):
+    rng = random.Random(seed)
+    common = sorted({w for phrase in PHRASES for w in normalize(phrase) if len(w) > 3})
+    for _ in range(count):
+        kind = rng.choice(("common", "rare", "prefix", "two_words"))
+        if kind == "common":
+            yield kind, rng.choice(common)
+        elif kind == "rare":
+            yield kind, normalize(rng.choice(texts))[-1]
+        elif kind == "prefix":
+            term = rng.choice(common)
+            yield kind, term[:rng.randint(3, len(term))]
+        else:
+            yield kind, " ".join(rng.sample(common, 2))
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+    return {"count": len(samples), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+def timed_search(user_id: int, q: str, cursor: str = None, limit: int = 20):
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        page = crud.search_user_plant_notes(db, q, user_id, cursor, limit)
+        return page, time.perf_counter() - start
+
+
+def main(args):
+    user_id, user_plant_ids, texts = seed(args.notes)
+    note_search.invalidate()
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    _, cold = timed_search(user_id, "repotted")
+    statements = 0
+    samples, by_kind, found = [], {}, 0
+    for kind, q in queries(texts, args.queries):
+        page, elapsed = timed_search(user_id, q, limit=args.limit)
+        samples.append(elapsed)
+        by_kind.setdefault(kind, []).append(elapsed)
+        found += bool(page["items"])
+    sql_per_search = statements / args.queries
+
+    pages, cursor, seen = [], None, set()
+    for _ in range(args.pages):
+        page, elapsed = timed_search(user_id, "leaves", cursor, args.limit)
+        pages.append(elapsed)
+        seen.update(hit["id"] for hit in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        note = crud.create_user_plant_note(db, user_plant_ids[0], schemas.UserPlantNoteBase(note="Sprayed with zanzibarine today."), user_id)
+        write = time.perf_counter() - start
+    page, after_write = timed_search(user_id, "zanzibarine")
+    event.remove(engine, "before_cursor_execute", count)
+
+    like = []
+    rng = random.Random(3)
+    with SessionLocal() as db:
+        for _ in range(args.like_queries):
+            term = normalize(rng.choice(texts))[-1]
+            start = time.perf_counter()
+            db.execute(select(models.UserPlantNotes).where(models.UserPlantNotes.user_id == user_id)
+                       .where(models.UserPlantNotes.note.like(f"%{term}%"))
+                       .order_by(models.UserPlantNotes.created_at.desc()).limit(args.limit)).all()
+            like.append(time.perf_counter() - start)
+
+    overall = percentiles(samples)
+    print(json.dumps({
+        "database": engine.dialect.name,
+        "notes": args.notes,
+        "cold_search_seconds": round(cold, 3),
+        "queries_with_results": found,
+        "search": overall,
+        "search_by_kind": {kind: percentiles(values) for kind, values in sorted(by_kind.items())},
+        "sql_per_search": round(sql_per_search, 2),
+        "pages": {"walked": len(pages), "distinct_notes": len(seen), **percentiles(pages)},
+        "incremental": {"write_ms": round(write * 1000, 3), "found_by_next_search": [hit["id"] for hit in page["items"]] == [note.id],
+                        "search_ms": round(after_write * 1000, 3)},
+        "like_scan": percentiles(like),
+    }, indent=2))
+    if overall["p99_ms"] > args.budget_ms:
+        sys.exit(f"p99 note search latency {overall['p99_ms']}ms is over the {args.budget_ms}ms budget")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--like-queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    main(parser.parse_args())
@@ -0,0 +1,198 @@
+"""Overload: goodput with and without admission control when offered more than capacity.
+
+    python -m benchmarks.overload --overload 3 --seconds 20 --deadline 1
+
+Fills the database with benchmarks.datagen, then for ADMISSION_ENABLED=false and
+=true starts ``uvicorn api.main:app`` in a new process and logs every user in. First
+--concurrency closed-loop clients measure capacity: requests answered 200 per second
+by a worker that is never idle. Then requests arrive open-loop (Poisson, as users do,
+however slow the server gets) at --overload times the capacity of the run with
+admission control, for --seconds, from a mix of cheap reads, the dashboard, writes
+and collection exports. A client gives up after --deadline seconds, so a request only
+counts towards goodput when it is answered 200 within it. Reports per run the offered
+rate, goodput, statuses, latency of the 200s and how fast 503s came back, as JSON on
+stdout. Logins are left out: the password pool turns them away on its own.
+
+Exits non-zero when goodput with admission control is below --min-goodput of
+capacity, so it can gate CI.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import datagen
+from benchmarks.cold_start import free_port
+
+MIX = [
+    (40, "GET", lambda s, r: "/api/plants/?limit=20"),
+    (20, "GET", lambda s, r: "/api/userplants/due/"),
+    (15, "GET", lambda s, r: f"/api/userplants/{r.choice(s['plants'])}/"),
+    (15, "GET", lambda s, r: "/api/userplants/"),
+    (8, "POST", lambda s, r: "/api/userplants/water/"),
+    (2, "GET", lambda s, r: "/api/userplants/export/"),
+]
+
+
+def percentile_ms(samples: list, q: float):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1)
+
+
+def start_server(admission: bool) -> tuple:
+    port = free_port()
+    env = dict(os.environ, ADMISSION_ENABLED="true" if admission else "false")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning",
+                               "--backlog", "4096"], env=env)
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"The server exited with {server.returncode} before answering")
+            try:
+                if client.get("/healthz").status_code == 200:
+                    return server, port
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+
+
+def http_request(method: str, url: str, headers: dict, body: bytes = b"") -> bytes:
+    lines = [f"{method} {url} HTTP/1.1", "Host: 127.0.0.1", "Connection: close", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return "\r\n".join(lines).encode() + b"\r\n\r\n" + body
+
+
+async def send(port: int, sessions: list, rng: random.Random) -> str:
+    # A connection per request over plain asyncio streams: an HTTP client library
+    # costs the load generator more CPU than the requests cost the server, and on a
+    # shared machine that would be measuring the client.
+    _, method, path = rng.choices(MIX, weights=[weight for weight, _, _ in MIX])[0]
+    s = rng.choice(sessions)
+    if method == "POST":
+        body = json.dumps({"plant_ids": rng.sample(s["plants"], 3)}).encode()
+        raw = http_request(method, path(s, rng), {**s["headers"], "Content-Type": "application/json"}, body)
+    else:
+        raw = http_request(method, path(s, rng), s["headers"])
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(raw)
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Closed without a response")
+        status = status_line.split()[1].decode()
+        while await reader.read(65536):
+            pass
+        return status
+    finally:
+        writer.close()
+
+
+async def closed_loop(port: int, sessions: list, args) -> float:
+    ok, stop = 0, time.perf_counter() + args.capacity_seconds
+
+    async def worker(seed):
+        nonlocal ok
+        rng = random.Random(seed)
+        while time.perf_counter() < stop:
+            status = await send(port, sessions, rng)
+            ok += status == "200"
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(args.seed + i) for i in range(args.concurrency)))
+    return ok / (time.perf_counter() - start)
+
+
+async def open_loop(port: int, sessions: list, rate: float, args) -> dict:
+    rng = random.Random(args.seed)
+    results = []
+
+    async def one(seed):
+        start = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(send(port, sessions, random.Random(seed)), args.deadline)
+        except asyncio.TimeoutError:
+            status = "gave_up"
+        except OSError:
+            status = "connection_error"
+        results.append((status, time.perf_counter() - start))
+
+    tasks, start = [], time.perf_counter()
+    arrival = start
+    while arrival < start + args.seconds:
+        arrival += rng.expovariate(rate)
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        tasks.append(asyncio.create_task(one(rng.random())))
+    await asyncio.gather(*tasks)
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    good = [elapsed for status, elapsed in results if status == "200"]
+    shed = [elapsed for status, elapsed in results if status == "503"]
+    return {
+        "offered_rps": round(len(results) / args.seconds, 1),
+        "goodput_rps": round(len(good) / args.seconds, 1),
+        "statuses": statuses,
+        "ok_p50_ms": percentile_ms(good, 0.5),
+        "ok_p99_ms": percentile_ms(good, 0.99),
+        "rejected_p50_ms": percentile_ms(shed, 0.5),
+    }
+
+
+async def measure(args, data, admission: bool, rate: float = None) -> dict:
+    server, port = start_server(admission)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            sessions = []
+            for user_id, username in data.users:
+                response = await client.post("/api/auth/login/", data={"username": username, "password": data.password})
+                response.raise_for_status()
+                sessions.append({"plants": data.plants[user_id],
+                                 "headers": {"Authorization": f"Bearer {response.json()['access_token']}"}})
+        capacity = await closed_loop(port, sessions, args)
+        result = await open_loop(port, sessions, rate or capacity * args.overload, args)
+    finally:
+        # Not terminate: a worker left with a backlog would finish serving it first.
+        server.kill()
+        server.wait()
+    return {"capacity_rps": round(capacity, 1), **result}
+
+
+def main(args):
+    data = datagen.generate(users=args.users, plants_per_user=args.plants_per_user, catalog=args.catalog, reset=True)
+    admitted = asyncio.run(measure(args, data, admission=True))
+    rate = admitted["capacity_rps"] * args.overload
+    unlimited = asyncio.run(measure(args, data, admission=False, rate=rate))
+    capacity = admitted["capacity_rps"]
+    result = {
+        "overload": args.overload,
+        "deadline_seconds": args.deadline,
+        "admission": {**admitted, "goodput_of_capacity": round(admitted["goodput_rps"] / capacity, 2)},
+        "no_admission": {**unlimited, "goodput_of_capacity": round(unlimited["goodput_rps"] / capacity, 2)},
+    }
+    print(json.dumps(result, indent=2))
+    if admitted["goodput_rps"] < args.min_goodput * capacity:
+        sys.exit(f"Goodput with admission control was {admitted['goodput_rps']} rps, "
+                 f"under {args.min_goodput:.0%} of the {capacity} rps capacity")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--overload", type=float, default=3.0)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--deadline", type=float, default=1.0)
+    parser.add_argument("--capacity-seconds", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--min-goodput", type=float, default=0.7)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--plants-per-user", type=int, default=400)
+    parser.add_argument("--catalog", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+"""Page latency at deep positions: OFFSET/LIMIT against keyset cursors.
+
+    python -m benchmarks.pagination --rows 2000000
+
+Fills the plants table up to ``rows`` catalog entries, then fetches one page of the
+catalog at increasing depths, once with OFFSET (how /api/plants/ used to page) and once
+with crud.get_plants seeking past the (name, id) key of the previous row.
+"""
+import argparse
+import datetime
+import json
+import time
+
+from sqlalchemy import func, insert
+
+from api import crud, models
+from api.database import SessionLocal, engine
+
+
+def fill(rows: int, batch: int = 50000):
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        existing = db.query(func.count(models.Plant.id)).scalar()
+        now = datetime.datetime.utcnow()
+        for start in range(existing, rows, batch):
+            db.execute(insert(models.Plant), [
+                {"name": f"Plant {i:08d}", "scientific_name": f"Planta {i:08d}", "created_at": now}
+                for i in range(start, min(rows, start + batch))
+            ])
+        db.commit()
+
+
+def best_of(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return round(min(timings) * 1000, 3)
+
+
+def main(args):
+    fill(args.rows)
+    results = []
+    with SessionLocal() as db:
+        ordered = db.query(models.Plant).order_by(models.Plant.name, models.Plant.id)
+        for depth in args.depths:
+            if depth >= args.rows:
+                continue
+            previous = ordered.offset(depth - 1).first() if depth else None
+            after = (previous.name, previous.id) if previous else None
+            results.append({
+                "depth": depth,
+                "offset_ms": best_of(lambda: ordered.offset(depth).limit(args.page).all(), args.repeat),
+                "keyset_ms": best_of(lambda: crud.get_plants(db, after, args.page), args.repeat),
+            })
+    print(json.dumps({"rows": args.rows, "page": args.page, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10_000, 100_000, 1_000_000, 1_900_000])
+    main(parser.parse_args())
@@ -0,0 +1,216 @@
+"""Query plan regression check for the crud layer.
+
+    python -m benchmarks.query_plans --users 2000
+
+Seeds a dataset big enough for the planner to prefer indexes, runs every crud read
+(and the reads inside the write paths) while recording the SQL they send, and asks the
+database to EXPLAIN each statement. Exits non-zero if any of them reads a table in
+full ("SCAN <table>" on SQLite, "Seq Scan" on Postgres), except for the few queries
+that are meant to walk a whole table.
+
+The database is brought to "alembic upgrade head" before seeding, so the indexes checked
+are the migrations' own and an index dropped from a migration, or a query that stops
+matching one, fails the build. tests/test_query_plans.py runs the same check in the
+test suite.
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event, func, insert
+
+from api import crud, models, schemas
+from api.catalog import plant_cache
+from api.search import plant_search
+from api.database import SessionLocal, engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FULL_SCAN = {
+    "sqlite": re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$"),
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+}
+EXPLAIN = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+
+
+def migrate():
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    # alembic.ini gives it relative to the directory alembic is run from.
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    command.upgrade(config, "head")
+
+
+def seed(users: int, plants_per_user: int, catalog: int):
+    with SessionLocal() as db:
+        if db.query(func.count(models.User.id)).scalar() >= users:
+            return
+        now = datetime.datetime.utcnow()
+        db.execute(insert(models.Plant), [
+            {"name": f"Plant {i:06d}", "scientific_name": f"Planta {i:06d}", "created_at": now,
+             "watering_freq": 1 + i % 4, "watering_period": schemas.WateringFrequencyPeriodType.DAY}
+            for i in range(catalog)
+        ])
+        db.execute(insert(models.User), [
+            {"username": f"plans-{i:06d}", "hashed_password": "x", "admin": False, "created_at": now}
+            for i in range(users)
+        ])
+        db.execute(insert(models.UserInviteCodes), [
+            {"username": f"invited-{i:06d}", "invite_code": f"{i:06d}", "created_at": now + datetime.timedelta(seconds=i)}
+            for i in range(users)
+        ])
+        user_ids = [row.id for row in db.query(models.User.id)]
+        db.execute(insert(models.UserGroup), [
+            {"user_id": user_id, "is_default": is_default, "name": "" if is_default else "Balcony", "created_at": now}
+            for user_id in user_ids for is_default in (True, False)
+        ])
+        groups = {row.user_id: row.id for row in db.query(models.UserGroup.user_id, models.UserGroup.id).filter(models.UserGroup.is_default)}
+        db.execute(insert(models.UserPlant), [
+            {"user_id": user_id, "plant_id": 1 + (user_id * plants_per_user + n) % catalog, "count": 1, "order": n,
+             "user_group_id": groups[user_id], "created_at": now, "last_watered": now,
+             "deleted_at": now if n % 10 == 0 else None}
+            for user_id in user_ids for n in range(plants_per_user)
+        ])
+        owned = db.query(models.UserPlant.id, models.UserPlant.user_id).all()
+        db.execute(insert(models.UserPlantNotes), [
+            {"user_plant_id": plant_id, "user_id": user_id, "note": f"note {n}", "created_at": now + datetime.timedelta(minutes=n)}
+            for plant_id, user_id in owned for n in range(3)
+        ])
+        db.execute(insert(models.WateringEvent), [
+            {"user_plant_id": plant_id, "user_id": user_id, "watered_at": now - datetime.timedelta(days=n)}
+            for plant_id, user_id in owned for n in range(3)
+        ])
+        db.commit()
+
+
+def analyze():
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def checks(db, user_id: int, plant_id: int, group_id: int):
+    """(name, call, tables allowed to be read in full)"""
+    users_page = crud.get_users(db, None, 10)
+    invites_page = crud.get_invited_users(db, None, 10)
+    notes_page = crud.get_user_plant_notes(db, plant_id, user_id, None, 1)
+    events_page = crud.get_watering_events(db, plant_id, user_id, None, 1)
+    catalog_row = crud.get_plants(db, None, 1)[0]
+    new_plant = schemas.UserPlantBase(plant_id=catalog_row.id, nickname="plans", image_path=None)
+    return [
+        ("get_user", lambda: crud.get_user(db, user_id), ()),
+        ("get_user_by_username", lambda: crud.get_user_by_username(db, "plans-000001"), ()),
+        ("get_users", lambda: crud.get_users(db, users_page["next_cursor"], 10), ()),
+        ("get_invited_users", lambda: crud.get_invited_users(db, invites_page["next_cursor"], 10), ()),
+        ("get_existing_invite", lambda: crud.get_existing_invite(db, schemas.UserBase(username="invited-000001")), ()),
+        ("change_my_password", lambda: crud.change_my_password(db, "x", user_id), ()),
+        # catalog_version holds a single row.
+        ("get_data_versions", lambda: (crud.get_data_versions(db, user_id), crud.get_catalog_version(db)), ("catalog_version",)),
+        ("get_plants", lambda: crud.get_plants(db, (catalog_row.name, catalog_row.id), 100), ()),
+        ("get_plant_by_id", lambda: crud.get_plant_by_id(db, catalog_row.id), ()),
+        # Filling the catalog cache reads the whole catalog on purpose.
+        ("get_cached_plants", lambda: (plant_cache.invalidate(), crud.get_cached_plants(db, None, 100)), ("plants", "catalog_version")),
+        # So does building the search index.
+        ("search_plants", lambda: (plant_search.invalidate(), crud.search_plants(db, "plant", 20)), ("plants",)),
+        ("create_user_plant", lambda: crud.create_user_plant(db, new_plant, user_id), ()),
+        ("update_user_plant", lambda: crud.update_user_plant(db, plant_id, schemas.UserPlantUpdate(nickname="plans"), user_id), ()),
+        ("apply_user_plant_batch", lambda: crud.apply_user_plant_batch(db, schemas.UserPlantBatchInput(operations=[
+            {"op": "create", "plant_id": catalog_row.id},
+            {"op": "move", "id": plant_id, "user_group_id": group_id},
+            {"op": "reorder", "ids": [plant_id]},
+        ]), user_id), ()),
+        ("get_user_plant_by_id", lambda: crud.get_user_plant_by_id(db, plant_id, user_id), ()),
+        ("get_deleted_user_plants", lambda: crud.get_deleted_user_plants(db, user_id), ()),
+        ("get_owned_user_plant_ids", lambda: crud.get_owned_user_plant_ids(db, [plant_id, plant_id + 1], user_id), ()),
+        ("set_user_plant_image", lambda: crud.set_user_plant_image(db, plant_id, "0" * 64 + ".png", user_id), ()),
+        ("get_user_plant_image_key", lambda: crud.get_user_plant_image_key(db, plant_id, user_id), ()),
+        ("water_plants", lambda: crud.water_plants(db, schemas.WaterPlantsInput(plant_ids=[plant_id]), user_id), ()),
+        ("get_watering_events", lambda: crud.get_watering_events(db, plant_id, user_id, events_page["next_cursor"], 1), ()),
+        ("get_due_user_plants", lambda: crud.get_due_user_plants(db, user_id), ()),
+        # The cross-user scheduler pass walks every live user plant on purpose.
+        ("get_watering_columns_all_users", lambda: crud.get_watering_columns(db), ("user_plants",)),
+        # As does the reminder scheduler's load of every catalog schedule.
+        ("get_watering_plans", lambda: crud.get_watering_plans(db), ("plants",)),
+        ("stream_reminder_rows", lambda: list(crud.stream_reminder_rows(db, plant_id, 100)), ()),
+        ("get_reminder_rows", lambda: crud.get_reminder_rows(db, [plant_id, plant_id + 1]), ()),
+        ("get_user_groups", lambda: crud.get_user_groups(db, user_id), ()),
+        ("get_user_group_by_id", lambda: crud.get_user_group_by_id(db, group_id, user_id), ()),
+        ("update_user_group", lambda: crud.update_user_group(db, group_id, schemas.UserGroupBase(name="Balcony"), user_id), ()),
+        ("get_has_default_group", lambda: crud.get_has_default_group(db, user_id), ()),
+        ("get_dashboard", lambda: crud.get_dashboard(db, user_id, include_notes=True), ()),
+        ("get_user_plant_notes", lambda: crud.get_user_plant_notes(db, plant_id, user_id, notes_page["next_cursor"], 1), ()),
+        ("search_user_plant_notes", lambda: crud.search_user_plant_notes(db, "note", user_id), ()),
+        ("export_user_collection", lambda: [list(crud.stream(db, stmt, 100)) for _, stmt in crud.export_user_collection_queries(user_id)], ()),
+        ("delete_user_plant", lambda: crud.delete_user_plant(db, plant_id, user_id), ()),
+    ]
+
+
+def capture(fn):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def explain(statement: str, parameters, dialect: str):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(EXPLAIN[dialect] + statement, parameters).all()
+    # SQLite: (id, parent, notused, detail); Postgres: one text column per plan line.
+    return [row[-1] for row in rows]
+
+
+def run(users: int, plants_per_user: int, catalog: int, show_plans: bool = False) -> dict:
+    """Migrates, seeds and checks every crud call; the report lists the full scans found."""
+    dialect = engine.dialect.name
+    if dialect not in EXPLAIN:
+        raise ValueError(f"unsupported database: {dialect}")
+    migrate()
+    seed(users, plants_per_user, catalog)
+    analyze()
+    full_scan = FULL_SCAN[dialect]
+    failures, report = 0, []
+    with SessionLocal() as db:
+        user = db.query(models.User).filter(models.User.username == "plans-000001").one()
+        user_plant = db.query(models.UserPlant).filter(models.UserPlant.user_id == user.id, models.UserPlant.deleted_at == None).first()
+        for name, call, allowed in checks(db, user.id, user_plant.id, user_plant.user_group_id):
+            result = {"check": name, "statements": []}
+            for statement, parameters in capture(call):
+                plan = explain(statement, parameters, dialect)
+                scans = [m.group(1) for m in map(full_scan.search, plan) if m and m.group(1) not in allowed]
+                failures += bool(scans)
+                entry = {"sql": " ".join(statement.split())[:160], "full_scans": scans}
+                if show_plans or scans:
+                    entry["plan"] = plan
+                result["statements"].append(entry)
+            report.append(result)
+            db.rollback()
+    return {"database": dialect, "failures": failures, "checks": report}
+
+
+def main(args):
+    try:
+        report = run(args.users, args.plants, args.catalog, args.show_plans)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failures"] else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--plants", type=int, default=20)
+    parser.add_argument("--catalog", type=int, default=20000)
+    parser.add_argument("--show-plans", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,186 @@
+"""Watering reminders: the schedule at scale, and delivery against a database.
+
+    python -m benchmarks.reminders --plants 10000000 --users 200 --plants-per-user 50
+
+- schedule: --plants generated user plants (spread over --catalog catalog plants, a
+  third never watered) loaded into a ReminderSchedule, as the scheduler does at
+  startup. Reports load time, the memory held, the latency of the updates crud makes
+  as it commits (one plant watered, added, removed) and of a catalog plant's schedule
+  changing, and the cost of a tick over --ticks ticks, with the plants each one found due;
+- delivery: fills the database with benchmarks.datagen and runs a ReminderScheduler
+  with a RecordingSender: the first tick must remind every user of exactly the plants
+  GET /api/userplants/due/ lists, grouped one reminder per user; then a plant is
+  watered through crud, one deleted through crud, one watered and one added with plain
+  SQL (as another worker would), and the next reminders must leave out the watered
+  and deleted plants and include the added one. So must they include a user plant
+  of a catalog plant created through crud after the schedule was loaded, and one of
+  a catalog plant created with plain SQL.
+
+Exits non-zero when delivery finds the wrong plants, so it can gate CI.
+"""
+import os
+
+os.environ.setdefault("REMINDERS_ENABLED", "true")
+
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import insert, update
+
+from api import crud, models, reminders, schedule, schemas
+from api.database import SessionLocal
+from api.settings import REMINDER_TICK_SECONDS, REMINDER_REPEAT_SECONDS
+from benchmarks import datagen
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+    return {"p50_ms": pick(0.5), "p99_ms": pick(0.99), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+def schedule_memory(plan: reminders.ReminderSchedule) -> int:
+    columns = [plan.remind_at, plan.user_id, plan.plant_id, plan.anchor, plan.watered, plan.interval, plan.watering_hour]
+    return sum(column.nbytes for column in columns) + sum(slot.buffer_info()[1] * slot.itemsize for slot in plan._slots.values())
+
+
+def at_scale(args):
+    rng = np.random.default_rng(args.seed)
+    now = time.time()
+    plan = reminders.ReminderSchedule(REMINDER_TICK_SECONDS, REMINDER_REPEAT_SECONDS)
+    pick = random.Random(args.seed)
+    catalog = [(plant_id, pick.randint(1, 4), pick.choice(list(schemas.WateringFrequencyPeriodType)), pick.choice(list(schemas.WateringTimeType)))
+               for plant_id in range(1, args.catalog + 1)]
+    start = time.perf_counter()
+    plan.set_plants(catalog, replace=True)
+    for first in range(1, args.plants + 1, args.batch):
+        ids = np.arange(first, min(first + args.batch, args.plants + 1))
+        last_watered = now - rng.uniform(0, 30 * schedule.DAY_SECONDS, len(ids))
+        last_watered[rng.random(len(ids)) < 1 / 3] = np.nan
+        plan.add_columns(ids, ids % args.users + 1, rng.integers(1, args.catalog + 1, len(ids)), last_watered,
+                         now - rng.uniform(0, 365 * schedule.DAY_SECONDS, len(ids)))
+    load = time.perf_counter() - start
+
+    hooks = {"watered": [], "added": [], "removed": []}
+    targets = rng.integers(1, args.plants + 1, args.updates)
+    watered_at = datetime.datetime.utcnow()
+    for i, target in enumerate(targets.tolist()):
+        start = time.perf_counter()
+        plan.watered_at([(target, watered_at)])
+        hooks["watered"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        plan.add([(args.plants + i + 1, 1, 1, None, watered_at)])
+        hooks["added"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        plan.remove([target])
+        hooks["removed"].append(time.perf_counter() - start)
+    start = time.perf_counter()
+    plan.set_plants([(1, 2, schemas.WateringFrequencyPeriodType.DAY, schemas.WateringTimeType.NIGHT)])
+    catalog_change = time.perf_counter() - start
+
+    # The first tick takes everything overdue; the rest are a steady state.
+    ticks, found = [], []
+    for tick in range(args.ticks):
+        start = time.perf_counter()
+        due = plan.pop_due(now + tick * plan.tick)
+        ticks.append(time.perf_counter() - start)
+        found.append(len(due))
+    return {
+        "plants": args.plants,
+        "load_seconds": round(load, 2),
+        "memory_mb": round(schedule_memory(plan) / 1e6, 1),
+        "bytes_per_plant": round(schedule_memory(plan) / args.plants, 1),
+        "scheduled": len(plan),
+        "hooks": {kind: percentiles(samples) for kind, samples in hooks.items()},
+        "catalog_plant_changed_ms": round(catalog_change * 1000, 1),
+        "first_tick": {"ms": round(ticks[0] * 1000, 1), "due": found[0]},
+        "later_ticks": {**percentiles(ticks[1:]), "due_per_tick": round(sum(found[1:]) / max(1, len(found) - 1), 1)},
+    }
+
+
+def reminded(sent: list) -> dict:
+    return {reminder.user_id: {plant_id for plant_id, _ in reminder.plants} for reminder in sent}
+
+
+def delivery(args):
+    data = datagen.generate(users=args.users, plants_per_user=args.plants_per_user, catalog=args.db_catalog, reset=True)
+    plan = reminders.reminder_schedule
+    sender = reminders.RecordingSender()
+    scheduler = reminders.ReminderScheduler(plan, SessionLocal, sender)
+    start = time.perf_counter()
+    scheduler.load()
+    load = time.perf_counter() - start
+    now = time.time()
+    with SessionLocal() as db:
+        expected = {user_id: {row["id"] for row in crud.get_due_user_plants(db, user_id)} for user_id, _ in data.users}
+    expected = {user_id: ids for user_id, ids in expected.items() if ids}
+    start = time.perf_counter()
+    first = reminded(scheduler.run_once(now))
+    tick = time.perf_counter() - start
+    repeated = reminded(scheduler.run_once(now + 1))
+
+    user_id = next(iter(first))
+    watered, deleted, elsewhere = sorted(first[user_id])[:3]
+    with SessionLocal() as db:
+        crud.water_plants(db, schemas.WaterPlantsInput(plant_ids=[watered]), user_id)
+        crud.delete_user_plant(db, deleted, user_id)
+        # Another worker: neither write reaches this process's schedule directly.
+        db.execute(update(models.UserPlant).where(models.UserPlant.id == elsewhere).values(last_watered=datetime.datetime.utcnow()))
+        added = db.execute(insert(models.UserPlant).returning(models.UserPlant.id).values(
+            user_id=user_id, plant_id=next(iter(data.catalog)), count=1, created_at=datetime.datetime.utcnow())).scalar_one()
+        db.commit()
+        new_plant = crud.create_plant(db, schemas.PlantBase(name="Reminder check", watering_freq=1,
+                                                            watering_period=schemas.WateringFrequencyPeriodType.DAY))
+        of_new_plant = crud.create_user_plant(db, schemas.UserPlantBase(plant_id=new_plant.id, image_path=None), user_id).id
+        plant_elsewhere = db.execute(insert(models.Plant).returning(models.Plant.id).values(
+            name="Reminder check elsewhere", watering_freq=1, watering_period=schemas.WateringFrequencyPeriodType.DAY,
+            created_at=datetime.datetime.utcnow())).scalar_one()
+        of_plant_elsewhere = db.execute(insert(models.UserPlant).returning(models.UserPlant.id).values(
+            user_id=user_id, plant_id=plant_elsewhere, count=1, created_at=datetime.datetime.utcnow())).scalar_one()
+        db.commit()
+    later = reminded(scheduler.run_once(now + REMINDER_REPEAT_SECONDS + 1))
+    again = later.get(user_id, set())
+    checks = {
+        "first_tick_matches_due_route": first == expected,
+        "not_repeated_within_repeat_interval": not repeated,
+        "watered_plant_left_out": watered not in again,
+        "deleted_plant_left_out": deleted not in again,
+        "plant_watered_elsewhere_left_out": elsewhere not in again,
+        "plant_added_elsewhere_included": added in again,
+        "plant_of_new_catalog_plant_included": of_new_plant in again,
+        "plant_of_catalog_plant_created_elsewhere_included": of_plant_elsewhere in again,
+        "others_reminded_again": (first[user_id] - {watered, deleted, elsewhere}) <= again,
+    }
+    return {
+        "user_plants": sum(len(ids) for ids in data.plants.values()),
+        "load_seconds": round(load, 3),
+        "first_tick": {"ms": round(tick * 1000, 1), "users": len(first), "plants": sum(map(len, first.values()))},
+        "checks": checks,
+    }
+
+
+def main(args):
+    result = {"schedule": at_scale(args), "delivery": delivery(args)}
+    print(json.dumps(result, indent=2))
+    failed = [name for name, ok in result["delivery"]["checks"].items() if not ok]
+    if failed:
+        sys.exit(f"Reminder checks failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=10_000_000)
+    parser.add_argument("--catalog", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=1_000_000)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--plants-per-user", type=int, default=50)
+    parser.add_argument("--db-catalog", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
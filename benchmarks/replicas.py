@@ -0,0 +1,139 @@
+"""Read replica routing against local SQLite files standing in for replicas.
+
+    python -m benchmarks.replicas --users 10 --requests 500
+
+Fills the primary (DB_URL) with benchmarks.datagen and copies it to the replica files in
+DB_REPLICA_URLS. The default list ends with a replica that cannot be opened, so failover
+is exercised too. The copies are never updated, which makes routing visible: a read
+served by a replica does not see later writes. The app then runs in-process over ASGI:
+
+- reads: --requests GETs over the dashboard, catalog, notes and users routes, with the
+  sessions each engine served (round-robin over the healthy replicas, none on the broken
+  one) and their latency percentiles;
+- read_after_write: a user renames a plant and reads it back at once, which must come
+  from the primary, and again after DB_READ_AFTER_WRITE_SECONDS, which comes from a
+  replica and so shows the old name;
+- pool statistics and the replica health gauges, as /metrics reports them.
+"""
+import os
+
+os.environ.setdefault("DB_REPLICA_URLS", "sqlite:///./bench-replica-0.db,sqlite:///./bench-replica-1.db,sqlite:////nonexistent/bench-replica-2.db")
+os.environ.setdefault("DB_ASYNC_REPLICA_URLS", os.environ["DB_REPLICA_URLS"].replace("sqlite://", "sqlite+aiosqlite://"))
+os.environ.setdefault("DB_READ_AFTER_WRITE_SECONDS", "1")
+
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import time
+
+import httpx
+from sqlalchemy import make_url
+
+from api import metrics, settings
+from api.database import engine, pool_stats, replica_engines
+from api.main import app
+from benchmarks import datagen
+
+
+def copy_to_replicas():
+    engine.dispose()
+    primary = make_url(settings.DB_URL).database
+    copied = []
+    for url in settings.DB_REPLICA_URLS:
+        path = make_url(url).database
+        if os.path.isdir(os.path.dirname(os.path.abspath(path))):
+            shutil.copyfile(primary, path)
+            copied.append(url)
+    return copied
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def read_sessions() -> dict:
+    return {labels[0]: value for labels, value in metrics.read_sessions_total._values.items()}
+
+
+async def reads(client, sessions: list, data, requests: int, seed: int):
+    rng = random.Random(seed)
+    catalog_ids = list(data.catalog)
+    before, samples, statuses = read_sessions(), [], {}
+    for _ in range(requests):
+        user_id, headers = rng.choice(sessions)
+        url = rng.choice([
+            "/api/userplants/", f"/api/userplants/{rng.choice(data.plants[user_id])}/",
+            f"/api/userplants/{rng.choice(data.plants[user_id])}/notes/", "/api/plants/?limit=100",
+            f"/api/plants/{rng.choice(catalog_ids)}/", "/api/users/me/", f"/api/users/{user_id}/",
+        ])
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        samples.append(time.perf_counter() - start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    after = read_sessions()
+    return {
+        "requests": requests,
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "sessions_by_engine": {name: after[name] - before.get(name, 0) for name in sorted(after)},
+        **percentiles(samples),
+    }
+
+
+async def read_after_write(client, user_id: int, headers: dict, plant_id: int):
+    url = f"/api/userplants/{plant_id}/"
+    original = (await client.get(url, headers=headers)).json()["nickname"]
+    renamed = f"Renamed at {time.monotonic():.3f}"
+    (await client.post(f"/api/userplants/{plant_id}/update/", headers=headers, json={"nickname": renamed})).raise_for_status()
+    immediately = (await client.get(url, headers=headers)).json()["nickname"]
+    await asyncio.sleep(settings.DB_READ_AFTER_WRITE_SECONDS + 0.1)
+    later = (await client.get(url, headers=headers)).json()["nickname"]
+    return {
+        "window_seconds": settings.DB_READ_AFTER_WRITE_SECONDS,
+        "replica_before_write": original,
+        "written": renamed,
+        "read_immediately": immediately,
+        "read_from_primary_immediately": immediately == renamed,
+        "read_after_window": later,
+        "read_from_replica_after_window": later == original,
+    }
+
+
+async def main(args):
+    data = datagen.generate(users=args.users, plants_per_user=args.plants_per_user, catalog=args.catalog, reset=True)
+    copied = copy_to_replicas()
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        sessions = []
+        for user_id, username in data.users:
+            response = await client.post("/api/auth/login/", data={"username": username, "password": data.password})
+            response.raise_for_status()
+            sessions.append((user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}))
+        result = {
+            "database": engine.dialect.name,
+            "db_async": settings.DB_ASYNC,
+            "replicas": [make_url(url).render_as_string(hide_password=True) for url in settings.DB_REPLICA_URLS],
+            "replicas_copied": len(copied),
+            "reads": await reads(client, sessions, data, args.requests, args.seed),
+            "read_after_write": await read_after_write(client, *sessions[0], data.plants[sessions[0][0]][0]),
+        }
+        metrics.render()
+        result["replica_up"] = {labels[0]: value for labels, value in sorted(metrics.replica_up._values.items())}
+        result["pools"] = pool_stats()
+    for e in replica_engines:
+        await e.dispose() if settings.DB_ASYNC else e.dispose()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--plants-per-user", type=int, default=20)
+    parser.add_argument("--catalog", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
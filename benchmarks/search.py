@@ -0,0 +1,115 @@
+"""Catalog search latency on a large synthetic catalog.
+
+    python -m benchmarks.search --plants 100000 --queries 5000
+
+Builds a PlantSearchIndex from generated (id, name, scientific_name) rows, then times
+a mix of whole-word, search-as-you-type prefix, misspelled and two-word queries. Also
+times the incremental update the crud write path does. Exits non-zero when p99 search
+latency is over --budget-ms, so it can gate CI.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from api.search import PlantSearchIndex, normalize
+
+ONSETS = ["b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v", "ph", "th", "st", "tr", "cr", "pl", "ch"]
+VOWELS = ["a", "e", "i", "o", "u", "ae", "io", "ia"]
+ADJECTIVES = ["golden", "silver", "dwarf", "giant", "variegated", "creeping", "weeping", "red", "blue", "spotted",
+              "trailing", "mountain", "desert", "swamp", "royal", "velvet", "painted", "hairy", "lesser", "common"]
+NOUNS = ["fern", "palm", "ivy", "lily", "orchid", "cactus", "pothos", "fig", "rubber plant", "aloe", "begonia",
+         "violet", "philodendron", "calathea", "peperomia", "jade", "sage", "mint", "daisy", "bromeliad"]
+
+
+def word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(ONSETS) + rng.choice(VOWELS) for _ in range(syllables))
+
+
+def catalog(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    genera = [word(rng, rng.randint(2, 4)).capitalize() for _ in range(max(1, count // 40))]
+    epithets = [word(rng, rng.randint(2, 4)) for _ in range(max(1, count // 20))]
+    for plant_id in range(1, count + 1):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {word(rng, 2)}".title()
+        yield plant_id, name, f"{rng.choice(genera)} {rng.choice(epithets)}"
+
+
+def misspell(rng: random.Random, term: str) -> str:
+    i = rng.randrange(len(term))
+    edit = rng.choice(("drop", "swap", "replace"))
+    if edit == "drop":
+        return term[:i] + term[i + 1:]
+    if edit == "swap" and i + 1 < len(term):
+        return term[:i] + term[i + 1] + term[i] + term[i + 2:]
+    return term[:i] + rng.choice("aeiourstln") + term[i + 1:]
+
+
+def queries(rows: list, count: int, seed: int = 2):
+    rng = random.Random(seed)
+    for _ in range(count):
+        _, name, scientific_name = rng.choice(rows)
+        words = normalize(name) + normalize(scientific_name)
+        term = rng.choice(words)
+        kind = rng.choice(("word", "prefix", "typo", "two_words"))
+        if kind == "prefix":
+            yield kind, term[:rng.randint(2, max(2, len(term) - 1))]
+        elif kind == "typo" and len(term) >= 4:
+            yield kind, misspell(rng, term)
+        elif kind == "two_words":
+            yield kind, " ".join(normalize(scientific_name))
+        else:
+            yield "word", term
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+    return {"count": len(samples), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+def main(args):
+    rows = list(catalog(args.plants))
+    index = PlantSearchIndex(ttl=3600)
+    start = time.perf_counter()
+    index.load(rows, index.generation())
+    build_seconds = time.perf_counter() - start
+
+    samples, by_kind, found = [], {}, 0
+    for kind, query in queries(rows, args.queries):
+        start = time.perf_counter()
+        result = index.search(query, args.limit)
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        by_kind.setdefault(kind, []).append(elapsed)
+        found += bool(result)
+
+    updates = []
+    rng = random.Random(3)
+    for plant_id, name, scientific_name in rng.sample(rows, min(1000, len(rows))):
+        start = time.perf_counter()
+        index.put([SimpleNamespace(id=plant_id, name=name + " Renamed", scientific_name=scientific_name)])
+        updates.append(time.perf_counter() - start)
+
+    overall = percentiles(samples)
+    print(json.dumps({
+        "plants": args.plants,
+        "build_seconds": round(build_seconds, 2),
+        "queries_with_results": found,
+        "search": overall,
+        "search_by_kind": {kind: percentiles(values) for kind, values in sorted(by_kind.items())},
+        "incremental_update": percentiles(updates),
+    }, indent=2))
+    if overall["p99_ms"] > args.budget_ms:
+        sys.exit(f"p99 search latency {overall['p99_ms']}ms is over the {args.budget_ms}ms budget")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    main(parser.parse_args())
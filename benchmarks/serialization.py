@@ -0,0 +1,100 @@
+"""Response serialization time for a large dashboard, generic path against JSONBytesRoute.
+
+    python -m benchmarks.serialization --plants 1000 --notes 3
+
+Seeds one user with --plants plants (and --notes notes each) and loads their dashboard
+once. It then serializes the loaded objects the way FastAPI does by default (validated,
+dumped to Python objects in JSON mode, then json.dumps'd by JSONResponse) and the way
+JSONBytesRoute does (the same validation, dumped straight to bytes), --rounds times
+each. It also does the same for the whole catalog as list[PlantResponse]. Both paths
+must produce the same JSON.
+"""
+import argparse
+import datetime
+import json
+import time
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+
+from api import crud, models, schemas
+from api.database import SessionLocal, engine
+from api.responses import JSONBytesResponse, JSONBytesRoute
+
+
+def seed(plants: int, notes: int) -> int:
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        user = models.User(username=f"serialize-{now.timestamp()}", hashed_password="x", created_at=now, admin=False)
+        catalog = [models.Plant(name=f"Serialized plant {i}", scientific_name=f"Planta serialis {now.timestamp()} {i}",
+                                watering_freq=2, watering_period=schemas.WateringFrequencyPeriodType.WEEK, created_at=now)
+                   for i in range(200)]
+        db.add_all([user, *catalog])
+        db.flush()
+        groups = [models.UserGroup(user_id=user.id, is_default=i == 0, name=f"Room {i}", created_at=now) for i in range(10)]
+        db.add_all(groups)
+        db.flush()
+        db.execute(insert(models.UserPlant), [
+            {"user_id": user.id, "plant_id": catalog[i % len(catalog)].id, "user_group_id": groups[i % len(groups)].id,
+             "nickname": f"Plant {i}", "count": 1, "order": i, "created_at": now, "last_watered": now}
+            for i in range(plants)
+        ])
+        plant_ids = [row.id for row in db.query(models.UserPlant.id).filter(models.UserPlant.user_id == user.id)]
+        if notes:
+            db.execute(insert(models.UserPlantNotes), [
+                {"user_id": user.id, "user_plant_id": plant_id, "created_at": now, "note": f"Note {n}: misted and turned."}
+                for plant_id in plant_ids for n in range(notes)
+            ])
+        db.commit()
+        return user.id
+
+
+def compare(response_model, content, rounds: int, exclude_unset: bool = False):
+    adapter = TypeAdapter(response_model)
+    route = JSONBytesRoute("/", lambda: None, response_model=response_model, response_model_exclude_unset=exclude_unset)
+
+    def generic() -> bytes:
+        value = adapter.validate_python(content, from_attributes=True)
+        return JSONResponse(adapter.dump_python(value, mode="json", exclude_unset=exclude_unset)).body
+
+    def json_bytes() -> bytes:
+        return JSONBytesResponse(route.serialize(content)).body
+
+    result, bodies = {}, {}
+    for name, serialize in (("generic", generic), ("json_bytes", json_bytes)):
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            bodies[name] = serialize()
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        result[name] = {"median_ms": round(samples[len(samples) // 2] * 1000, 2), "min_ms": round(samples[0] * 1000, 2)}
+    assert json.loads(bodies["generic"]) == json.loads(bodies["json_bytes"])
+    result["bytes"] = len(bodies["json_bytes"])
+    result["speedup"] = round(result["generic"]["median_ms"] / result["json_bytes"]["median_ms"], 1)
+    return result
+
+
+def main(args):
+    user_id = seed(args.plants, args.notes)
+    with SessionLocal() as db:
+        dashboard = crud.get_dashboard(db, user_id, include_notes=True)
+        catalog = db.query(models.Plant).all()
+        results = {
+            "plants": args.plants,
+            "dashboard": compare(list[schemas.UserDashboardGroup], [
+                schemas.UserDashboardGroup.model_validate(group, from_attributes=True) for group in dashboard], args.rounds),
+            "dashboard_with_notes": compare(list[schemas.UserDashboardGroupWithNotes], dashboard, args.rounds, exclude_unset=True),
+            "catalog": compare(list[schemas.PlantResponse], catalog, args.rounds),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plants", type=int, default=1000)
+    parser.add_argument("--notes", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=30)
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+"""Watering event ingestion throughput.
+
+    python -m benchmarks.watering --events 20000 --threads 8
+
+Runs against DB_URL (a SQLite file by default; point it at a local Postgres to compare).
+Every simulated tap waters one plant. The unbuffered path writes each tap in its own
+transaction, as the request path did before; the buffered path hands taps to a
+WateringEventWriter and counts until the last batch is committed.
+"""
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+
+from sqlalchemy import func
+
+from api import crud, models, schemas
+from api.database import SessionLocal, engine
+from api.watering import WateringEventWriter
+
+
+def seed(users: int, plants_per_user: int):
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.datetime.utcnow()
+    owned = {}
+    with SessionLocal() as db:
+        plant = models.Plant(name="Benchmark fern", watering_freq=1, created_at=now)
+        db.add(plant)
+        db.flush()
+        for i in range(users):
+            user = models.User(username=f"watering-{now.timestamp()}-{i}", hashed_password="x", created_at=now, admin=False)
+            db.add(user)
+            db.flush()
+            rows = [models.UserPlant(user_id=user.id, plant_id=plant.id, count=1, order=n, created_at=now) for n in range(plants_per_user)]
+            db.add_all(rows)
+            db.flush()
+            owned[user.id] = [row.id for row in rows]
+        db.commit()
+    return owned
+
+
+def taps(owned: dict, count: int):
+    rng = random.Random(7)
+    users = list(owned)
+    for _ in range(count):
+        user_id = rng.choice(users)
+        yield user_id, rng.choice(owned[user_id])
+
+
+def run_threads(work, items: list, threads: int):
+    chunks = [items[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=work, args=(chunk,)) for chunk in chunks]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def unbuffered(items: list, threads: int):
+    def work(chunk):
+        for user_id, plant_id in chunk:
+            with SessionLocal() as db:
+                crud.water_plants(db, schemas.WaterPlantsInput(plant_ids=[plant_id]), user_id)
+
+    start = time.perf_counter()
+    run_threads(work, items, threads)
+    return time.perf_counter() - start
+
+
+def buffered(items: list, threads: int, flush_interval: float):
+    writer = WateringEventWriter(SessionLocal, crud.record_waterings, flush_interval=flush_interval, max_batch=5000)
+    writer.start()
+
+    def work(chunk):
+        for user_id, plant_id in chunk:
+            writer.submit(user_id, [plant_id], datetime.datetime.utcnow())
+
+    start = time.perf_counter()
+    run_threads(work, items, threads)
+    writer.stop()  # flushes whatever is still pending
+    return time.perf_counter() - start
+
+
+def count_events():
+    with SessionLocal() as db:
+        return db.query(func.count(models.WateringEvent.id)).scalar()
+
+
+def main(args):
+    owned = seed(args.users, args.plants)
+    results = {"database": engine.url.get_backend_name(), "events": {}}
+    for name, run in (("unbuffered", lambda items: unbuffered(items, args.threads)),
+                      ("buffered", lambda items: buffered(items, args.threads, args.flush_interval))):
+        count = args.events if name == "buffered" else args.unbuffered_events
+        items = list(taps(owned, count))
+        before = count_events()
+        seconds = run(items)
+        written = count_events() - before
+        assert written == count, f"{name}: expected {count} events, found {written}"
+        results["events"][name] = {"events": count, "seconds": round(seconds, 3), "events_per_second": round(count / seconds, 1)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--plants", type=int, default=20)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--unbuffered-events", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--flush-interval", type=float, default=0.1)
+    main(parser.parse_args())
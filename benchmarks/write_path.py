@@ -0,0 +1,176 @@
+"""Write throughput of the crud mutations, the previous write path against RETURNING.
+
+    python -m benchmarks.write_path --rounds 500
+
+Each mutation runs --rounds times as it did before (add, commit, then refresh; UPDATE,
+commit, then SELECT the row again; registration committing the user and their default
+group separately; sessions expiring every row on commit) and as api.crud does it now
+(one INSERT or UPDATE .. RETURNING, one commit). Each round uses its own session, as a
+request does. Reports mutations per second and SQL statements per mutation each way.
+On SQLite a round trip is a function call; point DB_URL at a local Postgres to see what
+the saved round trips are worth over a socket.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import time
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import sessionmaker
+
+from api import crud, models, schemas
+from api.database import SessionLocal, engine
+
+# Sessions as they were configured before: every row expires on commit.
+ExpiringSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+names = itertools.count()
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        user = models.User(username=f"writer-{time.time()}", hashed_password="x", created_at=now, admin=False)
+        plant = models.Plant(name="Written plant", scientific_name=f"Planta scripta {time.time()}", created_at=now)
+        db.add_all([user, plant])
+        db.flush()
+        group = models.UserGroup(user_id=user.id, is_default=True, name="", created_at=now)
+        db.add(group)
+        db.flush()
+        user_plant = models.UserPlant(user_id=user.id, plant_id=plant.id, user_group_id=group.id, count=1, order=1, created_at=now)
+        db.add(user_plant)
+        db.commit()
+        return user.id, plant.id, group.id, user_plant.id
+
+
+# The previous implementations, kept here for comparison.
+
+def previous_create_user_plant(db, user_plant, current_user):
+    max_order = db.query(models.UserPlant.order).filter(models.UserPlant.user_id == current_user).order_by(models.UserPlant.order.desc()).first()
+    default_group = db.query(models.UserGroup.id).filter(models.UserGroup.user_id == current_user).filter(models.UserGroup.is_default).first()
+    row = models.UserPlant(user_id=current_user, plant_id=user_plant.plant_id, nickname=user_plant.nickname, count=user_plant.count,
+                           order=1 if not max_order else max_order.order + 1, user_group_id=default_group.id,
+                           image_path=user_plant.image_path, created_at=datetime.datetime.utcnow())
+    db.add(row)
+    crud._bump_user_version(db, current_user)
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+def previous_update_user_plant(db, plant_id, user_plant, current_user):
+    db.execute(update(models.UserPlant).values(user_plant.dict(exclude_none=True))
+               .where(models.UserPlant.id == plant_id).where(models.UserPlant.user_id == current_user))
+    crud._bump_user_version(db, current_user)
+    db.commit()
+    res = crud._user_plants_query(db).filter(models.UserPlant.id == plant_id).first()
+    return crud.attach_plant_data(db, [res])[0]
+
+
+def previous_create_note(db, plant_id, note, current_user):
+    row = models.UserPlantNotes(user_plant_id=plant_id, user_id=current_user, created_at=datetime.datetime.utcnow(), note=note.note)
+    db.add(row)
+    crud._bump_user_version(db, current_user)
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+def previous_update_plant(db, plant):
+    db.execute(update(models.Plant).values(plant.dict()).where(models.Plant.id == plant.id))
+    crud._bump_catalog_version(db)
+    db.commit()
+    return db.query(models.Plant).filter(models.Plant.id == plant.id).first()
+
+
+def previous_change_password(db, hashed_password, current_user):
+    db.execute(update(models.User).values({"hashed_password": hashed_password}).where(models.User.id == current_user))
+    db.commit()
+    return db.query(models.User).filter(models.User.id == current_user).first()
+
+
+def previous_register(db, user, hashed_password):
+    row = models.User(username=user.username, hashed_password=hashed_password, created_at=datetime.datetime.utcnow(), admin=False)
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    group = models.UserGroup(name="", user_id=row.id, is_default=True, created_at=datetime.datetime.utcnow())
+    db.add(group)
+    crud._bump_user_version(db, row.id)
+    db.commit()
+    db.refresh(group)
+    return row
+
+
+def previous_create_group(db, group, current_user):
+    row = models.UserGroup(name=group.name, user_id=current_user, is_default=group.is_default, created_at=datetime.datetime.utcnow())
+    db.add(row)
+    crud._bump_user_version(db, current_user)
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+def mutations(user_id: int, plant_id: int, user_plant_id: int):
+    """name: (previous, current), each called as fn(db) and returning the row written,
+    which is then read the way a response would read it."""
+    plant = lambda: schemas.PlantResponse(id=plant_id, name=f"Written plant {next(names)}", scientific_name=None)
+    user_plant = lambda: schemas.UserPlantBase(plant_id=plant_id, nickname="New", image_path=None)
+    rename = lambda: schemas.UserPlantUpdate(nickname=f"Renamed {next(names)}")
+    note = schemas.UserPlantNoteBase(note="Written note.")
+    group = lambda: schemas.UserGroupInput(name=f"Room {next(names)}", is_default=False)
+    register = lambda: schemas.UserIn(username=f"registered-{time.time()}-{next(names)}", password="x", invite_code="x")
+    return {
+        "create_user_plant": (lambda db: previous_create_user_plant(db, user_plant(), user_id),
+                              lambda db: crud.create_user_plant(db, user_plant(), user_id)),
+        "update_user_plant": (lambda db: previous_update_user_plant(db, user_plant_id, rename(), user_id),
+                              lambda db: crud.update_user_plant(db, user_plant_id, rename(), user_id)),
+        "create_note": (lambda db: previous_create_note(db, user_plant_id, note, user_id),
+                        lambda db: crud.create_user_plant_note(db, user_plant_id, note, user_id)),
+        "create_group": (lambda db: previous_create_group(db, group(), user_id),
+                         lambda db: crud.create_user_group(db, group(), user_id)),
+        "update_plant": (lambda db: previous_update_plant(db, plant()),
+                         lambda db: crud.update_plant(db, plant())),
+        "change_password": (lambda db: previous_change_password(db, "x", user_id),
+                            lambda db: crud.change_my_password(db, "x", user_id)),
+        "register_user": (lambda db: previous_register(db, register(), "x"),
+                          lambda db: crud.create_user(db, register(), "x")),
+    }
+
+
+def measure(session_factory, mutate, rounds: int) -> dict:
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            with session_factory() as db:
+                row = mutate(db)
+                # What serializing the response reads.
+                [getattr(row, column.key) for column in row.__table__.columns]
+        seconds = time.perf_counter() - start
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return {"per_second": round(rounds / seconds, 1), "sql_per_mutation": round(statements / rounds, 2)}
+
+
+def main(args):
+    user_id, plant_id, _, user_plant_id = seed()
+    results = {}
+    for name, (previous, current) in mutations(user_id, plant_id, user_plant_id).items():
+        before = measure(ExpiringSessionLocal, previous, args.rounds)
+        after = measure(SessionLocal, current, args.rounds)
+        results[name] = {"previous": before, "returning": after, "speedup": round(after["per_second"] / before["per_second"], 2)}
+    print(json.dumps({"database": engine.dialect.name, "rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=500)
+    main(parser.parse_args())
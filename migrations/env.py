@@ -0,0 +1,37 @@
+import os
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+config = context.config
+if config.config_file_name is not None:
+    # Migrations also run inside other processes (benchmarks, tests): leave their loggers on.
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+DB_URL = os.environ["DB_URL"]
+
+
+def target_metadata():
+    # Imported late so a broken app import only fails the commands that compare models.
+    from api import models
+    return models.Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(url=DB_URL, target_metadata=target_metadata(), literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(DB_URL, poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata(), render_as_batch=connection.dialect.name == "sqlite")
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,106 @@
+"""Initial schema, as created by create_all() before migrations existed
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+plant_type = sa.Enum("TREE", "LEAFY_PLANT", "FLOWER", "SUCCULENT", "HERB", "VEGETABLE", name="planttype")
+watering_period = sa.Enum("HOUR", "DAY", "WEEK", "MONTH", name="wateringfrequencyperiodtype")
+watering_time = sa.Enum("MORNING", "AFTERNOON", "NIGHT", name="wateringtimetype")
+sun_requirement = sa.Enum("SHADE", "PART_SHADE", "FULL_SUN", name="sunrequirementtype")
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(255)),
+        sa.Column("admin", sa.Boolean()),
+        sa.Column("hashed_password", sa.String(128)),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("last_seen", sa.DateTime()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "plants",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255)),
+        sa.Column("scientific_name", sa.String(255)),
+        sa.Column("type", plant_type),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("watering_freq", sa.Integer()),
+        sa.Column("watering_period", watering_period),
+        sa.Column("watering_time", watering_time),
+        sa.Column("sun_requirement", sun_requirement),
+        sa.Column("external_link", sa.Text()),
+    )
+    op.create_index("ix_plants_id", "plants", ["id"])
+
+    op.create_table(
+        "user_groups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("is_default", sa.Boolean()),
+        sa.Column("name", sa.String(128)),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("deleted_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_groups_id", "user_groups", ["id"])
+
+    op.create_table(
+        "user_plants",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("plant_id", sa.Integer(), sa.ForeignKey("plants.id")),
+        sa.Column("nickname", sa.String(128)),
+        sa.Column("count", sa.Integer()),
+        sa.Column("order", sa.Integer()),
+        sa.Column("image_path", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("user_group_id", sa.Integer(), sa.ForeignKey("user_groups.id")),
+        sa.Column("last_watered", sa.DateTime()),
+        sa.Column("deleted_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_plants_id", "user_plants", ["id"])
+
+    op.create_table(
+        "user_plant_notes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_plant_id", sa.Integer(), sa.ForeignKey("user_plants.id")),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("deleted_at", sa.DateTime()),
+        sa.Column("note", sa.Text()),
+    )
+    op.create_index("ix_user_plant_notes_id", "user_plant_notes", ["id"])
+
+    op.create_table(
+        "user_invite_codes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(255), unique=True),
+        sa.Column("invite_code", sa.String(255), unique=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_invite_codes_id", "user_invite_codes", ["id"])
+
+
+def downgrade():
+    op.drop_table("user_invite_codes")
+    op.drop_table("user_plant_notes")
+    op.drop_table("user_plants")
+    op.drop_table("user_groups")
+    op.drop_table("plants")
+    op.drop_table("users")
+    bind = op.get_bind()
+    for enum in (plant_type, watering_period, watering_time, sun_requirement):
+        enum.drop(bind, checkfirst=True)
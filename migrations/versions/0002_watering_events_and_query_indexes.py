@@ -0,0 +1,48 @@
+"""Watering event log and indexes for the crud query filters
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text("deleted_at IS NULL")
+
+
+def upgrade():
+    op.create_table(
+        "watering_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_plant_id", sa.Integer(), sa.ForeignKey("user_plants.id")),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("watered_at", sa.DateTime()),
+    )
+    op.create_index("ix_watering_events_id", "watering_events", ["id"])
+    op.create_index("ix_watering_events_history", "watering_events", ["user_plant_id", "watered_at", "id"])
+
+    op.create_index("ix_plants_name_id", "plants", ["name", "id"])
+    op.create_index("ix_user_groups_user_id_is_default", "user_groups", ["user_id", "is_default"])
+    op.create_index("ix_user_plants_user_id_deleted_at", "user_plants", ["user_id", "deleted_at"])
+    op.create_index("ix_user_plants_active_group", "user_plants", ["user_group_id"], postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.create_index(
+        "ix_user_plant_notes_plant_user_created",
+        "user_plant_notes",
+        ["user_plant_id", "user_id", sa.text("created_at DESC"), sa.text("id DESC")]
+    )
+    op.create_index("ix_user_invite_codes_created_at_id", "user_invite_codes", ["created_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_user_invite_codes_created_at_id", "user_invite_codes")
+    op.drop_index("ix_user_plant_notes_plant_user_created", "user_plant_notes")
+    op.drop_index("ix_user_plants_active_group", "user_plants")
+    op.drop_index("ix_user_plants_user_id_deleted_at", "user_plants")
+    op.drop_index("ix_user_groups_user_id_is_default", "user_groups")
+    op.drop_index("ix_plants_name_id", "plants")
+    op.drop_table("watering_events")
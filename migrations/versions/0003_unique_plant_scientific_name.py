@@ -0,0 +1,34 @@
+"""Unique scientific_name on plants, the key catalog imports upsert on
+
+Empty scientific_names, which the create route used to store as sent, become NULL
+first, as crud now stores them. Fails, naming them, if two plants already share a
+non-empty scientific_name; merge those first. Plants without one are not affected.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE plants SET scientific_name = NULL WHERE scientific_name = ''")
+    # Offline (--sql) there is no database to check; the CREATE UNIQUE INDEX fails instead.
+    duplicates = [] if context.is_offline_mode() else op.get_bind().execute(sa.text(
+        "SELECT scientific_name, COUNT(*) FROM plants WHERE scientific_name IS NOT NULL "
+        "GROUP BY scientific_name HAVING COUNT(*) > 1 ORDER BY scientific_name"
+    )).all()
+    if duplicates:
+        names = ", ".join(f"{name!r} ({count} plants)" for name, count in duplicates)
+        raise RuntimeError(f"plants share a scientific_name, merge them before upgrading: {names}")
+    op.create_index("uq_plants_scientific_name", "plants", ["scientific_name"], unique=True)
+
+
+def downgrade():
+    op.drop_index("uq_plants_scientific_name", "plants")
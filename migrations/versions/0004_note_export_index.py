@@ -0,0 +1,20 @@
+"""Index user_plant_notes by (user_id, id) for collection exports
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_user_plant_notes_user_id_id", "user_plant_notes", ["user_id", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_user_plant_notes_user_id_id", "user_plant_notes")
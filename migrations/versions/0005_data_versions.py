@@ -0,0 +1,29 @@
+"""Version counters for conditional GETs: users.data_version and catalog_version
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("data_version", sa.Integer(), nullable=False, server_default="0"))
+    catalog_version = op.create_table(
+        "catalog_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+    )
+    op.bulk_insert(catalog_version, [{"id": 1, "version": 0}])
+
+
+def downgrade():
+    op.drop_table("catalog_version")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("data_version")
@@ -0,0 +1,22 @@
+"""Uploaded plant photos: user_plants.image_key
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("user_plants", sa.Column("image_key", sa.String(80), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("user_plants") as batch_op:
+        batch_op.drop_column("image_key")
@@ -0,0 +1,152 @@
+"""Shared fixtures. api.settings reads the environment at import time, so it is set here
+before anything from api is imported: a throwaway SQLite database migrated with
+``alembic upgrade head``, as production is, and query budgets enforced (a route over
+its budget answers 500, see api/query_budget.py).
+"""
+import os
+import shutil
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="plantmanager-tests-")
+os.environ["DB_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["DB_ASYNC_URL"] = f"sqlite+aiosqlite:///{_tmp}/test.db"
+os.environ["IMAGE_STORAGE_DIR"] = os.path.join(_tmp, "images")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_REFRESH_SECRET_KEY", "test-refresh-secret")
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["STARTUP_WARMUP"] = "false"
+
+import datetime
+import pytest
+from alembic import command
+from alembic.config import Config
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert, update
+from api import models
+from api.auth.controller import create_access_token, verified_tokens
+from api.catalog import plant_cache
+from api.database import SessionLocal, engine
+from api.note_search import note_search
+from api.search import plant_search
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# bcrypt of "password", computed once: hashing takes a quarter of a second.
+PASSWORD = "password"
+_password_hash = None
+
+
+def migrate(url: str):
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    previous = os.environ["DB_URL"]
+    os.environ["DB_URL"] = url
+    try:
+        command.upgrade(config, "head")
+    finally:
+        os.environ["DB_URL"] = previous
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    migrate(os.environ["DB_URL"])
+    yield
+    engine.dispose()
+    shutil.rmtree(_tmp, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def clean(database):
+    # Tables emptied and per-process caches dropped, so every test starts from nothing.
+    yield
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            if table.name == "catalog_version":
+                conn.execute(update(table).values(version=0))
+            else:
+                conn.execute(delete(table))
+    plant_cache.invalidate()
+    plant_cache._version = None
+    plant_search.invalidate()
+    note_search.invalidate()
+    verified_tokens._entries.clear()
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def client():
+    from api.main import app
+    # Not entered as a context manager: the lifespan (warm-up, background writers) is
+    # left to the tests of api/startup.py, and waterings are written synchronously.
+    return TestClient(app)
+
+
+def password_hash() -> str:
+    global _password_hash
+    if _password_hash is None:
+        from api.auth.controller import get_hashed_password
+        _password_hash = get_hashed_password(PASSWORD)
+    return _password_hash
+
+
+class Account:
+    """A user with a default group, and the headers of a valid access token for them."""
+
+    def __init__(self, db, username: str):
+        now = datetime.datetime.utcnow()
+        self.username = username
+        self.id = db.execute(insert(models.User).values(
+            username=username, hashed_password=password_hash(), created_at=now, admin=False
+        ).returning(models.User.id)).scalar_one()
+        self.group_id = db.execute(insert(models.UserGroup).values(
+            name="", user_id=self.id, is_default=True, created_at=now
+        ).returning(models.UserGroup.id)).scalar_one()
+        db.commit()
+        self.headers = {"Authorization": f"Bearer {create_access_token({'username': username, 'id': self.id})}"}
+
+
+@pytest.fixture
+def make_account(db):
+    return lambda username: Account(db, username)
+
+
+@pytest.fixture
+def alice(make_account):
+    return make_account("alice")
+
+
+@pytest.fixture
+def bob(make_account):
+    return make_account("bob")
+
+
+@pytest.fixture
+def make_plant(db):
+    # Inserted directly, as another worker would: this process's caches do not see it.
+    def make(name: str, **values) -> int:
+        plant_id = db.execute(insert(models.Plant).values(name=name, created_at=datetime.datetime.utcnow(), **values)
+                              .returning(models.Plant.id)).scalar_one()
+        db.execute(update(models.CatalogVersion).values(version=models.CatalogVersion.version + 1))
+        db.commit()
+        return plant_id
+    return make
+
+
+@pytest.fixture
+def fern(make_plant):
+    return make_plant("Fern", scientific_name="Nephrolepis exaltata", watering_freq=1, watering_period="DAY")
+
+
+@pytest.fixture
+def make_user_plant(client):
+    # Through the route, so the version bumps and reminder notes happen as in production.
+    def make(account, plant_id: int, **values) -> int:
+        response = client.post("/api/userplants/create/", headers=account.headers,
+                               json={"plant_id": plant_id, "image_path": None, **values})
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+    return make
@@ -0,0 +1,63 @@
+import asyncio
+from api.admission import CHEAP, EXPENSIVE, WRITE, AdmissionController
+
+
+def controller(**overrides) -> AdmissionController:
+    options = dict(max_concurrency=1, user_concurrency=10, max_waiting=10, queue_timeout=1.0, target=10.0, interval=10.0)
+    return AdmissionController(**{**options, **overrides})
+
+
+def test_a_released_slot_goes_to_the_next_waiter():
+    async def scenario():
+        c = controller()
+        assert await c.acquire("GET /a", None, None, CHEAP) is None
+        waiter = asyncio.ensure_future(c.acquire("GET /a", None, None, CHEAP))
+        await asyncio.sleep(0)
+        assert c.waiting == 1
+        c.release("GET /a", None, 0.01)
+        assert await waiter is None
+        assert c.in_flight == 1
+    asyncio.run(scenario())
+
+
+def test_cheap_reads_go_ahead_of_writes_and_expensive_routes():
+    async def scenario():
+        c = controller()
+        await c.acquire("GET /a", None, None, CHEAP)
+        order = []
+
+        async def wait(name, priority):
+            assert await c.acquire(name, None, None, priority) is None
+            order.append(name)
+            c.release(name, None, 0.01)
+
+        tasks = [asyncio.ensure_future(wait(name, priority))
+                 for name, priority in (("POST /export", EXPENSIVE), ("POST /write", WRITE), ("GET /read", CHEAP))]
+        await asyncio.sleep(0)
+        c.release("GET /a", None, 0.01)
+        await asyncio.gather(*tasks)
+        assert order == ["GET /read", "POST /write", "POST /export"]
+    asyncio.run(scenario())
+
+
+def test_requests_past_the_queue_or_the_timeout_are_turned_away():
+    async def scenario():
+        c = controller(max_waiting=1, queue_timeout=0.05)
+        await c.acquire("GET /a", None, None, CHEAP)
+        waiter = asyncio.ensure_future(c.acquire("GET /a", None, None, CHEAP))
+        await asyncio.sleep(0)
+        assert await c.acquire("GET /a", None, None, CHEAP) == "queue_full"
+        assert await waiter == "timeout"
+        assert c.waiting == 0
+    asyncio.run(scenario())
+
+
+def test_user_and_route_limits():
+    async def scenario():
+        c = controller(max_concurrency=10, user_concurrency=1, queue_timeout=0.05)
+        assert await c.acquire("GET /a", None, "alice", CHEAP) is None
+        assert await c.acquire("GET /a", None, "bob", CHEAP) is None
+        assert await c.acquire("GET /a", None, "alice", CHEAP) == "timeout"
+        assert await c.acquire("POST /export", 1, None, EXPENSIVE) is None
+        assert await c.acquire("POST /export", 1, None, EXPENSIVE) == "timeout"
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+from api.auth.controller import create_refresh_token, verified_tokens
+
+
+def test_login_returns_tokens_that_authenticate(client, alice):
+    response = client.post("/api/auth/login/", data={"username": "alice", "password": "password"})
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+    me = client.get("/api/users/me/", headers={"Authorization": f"Bearer {token}"})
+    assert me.status_code == 200
+    assert me.json() == alice.id
+
+
+def test_login_rejects_a_wrong_password(client, alice):
+    response = client.post("/api/auth/login/", data={"username": "alice", "password": "wrong"})
+    assert response.status_code == 400
+
+
+def test_refresh_issues_a_new_access_token(client, alice):
+    refresh = create_refresh_token({"username": "alice", "id": alice.id})
+    response = client.get("/api/auth/refresh/", params={"token": refresh})
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+    assert client.get("/api/users/me/", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+
+def test_invalid_token_is_rejected(client):
+    response = client.get("/api/users/me/", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
+
+
+def test_verified_token_is_cached(client, alice):
+    token = alice.headers["Authorization"].removeprefix("Bearer ")
+    assert verified_tokens.get(token) is None
+    client.get("/api/users/me/", headers=alice.headers)
+    context = verified_tokens.get(token)
+    assert context is not None and context.id == alice.id
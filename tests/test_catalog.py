@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+from api import crud
+from api.catalog import PlantCatalogCache, plant_cache
+
+
+def plant(plant_id: int, name: str):
+    return SimpleNamespace(id=plant_id, name=name, scientific_name=None, type=None, watering_freq=None,
+                           watering_period=None, watering_time=None, sun_requirement=None, external_link=None)
+
+
+def test_full_catalog_pages_from_memory():
+    cache = PlantCatalogCache(max_size=10, ttl=60)
+    assert cache.load([plant(1, "Fern"), plant(2, "Aloe"), plant(3, "Moss")], cache.generation(), version=1)
+    assert [entry.plant.name for entry in cache.page(None, 2)] == ["Aloe", "Fern"]
+    assert [entry.plant.name for entry in cache.page(("Fern", 1), 2)] == ["Moss"]
+    assert cache.get(2).payload.startswith(b"{")
+
+
+def test_a_catalog_larger_than_the_cache_is_not_loaded():
+    cache = PlantCatalogCache(max_size=1, ttl=60)
+    assert not cache.load([plant(1, "Fern"), plant(2, "Aloe")], cache.generation(), version=1)
+    assert cache.page(None, 10) is None
+
+
+def test_a_snapshot_older_than_a_write_is_not_installed():
+    cache = PlantCatalogCache(max_size=10, ttl=60)
+    generation = cache.generation()
+    cache.invalidate(1)
+    assert not cache.load([plant(1, "Fern")], generation, version=1)
+
+
+def test_versions_only_move_forward():
+    cache = PlantCatalogCache(max_size=10, ttl=60)
+    cache.put([plant(1, "Fern")], version=2)
+    # Rows read at an older or unknown version are returned but not kept.
+    assert [entry.plant.name for entry in cache.put([plant(1, "Old fern")], version=1)] == ["Old fern"]
+    cache.put([plant(2, "Aloe")], version=None)
+    assert cache.get(1).plant.name == "Fern"
+    assert cache.get(2) is None
+    # A newer version drops everything cached before it.
+    cache.sync(3)
+    assert cache.get(1) is None
+
+
+def test_entries_expire():
+    cache = PlantCatalogCache(max_size=10, ttl=-1)
+    cache.put([plant(1, "Fern")], version=1)
+    assert cache.get(1) is None
+
+
+def test_least_recently_used_entries_go_first():
+    cache = PlantCatalogCache(max_size=2, ttl=60)
+    cache.put([plant(1, "Fern"), plant(2, "Aloe")], version=1)
+    cache.get(1)
+    cache.put([plant(3, "Moss")], version=1)
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+
+
+def test_pages_read_outside_a_request_carry_the_catalog_version(db, fern, make_plant, monkeypatch):
+    make_plant("Aloe")
+    monkeypatch.setattr(plant_cache, "max_size", 1)
+    page = crud.get_cached_plants(db, None, 1)
+    assert [entry.plant.name for entry in page["items"]] == ["Aloe"]
+    assert plant_cache._version == 2
@@ -0,0 +1,37 @@
+"""The awaitable crud functions with both kinds of session: a plain Session (run in the
+threadpool) and an AsyncSession on aiosqlite (run through run_sync)."""
+import asyncio
+import os
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from api import crud_async, schemas
+from api.database import SessionLocal
+
+
+def run_with(kind: str, work):
+    async def scenario():
+        if kind == "sync":
+            with SessionLocal() as db:
+                return await work(db)
+        engine = create_async_engine(os.environ["DB_ASYNC_URL"])
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                return await work(db)
+        finally:
+            await engine.dispose()
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_user_plant_round_trip(kind, alice, fern):
+    async def work(db):
+        created = await crud_async.create_user_plant(db, schemas.UserPlantBase(plant_id=fern, image_path=None), alice.id)
+        found = await crud_async.get_user_plant_by_id(db, created.id, alice.id)
+        hidden = await crud_async.get_user_plant_by_id(db, created.id, alice.id + 1)
+        versions = await crud_async.get_data_versions(db, alice.id)
+        return found, hidden, versions
+
+    found, hidden, (user_version, catalog_version) = run_with(kind, work)
+    assert found.plant_data.name == "Fern"
+    assert hidden is None
+    assert user_version >= 1 and catalog_version == 1
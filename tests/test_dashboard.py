@@ -0,0 +1,20 @@
+"""benchmarks/dashboard.py as a test: the dashboard's statement, row and byte budgets."""
+import pytest
+from benchmarks import dashboard
+from api import crud, models
+from api.database import engine
+
+
+@pytest.mark.parametrize("include_notes", [False, True])
+def test_dashboard_stays_within_its_budgets(db, client, include_notes):
+    plants, notes = 120, 4
+    user_id = dashboard.seed(db, plants, notes)
+    username = db.get(models.User, user_id).username
+    results = {
+        "dashboard": dashboard.measure(engine, lambda session: crud.get_dashboard(session, user_id, include_notes=include_notes)),
+        "route": dashboard.measure_route(client, user_id, username, include_notes),
+    }
+    limits = {**dashboard.budget(plants, notes, include_notes), "statements": dashboard.route_statement_budget()}
+    for measured in results.values():
+        for key, value in measured.items():
+            assert value <= limits[key], f"{key}: {value}, budget {limits[key]}"
@@ -0,0 +1,30 @@
+from sqlalchemy import delete
+from api import models
+from api.etag import _matches
+
+
+def test_if_none_match_uses_the_weak_comparison():
+    assert _matches('"c3"', '"c3"')
+    assert _matches('W/"c3"', '"c3"')
+    assert _matches('"c1", "c3"', '"c3"')
+    assert _matches("*", '"c3"')
+    assert not _matches('"c2"', '"c3"')
+    assert not _matches("", '"c3"')
+
+
+def test_catalog_etag_moves_with_catalog_writes(client, alice, fern, make_plant):
+    first = client.get("/api/plants/", headers=alice.headers)
+    assert client.get("/api/plants/", headers={**alice.headers, "If-None-Match": first.headers["etag"]}).status_code == 304
+    make_plant("Aloe")
+    second = client.get("/api/plants/", headers={**alice.headers, "If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert [plant["name"] for plant in second.json()["items"]] == ["Aloe", "Fern"]
+
+
+def test_a_deleted_users_token_is_a_401(client, alice, db):
+    db.execute(delete(models.UserGroup).where(models.UserGroup.user_id == alice.id))
+    db.execute(delete(models.User).where(models.User.id == alice.id))
+    db.commit()
+    response = client.get("/api/userplants/", headers=alice.headers)
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
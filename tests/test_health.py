@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+from api.main import app
+
+
+def test_healthz_follows_the_lifespan():
+    client = TestClient(app)
+    assert client.get("/healthz").status_code == 503
+    with client:
+        assert client.get("/healthz").json() == {"status": "ok"}
+    assert client.get("/healthz").status_code == 503
+
+
+def test_metrics_count_requests_by_route_template(client, alice, fern):
+    client.get(f"/api/plants/{fern}/", headers=alice.headers)
+    text = client.get("/metrics").text
+    assert 'http_requests_total{method="GET",route="/api/plants/{plant_id}/",status="200"}' in text
+    assert "db_queries_total" in text
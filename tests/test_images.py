@@ -0,0 +1,84 @@
+import io
+import os
+import shutil
+import pytest
+from PIL import Image
+from api import images
+
+
+def png(color: str = "green", size: int = 64) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (size, size), color).save(out, "PNG")
+    return out.getvalue()
+
+
+def stored_files() -> list[str]:
+    root = os.environ["IMAGE_STORAGE_DIR"]
+    return sorted(name for _, _, names in os.walk(root) for name in names) if os.path.isdir(root) else []
+
+
+@pytest.fixture(autouse=True)
+def storage():
+    yield
+    images.renderer.wait(timeout=60)
+    shutil.rmtree(os.environ["IMAGE_STORAGE_DIR"], ignore_errors=True)
+
+
+@pytest.fixture
+def plant(alice, fern, make_user_plant):
+    return make_user_plant(alice, fern)
+
+
+def test_upload_then_download(client, alice, plant):
+    body = png()
+    response = client.post(f"/api/userplants/{plant}/image/", headers=alice.headers, content=body)
+    assert response.status_code == 200
+    assert response.json()["bytes"] == len(body)
+    downloaded = client.get(f"/api/userplants/{plant}/image/", headers=alice.headers)
+    assert downloaded.status_code == 200
+    assert downloaded.headers["content-type"] == "image/png"
+    assert downloaded.content == body
+    assert client.get(f"/api/userplants/{plant}/", headers=alice.headers).json()["thumbnail_path"] is not None
+
+
+def test_download_honours_range_and_etag(client, alice, plant):
+    body = png()
+    client.post(f"/api/userplants/{plant}/image/", headers=alice.headers, content=body)
+    partial = client.get(f"/api/userplants/{plant}/image/", headers={**alice.headers, "Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.content == body[:10]
+    assert partial.headers["content-range"] == f"bytes 0-9/{len(body)}"
+    etag = partial.headers["etag"]
+    assert client.get(f"/api/userplants/{plant}/image/", headers={**alice.headers, "If-None-Match": etag}).status_code == 304
+
+
+def test_upload_for_someone_elses_plant_stores_nothing(client, bob, plant):
+    response = client.post(f"/api/userplants/{plant}/image/", headers=bob.headers, content=png())
+    assert response.status_code == 404
+    assert stored_files() == []
+    assert client.get(f"/api/userplants/{plant}/image/", headers=bob.headers).status_code == 404
+
+
+def test_upload_rejects_files_that_are_not_images(client, alice, plant):
+    response = client.post(f"/api/userplants/{plant}/image/", headers=alice.headers, content=b"%PDF-1.7 not an image at all")
+    assert response.status_code == 415
+    assert stored_files() == []
+
+
+def test_variants_are_rendered(client, alice, plant):
+    client.post(f"/api/userplants/{plant}/image/", headers=alice.headers, content=png(size=800))
+    images.renderer.wait(timeout=60)
+    thumbnail = client.get(f"/api/userplants/{plant}/image/", headers=alice.headers, params={"size": "thumbnail"})
+    assert thumbnail.headers["content-type"] == "image/jpeg"
+    with Image.open(io.BytesIO(thumbnail.content)) as image:
+        assert max(image.size) <= images.renderer.sizes["thumbnail"]
+
+
+def test_a_photo_uploaded_by_two_users_is_stored_once_and_not_disclosed(client, alice, bob, fern, make_user_plant, plant):
+    body = png()
+    first = client.post(f"/api/userplants/{plant}/image/", headers=alice.headers, content=body)
+    second = client.post(f"/api/userplants/{make_user_plant(bob, fern)}/image/", headers=bob.headers, content=body)
+    # Whether someone else already uploaded the photo is not the uploader's to learn.
+    assert first.json() == {"image_path": f"/api/userplants/{plant}/image/", "bytes": len(body)}
+    assert second.json().keys() == first.json().keys()
+    assert len([name for name in stored_files() if name.endswith(".png")]) == 1
@@ -0,0 +1,29 @@
+import datetime
+import pytest
+from fastapi import HTTPException
+from api.pagination import decode_cursor, encode_cursor, page
+
+
+def test_cursor_round_trip():
+    watered_at = datetime.datetime(2024, 5, 1, 8, 30)
+    assert decode_cursor(encode_cursor(watered_at, 7), datetime.datetime, int) == [watered_at, 7]
+    assert decode_cursor(encode_cursor("Fern", 3), str, int) == ["Fern", 3]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 at all!",
+    encode_cursor("Fern"),  # a value short
+    encode_cursor(3, "Fern"),  # values swapped
+    encode_cursor("Fern", True),  # bool is no id
+])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor, str, int)
+    assert e.value.status_code == 400
+
+
+def test_page_only_links_a_next_page_when_there_is_one():
+    assert page([1, 2], 2, lambda row: (row,)) == {"items": [1, 2], "next_cursor": None}
+    result = page([1, 2, 3], 2, lambda row: (row,))
+    assert result["items"] == [1, 2]
+    assert decode_cursor(result["next_cursor"], int) == [2]
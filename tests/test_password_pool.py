@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from api.auth.password_pool import PasswordWorkerPool
+
+
+def blocker():
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+        return "done"
+    return work, started, release
+
+
+async def until(event: threading.Event):
+    while not event.is_set():
+        await asyncio.sleep(0.001)
+
+
+def test_calls_run_off_the_event_loop():
+    async def scenario():
+        pool = PasswordWorkerPool(workers=2, queue_timeout=1.0, max_waiting=10)
+        try:
+            assert await pool.run(threading.current_thread) is not threading.current_thread()
+        finally:
+            pool.shutdown()
+    asyncio.run(scenario())
+
+
+def test_callers_past_max_waiting_are_rejected():
+    async def scenario():
+        pool = PasswordWorkerPool(workers=1, queue_timeout=5.0, max_waiting=1)
+        work, started, release = blocker()
+        running = asyncio.ensure_future(pool.run(work))
+        await until(started)
+        waiting = asyncio.ensure_future(pool.run(str, 1))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await pool.run(str, 2)
+        assert rejected.value.status_code == 503
+        release.set()
+        assert (await running, await waiting) == ("done", "1")
+        pool.shutdown()
+    asyncio.run(scenario())
+
+
+def test_a_timed_out_waiter_does_not_keep_a_slot():
+    async def scenario():
+        pool = PasswordWorkerPool(workers=1, queue_timeout=0.01, max_waiting=10)
+        work, started, release = blocker()
+        running = asyncio.ensure_future(pool.run(work))
+        await until(started)
+        with pytest.raises(HTTPException) as rejected:
+            await pool.run(str, 1)
+        assert rejected.value.headers["Retry-After"] == "1"
+        release.set()
+        await running
+        assert not pool._slots.locked() and pool._waiting == 0
+        pool.shutdown()
+    asyncio.run(scenario())
+
+
+def test_a_slot_handed_to_a_cancelled_waiter_is_given_back():
+    async def scenario():
+        pool = PasswordWorkerPool(workers=1, queue_timeout=5.0, max_waiting=10)
+        slots = pool._slots
+        await slots.acquire()
+        waiter = asyncio.ensure_future(pool.run(str, 1))
+        await asyncio.sleep(0.01)
+        # The slot goes to the waiting acquire, and its caller is cancelled before it
+        # gets to run.
+        slots.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0.01)
+        assert not slots.locked()
+        pool.shutdown()
+    asyncio.run(scenario())
+
+
+def test_calls_running_across_shutdown_release_their_own_semaphore():
+    async def scenario():
+        pool = PasswordWorkerPool(workers=1, queue_timeout=1.0, max_waiting=10)
+        work, started, release = blocker()
+        running = asyncio.ensure_future(pool.run(work))
+        await until(started)
+        pool.shutdown()
+        release.set()
+        assert await running == "done"
+        # The new semaphore still has exactly one slot.
+        await pool._slots.acquire()
+        assert pool._slots.locked()
+        pool.shutdown()
+    asyncio.run(scenario())
@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+import pytest
+from api.catalog import plant_cache
+
+
+def test_create_and_get_plant(client, alice):
+    created = client.post("/api/plants/create/", headers=alice.headers,
+                          json={"name": "Monstera", "scientific_name": "Monstera deliciosa", "watering_freq": 1, "watering_period": "WEEK"})
+    assert created.status_code == 200
+    plant_id = created.json()["id"]
+    fetched = client.get(f"/api/plants/{plant_id}/", headers=alice.headers)
+    assert fetched.status_code == 200
+    assert fetched.json()["scientific_name"] == "Monstera deliciosa"
+    assert client.get(f"/api/plants/{plant_id + 100}/", headers=alice.headers).status_code == 404
+
+
+def test_duplicate_scientific_name_is_a_409(client, alice, fern):
+    duplicate = {"name": "Boston fern", "scientific_name": "Nephrolepis exaltata"}
+    assert client.post("/api/plants/create/", headers=alice.headers, json=duplicate).status_code == 409
+    other = client.post("/api/plants/create/", headers=alice.headers, json={"name": "Pothos", "scientific_name": "Epipremnum aureum"}).json()
+    assert client.post("/api/plants/update/", headers=alice.headers, json={**duplicate, "id": other["id"]}).status_code == 409
+
+
+def test_empty_scientific_names_do_not_collide(client, alice):
+    for name in ("Unknown 1", "Unknown 2"):
+        response = client.post("/api/plants/create/", headers=alice.headers, json={"name": name, "scientific_name": ""})
+        assert response.status_code == 200
+        assert response.json()["scientific_name"] is None
+
+
+def test_update_is_seen_by_the_next_read(client, alice, fern):
+    assert client.get(f"/api/plants/{fern}/", headers=alice.headers).json()["name"] == "Fern"
+    response = client.post("/api/plants/update/", headers=alice.headers, json={"id": fern, "name": "Sword fern"})
+    assert response.status_code == 200
+    assert client.get(f"/api/plants/{fern}/", headers=alice.headers).json()["name"] == "Sword fern"
+
+
+def test_updating_a_missing_plant_is_a_404_and_changes_nothing(client, alice, fern):
+    etag = client.get("/api/plants/", headers=alice.headers).headers["etag"]
+    response = client.post("/api/plants/update/", headers=alice.headers, json={"id": fern + 1, "name": "Ghost"})
+    assert response.status_code == 404
+    assert client.get("/api/plants/", headers={**alice.headers, "If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.parametrize("cache_size", [100, 1])
+def test_catalog_is_paged_in_name_order(client, alice, make_plant, monkeypatch, cache_size):
+    # A catalog larger than the cache is paged through the database.
+    monkeypatch.setattr(plant_cache, "max_size", cache_size)
+    for name in ("Cactus", "Aloe", "Basil"):
+        make_plant(name)
+    first = client.get("/api/plants/", headers=alice.headers, params={"limit": 2}).json()
+    assert [plant["name"] for plant in first["items"]] == ["Aloe", "Basil"]
+    second = client.get("/api/plants/", headers=alice.headers, params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [plant["name"] for plant in second["items"]] == ["Cactus"]
+    assert second["next_cursor"] is None
+
+
+def test_catalog_answers_304_until_it_changes(client, alice, fern, make_plant):
+    first = client.get("/api/plants/", headers=alice.headers)
+    etag = first.headers["etag"]
+    assert client.get("/api/plants/", headers={**alice.headers, "If-None-Match": etag}).status_code == 304
+    make_plant("Cactus")
+    changed = client.get("/api/plants/", headers={**alice.headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [plant["name"] for plant in changed.json()["items"]] == ["Cactus", "Fern"]
+
+
+def test_search_finds_names_by_prefix_and_misspelling(client, alice, fern, make_plant):
+    make_plant("Fiddle leaf fig", scientific_name="Ficus lyrata")
+    make_plant("Snake plant", scientific_name="Dracaena trifasciata")
+    by_prefix = client.get("/api/plants/search/", headers=alice.headers, params={"q": "fic"}).json()
+    assert [plant["name"] for plant in by_prefix] == ["Fiddle leaf fig"]
+    misspelled = client.get("/api/plants/search/", headers=alice.headers, params={"q": "dracena"}).json()
+    assert [plant["name"] for plant in misspelled] == ["Snake plant"]
+
+
+def test_import_upserts_on_scientific_name(client, alice, fern):
+    body = "\n".join(json.dumps(row) for row in [
+        {"name": "Boston fern", "scientific_name": "Nephrolepis exaltata"},
+        {"name": "Pothos", "scientific_name": "Epipremnum aureum"},
+    ])
+    response = client.post("/api/plants/import/", headers={**alice.headers, "Content-Type": "application/x-ndjson"}, content=body)
+    assert response.status_code == 200
+    assert response.json() == {"rows": 2}
+    names = [plant["name"] for plant in client.get("/api/plants/", headers=alice.headers).json()["items"]]
+    assert names == ["Boston fern", "Pothos"]
+
+
+def test_import_rejects_an_invalid_row_and_keeps_nothing(client, alice):
+    body = "name,scientific_name,watering_freq\nPothos,Epipremnum aureum,1\nAloe,Aloe vera,often\n"
+    response = client.post("/api/plants/import/", headers={**alice.headers, "Content-Type": "text/csv"}, content=body)
+    assert response.status_code == 422
+    assert "line 3" in response.json()["detail"]
+    assert client.get("/api/plants/", headers=alice.headers).json()["items"] == []
+
+
+def test_export_round_trips_as_csv(client, alice, fern):
+    response = client.get("/api/plants/export/", headers=alice.headers, params={"format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["id"], row["name"], row["watering_period"]) for row in rows] == [(str(fern), "Fern", "DAY")]
@@ -0,0 +1,95 @@
+import logging
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from api import metrics, query_budget as budgets
+from api.database import SessionLocal
+from api.query_budget import QueryBudgetExceeded, query_budget
+
+
+def run(*statements: str):
+    with SessionLocal() as db:
+        for statement in statements:
+            db.execute(text(statement))
+
+
+app = FastAPI()
+app.add_middleware(budgets.QueryBudgetMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.get("/within/", dependencies=[Depends(query_budget(2))])
+def within():
+    run("SELECT 1", "SELECT 2")
+    return {}
+
+
+@app.get("/over/", dependencies=[Depends(query_budget(1))])
+def over():
+    run("SELECT 1", "SELECT 2", "SELECT 3")
+    return {}
+
+
+@app.get("/repeated/", dependencies=[Depends(query_budget(10, max_repeats=2))])
+def repeated():
+    # What a lazy load in a loop looks like.
+    run(*["SELECT 1"] * 3)
+    return {}
+
+
+@app.get("/streamed/", dependencies=[Depends(query_budget(1))])
+def streamed():
+    def body():
+        yield b"["
+        run("SELECT 1", "SELECT 2")
+        yield b"]"
+    return StreamingResponse(body())
+
+
+@app.get("/unbudgeted/")
+def unbudgeted():
+    return {}
+
+
+client = TestClient(app)
+
+
+def test_a_route_within_its_budget_is_served():
+    assert client.get("/within/").status_code == 200
+
+
+def test_a_route_over_its_budget_answers_500():
+    response = client.get("/over/")
+    assert response.status_code == 500
+    assert "ran 3 SQL statements, the budget is 1" in response.text
+
+
+def test_a_repeated_statement_is_reported_as_n_plus_one():
+    response = client.get("/repeated/")
+    assert response.status_code == 500
+    assert "ran the same statement 3 times (N+1?): SELECT 1" in response.text
+
+
+def test_a_streamed_body_over_budget_raises():
+    with pytest.raises(QueryBudgetExceeded, match="ran 2 SQL statements"):
+        client.get("/streamed/")
+
+
+def test_log_mode_serves_the_response_and_logs(monkeypatch, caplog):
+    monkeypatch.setattr(budgets, "QUERY_BUDGET_MODE", "log")
+    with caplog.at_level(logging.WARNING, logger="api.query_budget"):
+        assert client.get("/over/").status_code == 200
+    assert "GET /over/ ran 3 SQL statements, the budget is 1" in caplog.text
+
+
+def test_routes_without_a_budget_are_refused_in_raise_mode():
+    assert budgets.unbudgeted_routes(app) == ["GET /unbudgeted/"]
+    with pytest.raises(QueryBudgetExceeded, match="GET /unbudgeted/"):
+        budgets.check_routes(app)
+
+
+def test_every_app_route_has_a_budget():
+    from api.main import app as api_app
+    assert budgets.unbudgeted_routes(api_app) == []
@@ -0,0 +1,10 @@
+"""benchmarks/query_plans.py as a test: fails when a crud query reads a table in full."""
+import json
+from benchmarks import query_plans
+
+
+def test_crud_queries_use_indexes():
+    report = query_plans.run(users=300, plants_per_user=10, catalog=3000)
+    failing = [check for check in report["checks"] if any(statement["full_scans"] for statement in check["statements"])]
+    assert report["failures"] == 0, json.dumps(failing, indent=2)
+    assert all(check["statements"] for check in report["checks"])
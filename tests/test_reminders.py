@@ -0,0 +1,166 @@
+import datetime
+import time
+import numpy as np
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from api import crud, reminders
+from api.database import SessionLocal
+from api.reminders import RecordingSender, ReminderSchedule, ReminderScheduler, ReminderSender, load_sender
+
+DAY = 24 * 60 * 60
+
+
+def utc(seconds: float) -> datetime.datetime:
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=seconds)
+
+
+def daily_schedule() -> ReminderSchedule:
+    # Plant 1 is watered daily, plant 2 has no schedule.
+    s = ReminderSchedule(tick=60, repeat=DAY)
+    s.set_plants([(1, 1, "DAY", None), (2, None, None, None)], replace=True)
+    return s
+
+
+def test_plants_never_watered_are_due_from_when_they_were_added():
+    s = daily_schedule()
+    now = time.time()
+    s.add([(10, 7, 1, None, utc(now - 60)), (11, 7, 1, None, utc(now + DAY)), (12, 7, 2, None, utc(now - 60))])
+    assert len(s) == 2  # no reminders for plant 2
+    assert s.pop_due(now).tolist() == [10]
+    # Popped, so not again until it is rescheduled.
+    assert s.pop_due(now + 60).tolist() == []
+    assert s.pop_due(now + DAY + 60).tolist() == [11]
+
+
+def test_watering_and_removal_reschedule():
+    s = daily_schedule()
+    now = time.time()
+    s.add([(10, 7, 1, None, utc(now - DAY)), (11, 7, 1, None, utc(now - DAY))])
+    s.watered_at([(10, utc(now))])
+    s.remove([11])
+    assert (s.remind_at[10], s.remind_at[11]) == (pytest.approx(now + DAY), np.inf)
+    # The plants' old slots still hold them, but they are no longer due there.
+    assert s.pop_due(now).tolist() == []
+    assert s.pop_due(now + DAY).tolist() == [10]
+    # An older watering than the one known changes nothing.
+    s.watered_at([(10, utc(now - DAY))])
+    assert s.remind_at[10] == pytest.approx(now + DAY)
+
+
+def test_a_changed_catalog_schedule_reschedules_its_plants():
+    s = daily_schedule()
+    now = time.time()
+    s.add([(10, 7, 1, utc(now), utc(now - DAY))])
+    s.set_plants([(1, 2, "DAY", None)])
+    assert s.remind_at[10] == pytest.approx(now + 2 * DAY)
+    s.set_plants([(1, None, None, None)])
+    assert len(s) == 0
+
+
+def test_user_plants_of_unknown_plants_mark_the_catalog_stale():
+    s = daily_schedule()
+    s.add([(10, 7, 3, None, utc(time.time()))])
+    assert s.catalog_stale
+
+
+def test_a_reminder_is_sent_once_per_repeat(alice, bob, fern, make_user_plant):
+    first = make_user_plant(alice, fern)
+    second = make_user_plant(alice, fern)
+    theirs = make_user_plant(bob, fern)
+    scheduler = ReminderScheduler(ReminderSchedule(tick=60, repeat=DAY), SessionLocal, RecordingSender())
+    scheduler.load()
+    now = time.time() + 60
+    sent = {reminder.user_id: [plant_id for plant_id, _ in reminder.plants] for reminder in scheduler.run_once(now)}
+    assert sent == {alice.id: [first, second], bob.id: [theirs]}
+    assert scheduler.sender.take() and scheduler.run_once(now + 60) == []
+    assert {reminder.user_id for reminder in scheduler.run_once(now + DAY + 60)} == {alice.id, bob.id}
+
+
+def test_plants_created_after_startup_are_caught_up(alice, fern, make_user_plant):
+    scheduler = ReminderScheduler(ReminderSchedule(tick=60, repeat=DAY), SessionLocal, RecordingSender())
+    scheduler.load()
+    assert len(scheduler.schedule) == 0
+    # Created by any worker, without this process's schedule being told.
+    plant_id = make_user_plant(alice, fern)
+    [reminder] = scheduler.run_once(time.time() + 60)
+    assert [plant_id for plant_id, _ in reminder.plants] == [plant_id]
+
+
+def test_plants_watered_or_deleted_elsewhere_are_not_reminded(client, alice, fern, make_user_plant):
+    watered = make_user_plant(alice, fern)
+    deleted = make_user_plant(alice, fern)
+    scheduler = ReminderScheduler(ReminderSchedule(tick=60, repeat=DAY), SessionLocal, RecordingSender())
+    scheduler.load()
+    # Through the routes, with this process's schedule not told: the due plants are
+    # read again before they are sent.
+    client.post("/api/userplants/water/", headers=alice.headers, json={"plant_ids": [watered]})
+    client.delete(f"/api/userplants/{deleted}/delete/", headers=alice.headers)
+    assert scheduler.run_once(time.time() + 60) == []
+    assert scheduler.schedule.user_id[deleted] == 0
+    assert scheduler.schedule.remind_at[watered] > time.time() + DAY - 60
+
+
+def test_a_failed_send_is_retried_on_the_next_tick(alice, fern, make_user_plant):
+    class FailingOnce(RecordingSender):
+        failed = False
+
+        def send(self, reminders):
+            if not self.failed:
+                self.failed = True
+                raise ConnectionError("push service down")
+            super().send(reminders)
+
+    make_user_plant(alice, fern)
+    scheduler = ReminderScheduler(ReminderSchedule(tick=60, repeat=DAY), SessionLocal, FailingOnce())
+    scheduler.load()
+    now = time.time() + 60
+    assert scheduler.run_once(now) == []
+    assert len(scheduler.run_once(now + 60)) == 1
+
+
+@pytest.fixture
+def reminder_schedule(monkeypatch):
+    # As with REMINDERS_ENABLED set: crud notes its writes and the schedule is updated as
+    # they commit.
+    s = ReminderSchedule(tick=60, repeat=DAY)
+    monkeypatch.setattr(crud, "REMINDERS_ENABLED", True)
+    monkeypatch.setattr(reminders, "reminder_schedule", s)
+    event.listen(Session, "after_commit", reminders._after_commit)
+    event.listen(Session, "after_rollback", reminders._after_rollback)
+    yield s
+    event.remove(Session, "after_commit", reminders._after_commit)
+    event.remove(Session, "after_rollback", reminders._after_rollback)
+
+
+def test_committed_writes_update_the_schedule(client, db, alice, fern, make_user_plant, reminder_schedule):
+    reminder_schedule.set_plants(crud.get_watering_plans(db), replace=True)
+    watered = make_user_plant(alice, fern)
+    deleted = make_user_plant(alice, fern)
+    assert len(reminder_schedule) == 2
+    client.post("/api/userplants/water/", headers=alice.headers, json={"plant_ids": [watered]})
+    assert reminder_schedule.remind_at[watered] > time.time() + DAY - 60
+    client.delete(f"/api/userplants/{deleted}/delete/", headers=alice.headers)
+    assert len(reminder_schedule) == 1 and reminder_schedule.user_id[deleted] == 0
+
+
+def test_rolled_back_writes_do_not_reach_the_schedule(db, reminder_schedule):
+    crud.get_catalog_version(db)  # a transaction to roll back
+    crud._note_reminder_change(db, "catalog")
+    db.rollback()
+    assert "reminder_changes" not in db.info and not reminder_schedule.catalog_stale
+    crud._note_reminder_change(db, "catalog")
+    db.commit()
+    assert reminder_schedule.catalog_stale
+
+
+def test_senders_must_implement_send():
+    with pytest.raises(TypeError):
+        ReminderSender()
+
+    class Incomplete(ReminderSender):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    assert isinstance(load_sender("api.reminders.RecordingSender"), RecordingSender)
@@ -0,0 +1,89 @@
+import asyncio
+import types
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from api import database, replicas
+from api.replicas import RecentWrites, ReplicaSet
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(replicas, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_candidates_rotate_over_the_replicas(clock):
+    replica_set = ReplicaSet(["a", "b", "c"], [None] * 3, retry_after=10)
+    assert [replica_set.candidates() for _ in range(4)] == [[0, 1, 2], [1, 2, 0], [2, 0, 1], [0, 1, 2]]
+
+
+def test_a_replica_marked_down_is_skipped_until_the_retry_time(clock):
+    replica_set = ReplicaSet(["a", "b"], [None] * 2, retry_after=10)
+    replica_set.mark_down(0)
+    assert not replica_set.is_up(0)
+    assert {tuple(replica_set.candidates()) for _ in range(3)} == {(1,)}
+    replica_set.mark_down(1)
+    assert replica_set.candidates() == []
+    clock.now += 10
+    assert sorted(replica_set.candidates()) == [0, 1]
+
+
+def test_reads_stay_on_the_primary_after_a_users_own_write(clock):
+    writes = RecentWrites(window=5)
+    writes.record([1], catalog=False)
+    assert writes.recent(1) and not writes.recent(2)
+    clock.now += 5
+    assert not writes.recent(1)
+
+
+def test_a_catalog_write_keeps_every_user_on_the_primary(clock):
+    writes = RecentWrites(window=5)
+    writes.record([], catalog=True)
+    assert writes.recent(1) and writes.recent(2)
+    clock.now += 5
+    assert not writes.recent(1)
+
+
+def test_old_writes_are_pruned_past_max_users(clock):
+    writes = RecentWrites(window=5)
+    writes.max_users = 2
+    writes.record([1, 2], catalog=False)
+    clock.now += 5
+    writes.record([3], catalog=False)
+    assert list(writes._users) == [3]
+
+
+def test_get_read_db_falls_back_to_the_primary(tmp_path, monkeypatch, clock):
+    # A replica whose database directory does not exist cannot be connected to.
+    unreachable = create_engine(f"sqlite:///{tmp_path}/missing/replica.db")
+    replica_set = ReplicaSet(["replica-0"], [sessionmaker(bind=unreachable)], retry_after=10)
+    monkeypatch.setattr(replicas, "replica_set", replica_set)
+
+    async def scenario():
+        sessions = replicas.get_read_db(1)
+        db = await sessions.__anext__()
+        try:
+            assert db.get_bind() is database.engine
+        finally:
+            await sessions.aclose()
+    asyncio.run(scenario())
+    assert not replica_set.is_up(0)
+
+
+def test_get_read_db_uses_a_reachable_replica_unless_the_user_just_wrote(tmp_path, monkeypatch, clock):
+    replica = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    monkeypatch.setattr(replicas, "replica_set", ReplicaSet(["replica-0"], [sessionmaker(bind=replica)], retry_after=10))
+    monkeypatch.setattr(replicas, "recent_writes", RecentWrites(window=5))
+
+    async def bind(user_id):
+        sessions = replicas.get_read_db(user_id)
+        db = await sessions.__anext__()
+        await sessions.aclose()
+        return db.get_bind()
+
+    assert asyncio.run(bind(1)) is replica
+    replicas.recent_writes.record([1], catalog=False)
+    assert asyncio.run(bind(1)) is database.engine
+    assert asyncio.run(bind(2)) is replica
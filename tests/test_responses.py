@@ -0,0 +1,74 @@
+from typing import Optional
+import pytest
+from fastapi import APIRouter, Depends, FastAPI, Response
+from fastapi.exceptions import ResponseValidationError
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from api.responses import JSONBytesResponse, JSONBytesRoute
+
+
+class Item(BaseModel):
+    id: int
+    name: Optional[str] = None
+
+
+def tag(response: Response):
+    response.headers["ETag"] = '"v1"'
+
+
+router = APIRouter(route_class=JSONBytesRoute)
+
+
+@router.get("/items/", response_model=list[Item], response_model_exclude_unset=True, dependencies=[Depends(tag)])
+async def items():
+    return [{"id": 1}, Item(id=2, name="Fern")]
+
+
+@router.post("/items/", response_model=Item, status_code=201)
+def create_item(item: Item, response: Response):
+    response.headers["Location"] = f"/items/{item.id}"
+    return item
+
+
+@router.get("/broken/", response_model=Item)
+async def broken():
+    return {"name": "no id"}
+
+
+@router.get("/raw/", response_model=Item)
+async def raw():
+    return Response(b"as is", media_type="text/plain")
+
+
+app = FastAPI(default_response_class=JSONBytesResponse)
+app.include_router(router)
+client = TestClient(app)
+
+
+def test_validated_and_dumped_with_the_route_options():
+    response = client.get("/items/")
+    assert response.content == b'[{"id":1},{"id":2,"name":"Fern"}]'
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["etag"] == '"v1"'
+
+
+def test_sync_endpoints_keep_their_status_code_and_headers():
+    response = client.post("/items/", json={"id": 3, "name": "Aloe"})
+    assert response.status_code == 201
+    assert response.headers["location"] == "/items/3"
+    assert response.json() == {"id": 3, "name": "Aloe"}
+
+
+def test_an_invalid_return_value_is_a_response_validation_error():
+    with pytest.raises(ResponseValidationError):
+        client.get("/broken/")
+
+
+def test_responses_returned_by_the_endpoint_pass_through():
+    assert client.get("/raw/").content == b"as is"
+
+
+def test_the_schema_is_unchanged():
+    operation = app.openapi()["paths"]["/items/"]["post"]
+    assert [parameter["name"] for parameter in operation.get("parameters", [])] == []
+    assert operation["responses"]["201"]["content"]["application/json"]["schema"] == {"$ref": "#/components/schemas/Item"}
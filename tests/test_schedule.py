@@ -0,0 +1,39 @@
+import datetime
+import numpy as np
+from api import schedule
+from api.schemas import WateringFrequencyPeriodType, WateringTimeType
+
+DAY = schedule.DAY_SECONDS
+CREATED = datetime.datetime(2024, 1, 1)
+
+
+def epoch(value: datetime.datetime) -> float:
+    return (value - schedule.EPOCH).total_seconds()
+
+
+def test_next_due_per_plant():
+    watered = datetime.datetime(2024, 3, 10, 17, 45)
+    columns = schedule.build_columns([
+        (1, 1, None, CREATED, 2, WateringFrequencyPeriodType.DAY, None),  # never watered: due when added
+        (2, 1, watered, CREATED, 3, WateringFrequencyPeriodType.HOUR, WateringTimeType.MORNING),  # hourly: not aligned
+        (3, 1, watered, CREATED, 1, WateringFrequencyPeriodType.WEEK, WateringTimeType.MORNING),  # aligned to 8:00
+        (4, 1, watered, CREATED, 2, WateringFrequencyPeriodType.DAY, None),
+    ])
+    plan = schedule.compute_schedule(columns, now=epoch(watered))
+    assert schedule.from_epoch(plan.next_due[0]) == CREATED
+    assert schedule.from_epoch(plan.next_due[1]) == watered + datetime.timedelta(hours=3)
+    assert schedule.from_epoch(plan.next_due[2]) == datetime.datetime(2024, 3, 17, 8)
+    assert schedule.from_epoch(plan.next_due[3]) == watered + datetime.timedelta(days=2)
+
+
+def test_due_order_is_most_overdue_first():
+    plan = schedule.Schedule(next_due=np.array([5 * DAY, 1 * DAY, 3 * DAY, 9 * DAY]), overdue=np.zeros(4))
+    assert schedule.due_order(plan, now=6 * DAY).tolist() == [1, 2, 0]
+    assert schedule.due_order(plan, now=6 * DAY, limit=2).tolist() == [1, 2]
+    assert schedule.due_order(plan, now=6 * DAY, within=3 * DAY).tolist() == [1, 2, 0, 3]
+
+
+def test_no_plants():
+    columns = schedule.build_columns([])
+    assert schedule.due_order(schedule.compute_schedule(columns, 0.0), 0.0).tolist() == []
+    assert schedule.from_epoch(np.nan) is None
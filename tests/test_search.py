@@ -0,0 +1,59 @@
+import pytest
+from api.search import PlantSearchIndex, one_edit
+
+PLANTS = [
+    (1, "Fern", "Nephrolepis exaltata"),
+    (2, "Boston fern", None),
+    (3, "Fig", "Ficus carica"),
+    (4, "Monstera", "Monstera deliciosa"),
+    (5, "Aloe", "Aloe vera"),
+]
+
+
+@pytest.fixture
+def index():
+    index = PlantSearchIndex(ttl=60)
+    assert index.load(PLANTS, index.generation())
+    return index
+
+
+def test_exact_and_prefix_matches(index):
+    # Equal scores are ranked by name.
+    assert index.search("fern", 10) == [2, 1]
+    assert index.search("mon", 10) == [4]
+    assert index.search("fi", 10) == [3]
+
+
+def test_misspelt_long_words_match_by_trigrams(index):
+    assert index.search("mnstera", 10) == [4]
+
+
+@pytest.mark.parametrize("query", ["frn", "fen", "ferm", "fernn"])
+def test_short_words_one_edit_away_match(index, query):
+    # Trigram similarity alone misses these (frn and fern: 0.29).
+    assert index.search(query, 10) == [2, 1]
+
+
+def test_transpositions_of_short_words_are_two_edits(index):
+    assert index.search("fren", 10) == []
+
+
+def test_unrelated_and_very_short_words_match_nothing(index):
+    assert index.search("xyz", 10) == []
+    assert index.search("zz", 10) == []
+
+
+def test_writes_show_up_without_a_rebuild(index):
+    index.put([type("Plant", (), {"id": 6, "name": "Frond", "scientific_name": None})])
+    assert index.search("frond", 10) == [6]
+    index.remove(6)
+    assert index.search("frond", 10) == []
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("frn", "fern", True), ("fern", "fren", False), ("fern", "ferm", True), ("fern", "fer", True),
+    ("fern", "fern", True), ("fern", "fernery", False), ("ab", "ba", False),
+])
+def test_one_edit(a, b, expected):
+    assert one_edit(a, b) == expected
+    assert one_edit(b, a) == expected
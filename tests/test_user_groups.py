@@ -0,0 +1,17 @@
+def test_create_and_rename_group(client, alice):
+    created = client.post("/api/usergroups/create/", headers=alice.headers, json={"name": "Balcony", "is_default": False})
+    assert created.status_code == 200
+    group_id = created.json()["id"]
+    assert client.post(f"/api/usergroups/{group_id}/update/", headers=alice.headers, json={"name": "Terrace"}).status_code == 200
+    names = [group["name"] for group in client.get("/api/userplants/", headers=alice.headers).json()]
+    assert "Terrace" in names
+
+
+def test_second_default_group_is_refused(client, alice):
+    response = client.post("/api/usergroups/create/", headers=alice.headers, json={"name": "Other", "is_default": True})
+    assert response.status_code == 400
+
+
+def test_renaming_someone_elses_group_is_a_404(client, alice, bob):
+    response = client.post(f"/api/usergroups/{alice.group_id}/update/", headers=bob.headers, json={"name": "Mine"})
+    assert response.status_code == 404
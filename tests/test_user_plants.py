@@ -0,0 +1,148 @@
+import json
+from api import crud
+
+
+def test_create_shows_on_the_dashboard_in_the_default_group(client, alice, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern, nickname="Fernando")
+    groups = client.get("/api/userplants/", headers=alice.headers).json()
+    assert [group["id"] for group in groups] == [alice.group_id]
+    [plant] = groups[0]["plants"]
+    assert (plant["id"], plant["nickname"], plant["plant_data"]["name"]) == (plant_id, "Fernando", "Fern")
+    assert "note_data" not in plant
+
+
+def test_dashboard_includes_notes_on_request(client, alice, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern)
+    client.post(f"/api/userplants/{plant_id}/notes/", headers=alice.headers, json={"note": "New leaf"})
+    [group] = client.get("/api/userplants/", headers=alice.headers, params={"include_notes": True}).json()
+    assert [note["note"] for note in group["plants"][0]["note_data"]] == ["New leaf"]
+
+
+def test_user_plants_are_private(client, alice, bob, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern)
+    assert client.get(f"/api/userplants/{plant_id}/", headers=bob.headers).status_code == 404
+    assert client.post(f"/api/userplants/{plant_id}/update/", headers=bob.headers, json={"nickname": "Mine"}).status_code == 404
+    assert client.get(f"/api/userplants/{plant_id}/", headers=alice.headers).json()["nickname"] is None
+
+
+def test_update_user_plant(client, alice, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern)
+    response = client.post(f"/api/userplants/{plant_id}/update/", headers=alice.headers, json={"nickname": "Fernando", "count": 3})
+    assert response.status_code == 200
+    assert (response.json()["nickname"], response.json()["count"]) == ("Fernando", 3)
+
+
+def test_graveyard_lists_only_deleted_plants(client, alice, fern, make_user_plant):
+    assert client.get("/api/userplants/graveyard/", headers=alice.headers).json() == []
+    kept = make_user_plant(alice, fern, nickname="kept")
+    deleted = make_user_plant(alice, fern, nickname="deleted")
+    assert client.delete(f"/api/userplants/{deleted}/delete/", headers=alice.headers).status_code == 200
+    graveyard = client.get("/api/userplants/graveyard/", headers=alice.headers).json()
+    assert [plant["id"] for plant in graveyard] == [deleted]
+    [group] = client.get("/api/userplants/", headers=alice.headers).json()
+    assert [plant["id"] for plant in group["plants"]] == [kept]
+
+
+def test_watering_is_logged_and_paged(client, alice, bob, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern)
+    for _ in range(3):
+        response = client.post("/api/userplants/water/", headers=alice.headers, json={"plant_ids": [plant_id]})
+        assert response.json() == {"plants_watered": {"plant_ids": [plant_id]}}
+    # Someone else's plant is not watered.
+    assert client.post("/api/userplants/water/", headers=bob.headers, json={"plant_ids": [plant_id]}).json() == {"plants_watered": {"plant_ids": []}}
+    first = client.get(f"/api/userplants/{plant_id}/waterings/", headers=alice.headers, params={"limit": 2}).json()
+    second = client.get(f"/api/userplants/{plant_id}/waterings/", headers=alice.headers, params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    events = first["items"] + second["items"]
+    assert len(events) == 3 and second["next_cursor"] is None
+    assert [event["watered_at"] for event in events] == sorted((event["watered_at"] for event in events), reverse=True)
+    assert client.get(f"/api/userplants/{plant_id}/", headers=alice.headers).json()["last_watered"] == events[0]["watered_at"]
+
+
+def test_due_lists_unwatered_plants_with_a_schedule(client, alice, fern, make_plant, make_user_plant):
+    thirsty = make_user_plant(alice, fern)
+    make_user_plant(alice, make_plant("Plastic plant"))
+    watered = make_user_plant(alice, fern)
+    client.post("/api/userplants/water/", headers=alice.headers, json={"plant_ids": [watered]})
+    due = client.get("/api/userplants/due/", headers=alice.headers).json()
+    assert [plant["id"] for plant in due] == [thirsty]
+    assert due[0]["overdue_seconds"] >= 0
+    soon = client.get("/api/userplants/due/", headers=alice.headers, params={"within_hours": 25}).json()
+    assert {plant["id"] for plant in soon} == {thirsty, watered}
+
+
+def test_batch_applies_all_operations_or_none(client, alice, fern, make_user_plant):
+    first = make_user_plant(alice, fern)
+    second = make_user_plant(alice, fern)
+    group = client.post("/api/usergroups/create/", headers=alice.headers, json={"name": "Balcony", "is_default": False}).json()
+    response = client.post("/api/userplants/batch/", headers=alice.headers, json={"operations": [
+        {"op": "create", "plant_id": fern, "nickname": "third"},
+        {"op": "move", "id": first, "user_group_id": group["id"]},
+        {"op": "reorder", "ids": [second, first]},
+    ]})
+    assert response.status_code == 200
+    result = response.json()
+    assert len(result["created_ids"]) == 1 and set(result["updated_ids"]) == {first, second}
+    plants = {plant["id"]: plant for group in client.get("/api/userplants/", headers=alice.headers).json() for plant in group["plants"]}
+    assert plants[second]["order"] < plants[first]["order"]
+
+    invalid = client.post("/api/userplants/batch/", headers=alice.headers, json={"operations": [
+        {"op": "update", "id": first, "nickname": "renamed"},
+        {"op": "update", "id": 9999, "nickname": "missing"},
+    ]})
+    assert invalid.status_code == 422
+    assert "operations.1" in invalid.json()["detail"]
+    assert client.get(f"/api/userplants/{first}/", headers=alice.headers).json()["nickname"] is None
+
+
+def test_notes_are_paged_newest_first(client, alice, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern)
+    for text in ("one", "two", "three"):
+        assert client.post(f"/api/userplants/{plant_id}/notes/", headers=alice.headers, json={"note": text}).status_code == 200
+    first = client.get(f"/api/userplants/{plant_id}/notes/", headers=alice.headers, params={"limit": 2}).json()
+    second = client.get(f"/api/userplants/{plant_id}/notes/", headers=alice.headers, params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [note["note"] for note in first["items"] + second["items"]] == ["three", "two", "one"]
+
+
+def test_note_search_ranks_and_highlights(client, alice, bob, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern)
+    for text in ("Repotted into a bigger pot", "Leaves yellowing, watered less", "Yellow leaves again, moved to shade"):
+        client.post(f"/api/userplants/{plant_id}/notes/", headers=alice.headers, json={"note": text})
+    hits = client.get("/api/userplants/notes/search/", headers=alice.headers, params={"q": "yellow leaves"}).json()["items"]
+    assert [hit["snippet"] for hit in hits] == ["Yellow leaves again, moved to shade", "Leaves yellowing, watered less"]
+    start, end = hits[0]["highlights"][0]
+    assert hits[0]["snippet"][start:end] == "Yellow"
+    assert client.get("/api/userplants/notes/search/", headers=bob.headers, params={"q": "yellow"}).json()["items"] == []
+
+
+def test_export_streams_the_whole_collection(client, alice, bob, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern, nickname="Fernando")
+    client.post(f"/api/userplants/{plant_id}/notes/", headers=alice.headers, json={"note": "New leaf"})
+    make_user_plant(bob, fern)
+    response = client.get("/api/userplants/export/", headers=alice.headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["type"] for record in records] == ["group", "plant", "user_plant", "note"]
+    assert records[1]["data"]["name"] == "Fern"
+    assert (records[2]["data"]["id"], records[2]["data"]["nickname"]) == (plant_id, "Fernando")
+    assert records[3]["data"]["note"] == "New leaf"
+
+
+def test_export_records_hold_what_the_json_routes_show(client, db, alice, fern, make_user_plant):
+    plant_id = make_user_plant(alice, fern)
+    crud.set_user_plant_image(db, plant_id, "0" * 64 + ".png", alice.id)
+    records = [json.loads(line) for line in client.get("/api/userplants/export/", headers=alice.headers).text.splitlines()]
+    user_plant = next(record["data"] for record in records if record["type"] == "user_plant")
+    shown = client.get(f"/api/userplants/{plant_id}/", headers=alice.headers).json()
+    assert "image_key" not in user_plant
+    assert {key: user_plant[key] for key in shown if key != "plant_data"} == {key: value for key, value in shown.items() if key != "plant_data"}
+    assert (user_plant["plant_id"], user_plant["deleted_at"]) == (fern, None)
+
+
+def test_dashboard_answers_304_until_the_user_writes(client, alice, bob, fern, make_user_plant):
+    etag = client.get("/api/userplants/", headers=alice.headers).headers["etag"]
+    assert client.get("/api/userplants/", headers={**alice.headers, "If-None-Match": etag}).status_code == 304
+    make_user_plant(bob, fern)
+    assert client.get("/api/userplants/", headers={**alice.headers, "If-None-Match": etag}).status_code == 304
+    make_user_plant(alice, fern)
+    assert client.get("/api/userplants/", headers={**alice.headers, "If-None-Match": etag}).status_code == 200
@@ -0,0 +1,52 @@
+from api.pagination import encode_cursor
+
+
+def test_register_needs_the_invite_code(client, alice):
+    invite = client.post("/api/users/invite/", headers=alice.headers, json={"username": "carol"})
+    assert invite.status_code == 200
+    code = invite.json()["invite_code"]
+    assert client.post("/api/users/invite/", headers=alice.headers, json={"username": "carol"}).status_code == 400
+
+    wrong = client.post("/api/users/register/", json={"username": "carol", "invite_code": "WRONG1", "password": "secret"})
+    assert wrong.status_code == 400
+    registered = client.post("/api/users/register/", json={"username": "carol", "invite_code": code, "password": "secret"})
+    assert registered.status_code == 200
+    assert registered.json()["username"] == "carol"
+    login = client.post("/api/auth/login/", data={"username": "carol", "password": "secret"})
+    assert login.status_code == 200
+
+
+def test_users_are_paged_with_a_cursor(client, alice, make_account):
+    for name in ("bob", "carol", "dave"):
+        make_account(name)
+    first = client.get("/api/users/", headers=alice.headers, params={"limit": 3}).json()
+    assert [user["username"] for user in first["items"]] == ["alice", "bob", "carol"]
+    second = client.get("/api/users/", headers=alice.headers, params={"limit": 3, "cursor": first["next_cursor"]}).json()
+    assert [user["username"] for user in second["items"]] == ["dave"]
+    assert second["next_cursor"] is None
+
+
+def test_invites_are_paged_with_a_cursor(client, alice):
+    for name in ("bob", "carol", "dave"):
+        client.post("/api/users/invite/", headers=alice.headers, json={"username": name})
+    first = client.get("/api/users/invites/", headers=alice.headers, params={"limit": 2}).json()
+    second = client.get("/api/users/invites/", headers=alice.headers, params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [invite["username"] for invite in first["items"] + second["items"]] == ["bob", "carol", "dave"]
+
+
+def test_malformed_or_mistyped_cursors_are_a_400(client, alice):
+    for cursor in ("not base64 json!", encode_cursor("alice"), encode_cursor("alice", "1"), encode_cursor(1, 2)):
+        assert client.get("/api/users/", headers=alice.headers, params={"cursor": cursor}).status_code == 400
+    assert client.get("/api/users/invites/", headers=alice.headers, params={"cursor": encode_cursor("2026-01-01", 1)}).status_code == 400
+
+
+def test_change_password(client, alice):
+    response = client.post("/api/users/me/changepassword/", headers=alice.headers,
+                           json={"oldPassword": "password", "newPassword": "new-password"})
+    assert response.status_code == 200
+    assert client.post("/api/auth/login/", data={"username": "alice", "password": "new-password"}).status_code == 200
+
+
+def test_get_user(client, alice):
+    assert client.get(f"/api/users/{alice.id}/", headers=alice.headers).json()["username"] == "alice"
+    assert client.get(f"/api/users/{alice.id + 100}/", headers=alice.headers).status_code == 404
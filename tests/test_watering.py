@@ -0,0 +1,66 @@
+import datetime
+from api.watering import WateringEventWriter
+
+
+class FlakyStore:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.batches = []
+
+    def write(self, db, events):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database down")
+        self.batches.append(list(events))
+
+
+def writer(store) -> WateringEventWriter:
+    return WateringEventWriter(session_factory=NullSession, write_batch=store.write, flush_interval=60, max_batch=100)
+
+
+class NullSession:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_flush_writes_everything_submitted_in_one_batch():
+    store = FlakyStore(failures=0)
+    w = writer(store)
+    now = datetime.datetime.utcnow()
+    w.submit(1, [10, 11], now)
+    w.submit(2, [20], now)
+    assert w.flush() == 3
+    assert store.batches == [[(10, 1, now), (11, 1, now), (20, 2, now)]]
+    assert w.flush() == 0
+
+
+def test_failed_batches_are_retried_then_dropped():
+    store = FlakyStore(failures=WateringEventWriter.max_attempts)
+    w = writer(store)
+    w.submit(1, [10], datetime.datetime.utcnow())
+    for _ in range(WateringEventWriter.max_attempts - 1):
+        assert w.flush() == 0
+        assert len(w._pending) == 1
+    assert w.flush() == 0
+    assert w._pending == []
+
+
+def test_background_thread_flushes_on_stop():
+    store = FlakyStore(failures=0)
+    w = writer(store)
+    w.start()
+    assert w.running
+    w.submit(1, [10], datetime.datetime.utcnow())
+    w.stop()
+    assert not w.running
+    assert [event[0] for batch in store.batches for event in batch] == [10]
+
+
+def test_waterings_through_the_route_are_recorded(client, alice, fern, make_user_plant):
+    plant = make_user_plant(alice, fern)
+    response = client.post("/api/userplants/water/", headers=alice.headers, json={"plant_ids": [plant, 999]})
+    assert response.json() == {"plants_watered": {"plant_ids": [plant]}}
+    assert client.get(f"/api/userplants/{plant}/", headers=alice.headers).json()["last_watered"] is not None